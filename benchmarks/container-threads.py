@@ -0,0 +1,44 @@
+import pykmer.container as container
+import pykmer.container.std as std
+import pykmer.container.vectors as vectors
+from pykmer.file import tmpfile
+from pykmer.timer import timer
+
+import os
+import random
+import sys
+
+if len(sys.argv) < 3:
+    print >> sys.stderr, "usage: container-threads.py <K> <millions-of-kmers> [threads...]"
+    sys.exit(1)
+
+K = int(sys.argv[1])
+N = int(float(sys.argv[2])*1000000)
+T = [int(t) for t in sys.argv[3:]]
+if len(T) == 0:
+    T = [1, 4, 16]
+
+random.seed(17)
+M = (1 << (2*K)) - 1
+xs = [random.randint(0, M) for i in xrange(N)]
+xs.sort()
+mb = 8.0*N/(1024*1024)
+
+print 'threads\twrite MB/s\tread MB/s\tsize'
+for t in [0] + T:
+    nm = tmpfile()
+
+    tm = timer()
+    with container.container(nm, 'w') as z:
+        std.writeKmers(K, xs, z, threads=t)
+    tw = tm.time()
+
+    vectors.readThreads = max(t, 1)
+    tm = timer()
+    with container.container(nm, 'r') as z:
+        ys = std.readKmersArray(z)
+    tr = tm.time()
+    assert len(ys) == N
+
+    print '%d\t%f\t%f\t%d' % (t, mb/tw, mb/tr, os.path.getsize(nm))
+    os.remove(nm)
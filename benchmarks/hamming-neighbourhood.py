@@ -0,0 +1,50 @@
+from pykmer.basics import ham
+from pykmer.neighbourhood import neighbourhood
+from pykmer.sparse import sparse
+from pykmer.timer import timer
+
+import array
+import random
+import sys
+
+if len(sys.argv) < 4:
+    print >> sys.stderr, "usage: hamming-neighbourhood.py <K> <number-of-kmers> <number-of-queries>"
+    sys.exit(1)
+
+K = int(sys.argv[1])
+N = int(sys.argv[2])
+Q = int(sys.argv[3])
+
+random.seed(17)
+M = (1 << (2*K)) - 1
+xs = array.array('L', sorted(set([random.randint(0, M) for i in xrange(N)])))
+S = sparse(2*K, xs)
+
+def mutate(x, n):
+    for i in xrange(n):
+        p = 2*random.randint(0, K - 1)
+        x ^= random.randint(1, 3) << p
+    return x
+
+for d in [1, 2]:
+    qs = [mutate(random.choice(xs), random.randint(0, d)) for i in xrange(Q)]
+
+    t = timer()
+    idx = neighbourhood(K, S, d)
+    tb = t.time()
+
+    t = timer()
+    n = 0
+    for q in qs:
+        n += len(idx.query(q))
+    tq = t.time()
+
+    # Brute force comparison, over a subset of the queries.
+    m = max(1, Q // 100)
+    t = timer()
+    for q in qs[:m]:
+        for x in xs:
+            ham(q, x)
+    tf = t.time() * Q / m
+
+    print 'd=%d\tbuild %f s\t%f queries/s\t(brute force %f queries/s)\t%d hits' % (d, tb, Q / tq, Q / tf, n)
@@ -0,0 +1,30 @@
+from pykmer.basics import kmersArrays, kmersLists
+from pykmer.timer import timer
+
+import random
+import sys
+
+if len(sys.argv) < 3:
+    print >> sys.stderr, "usage: kmers-batch.py <K> <megabases>"
+    sys.exit(1)
+
+K = int(sys.argv[1])
+M = float(sys.argv[2])
+
+random.seed(17)
+L = int(M*1000000)
+seq = ''.join([random.choice("ACGT") for i in xrange(L)])
+
+t = timer()
+(xs, ys) = kmersLists(K, seq)
+tl = t.time()
+
+t = timer()
+(us, vs) = kmersArrays(K, seq)
+ta = t.time()
+
+assert len(xs) == len(us)
+
+print 'kmersLists\t%f s/Mb' % (tl / M)
+print 'kmersArrays\t%f s/Mb' % (ta / M)
+print 'speedup\t%f' % (tl / ta)
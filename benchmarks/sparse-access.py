@@ -0,0 +1,68 @@
+from pykmer.sparse import sparse
+from pykmer.timer import timer
+
+import array
+import random
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if len(sys.argv) < 2:
+    print >> sys.stderr, "usage: sparse-access.py <K> [millions-of-elements...]"
+    sys.exit(1)
+
+K = int(sys.argv[1])
+Ns = [int(float(n)*1000000) for n in sys.argv[2:]]
+if len(Ns) == 0:
+    Ns = [1000000, 100000000, 1000000000]
+Q = 100000
+
+def randomSet(B, N):
+    """
+    Generate a sorted array of `N` distinct random `B` bit integers,
+    as the running sum of random gaps.
+    """
+    g = ((1 << B) // N) - 1
+    if np is not None:
+        a = array.array('L', [0]) * N
+        v = np.frombuffer(a, dtype=np.uint64)
+        v[:] = np.random.randint(1, g + 1, size=N).astype(np.uint64)
+        np.cumsum(v, out=v)
+        return a
+    a = array.array('L', [])
+    x = 0
+    for i in xrange(N):
+        x += random.randint(1, g)
+        a.append(x)
+    return a
+
+random.seed(17)
+if np is not None:
+    np.random.seed(17)
+
+print 'N\tbuild s\taccess us\tmiss us'
+for N in Ns:
+    xs = randomSet(2*K, N)
+
+    t = timer()
+    S = sparse(2*K, xs)
+    tb = t.time()
+
+    ys = [xs[random.randint(0, N - 1)] for i in xrange(Q)]
+    t = timer()
+    for y in ys:
+        S.access(y)
+    ta = t.time()
+
+    ys = [y + 1 for y in ys]
+    t = timer()
+    for y in ys:
+        S.access(y)
+    tm = t.time()
+
+    print '%d\t%f\t%f\t%f' % (N, tb, 1e6*ta/Q, 1e6*tm/Q)
+    del S
+    del xs
@@ -17,7 +17,12 @@ from sliding a window over the given sequence, optionally including
 reverse complement *k*-mers as well. The latter function also includes
 position information. Positions are numbered from 1, not 0, and the
 positions of *k*-mers from the reverse complement strand are given
-negative positions (from -1).
+negative positions (from -1). The function `kmersWithHash` also yields
+a rolling (ntHash) hash of each *k*-mer, updated in constant time per base.
+
+The functions `minimizers` and `superkmers` extract the minimizers of
+windows of consecutive *k*-mers, and split a sequence into runs of
+*k*-mers sharing a minimizer.
 
 The basic manipulation and comparison functions included in this module are:
 
@@ -33,11 +38,24 @@ The basic manipulation and comparison functions included in this module are:
     two *k*-mers
 `lcp`
     for computing longest common matchinng prefix betwen two *k*-mers
+
+Where NumPy is available, `kmersArrays` provides a vectorized
+alternative to `kmersLists` for extracting *k*-mers from long sequences
+or blocks of reads, and `rcArray`, `murmerArray` and `canArray` apply
+the corresponding scalar functions to whole arrays of *k*-mers.
 """
 
 __docformat__ = 'restructuredtext'
 
-from pykmer.bits import ffs, rev, popcnt, m1
+from pykmer.bits import evens, ffs, rev, rol, ror, popcnt, m1, m2, m3, m4, m5, m6
+
+import array
+import collections
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 _nuc = { 'A':0, 'a':0, 'C':1, 'c':1, 'G':2, 'g':2, 'T':3, 't':3, 'U':3, 'u':3 }
 _nucList = [None for i in range(256)]
@@ -45,6 +63,18 @@ for (c,v) in _nuc.items():
     _nucList[ord(c)] = v
 _nucTup = tuple(_nucList)
 
+def _requireNumpy(fn):
+    if np is None:
+        raise ImportError('%s requires numpy' % (fn, ))
+
+if np is not None:
+    _nucArr = np.array([4 if v is None else v for v in _nucTup], dtype=np.uint8)
+    _m2 = np.uint64(m2)
+    _m3 = np.uint64(m3)
+    _m4 = np.uint64(m4)
+    _m5 = np.uint64(m5)
+    _m6 = np.uint64(m6)
+
 def kmer(seq):
     "Turn a string `seq` into an integer k-mer"
     r = 0
@@ -146,6 +176,80 @@ def lev(k, x, y):
         t0 = t2
     return t0[k]
 
+def _myersPeq(k, x):
+    """
+    Compute the match masks for the *k*-mer `x`: for each base b, the
+    k-bit mask with bit i set iff the ith base of `x` (from the least
+    significant) is b.
+    """
+    ev = m1 & ((1 << (2*k)) - 1)
+    peq = []
+    for b in xrange(4):
+        t = x ^ (b * m1)
+        peq.append(evens(~(t | (t >> 1)) & ev))
+    return peq
+
+def _myers(k, peq, y, d):
+    msk = (1 << k) - 1
+    top = 1 << (k - 1)
+    pv = msk
+    mv = 0
+    score = k
+    for j in xrange(k):
+        eq = peq[y & 3]
+        y >>= 2
+        xv = eq | mv
+        xh = ((((eq & pv) + pv) & msk) ^ pv) | eq
+        ph = mv | (~(xh | pv) & msk)
+        mh = pv & xh
+        if ph & top:
+            score += 1
+        elif mh & top:
+            score -= 1
+        ph = (ph << 1) & msk
+        mh = (mh << 1) & msk
+        pv = mh | (~(xv | ph) & msk)
+        mv = ph & xv
+        if d is not None:
+            # The distance is bounded below by the diagonal entry
+            # D[j+1][j+1] of the dynamic programming table.
+            dm = (2 << j) - 1
+            if popcnt(pv & dm) - popcnt(mv & dm) > d:
+                return None
+    return score
+
+def myers(k, x, y):
+    """
+    Compute the minimal edit distance (Levenshtein distance) between
+    the two *k*-mers `x` and `y`, using Myers' bit-parallel algorithm
+    (as formulated by Hyyro). Only O(k) word operations are needed,
+    rather than the O(k**2) of `lev`.
+
+    The result is identical to that of `lev`. In particular, as for
+    `lev`, the dynamic programming table has a zero first row, so
+    unmatched least significant bases of `y` carry no cost.
+
+    Values of `k` > 32 are not guaranteed to work.
+    """
+    return _myers(k, _myersPeq(k, x), y, None)
+
+def myersBounded(k, x, y, d):
+    """
+    Compute the edit distance between the two *k*-mers `x` and `y`
+    as for `myers`, if it is no more than `d`. If it is greater than
+    `d`, return None, possibly having stopped the computation early.
+    """
+    return _myers(k, _myersPeq(k, x), y, d)
+
+def myersMany(k, x, ys, d=None):
+    """
+    Compute the edit distances between the *k*-mer `x` and each of
+    the *k*-mers in `ys`, returning a list. If `d` is given, distances
+    greater than `d` are returned as None (see `myersBounded`).
+    """
+    peq = _myersPeq(k, x)
+    return [_myers(k, peq, y, d) for y in ys]
+
 def lcp(k, x, y):
     """
     Find the length of the common matching prefix between 2 k-mers `x` and `y`.
@@ -247,6 +351,70 @@ def sub(s, p, x):
     u = float(murmer(x, s)) / float(0x1FFFFFFFFFFFFFFF)
     return u < p
 
+def _asArray(xs):
+    """
+    Return a NumPy uint64 view of the *k*-mers `xs`, avoiding a copy
+    where possible.
+    """
+    if isinstance(xs, np.ndarray):
+        return xs.astype(np.uint64, copy=False)
+    if isinstance(xs, array.array) and xs.itemsize == 8:
+        return np.frombuffer(xs, dtype=np.uint64)
+    return np.array(xs, dtype=np.uint64)
+
+def rcArray(k, xs):
+    """
+    Compute the reverse complements of an array of *k*-mers `xs`,
+    returning a NumPy uint64 array. The results are identical to
+    applying `rc` to each element.
+
+    Requires NumPy. Values of `k` > 32 are not supported.
+    """
+    _requireNumpy('rcArray')
+    x = ~_asArray(xs)
+    x = ((x >> np.uint64(2)) & _m2) | ((x & _m2) << np.uint64(2))
+    x = ((x >> np.uint64(4)) & _m3) | ((x & _m3) << np.uint64(4))
+    x = ((x >> np.uint64(8)) & _m4) | ((x & _m4) << np.uint64(8))
+    x = ((x >> np.uint64(16)) & _m5) | ((x & _m5) << np.uint64(16))
+    x = ((x >> np.uint64(32)) & _m6) | ((x & _m6) << np.uint64(32))
+    return x >> np.uint64(64 - 2*k)
+
+def murmerArray(xs, s):
+    """
+    Compute the Murmer hash (see `murmer`) with the seed `s` of each
+    of the *k*-mers in the array `xs`, returning a NumPy uint64 array.
+    The arithmetic wraps around modulo 2**64, so the results are
+    identical to applying `murmer` to each element.
+
+    Requires NumPy.
+    """
+    _requireNumpy('murmerArray')
+    k = _asArray(xs) * np.uint64(0x87c37b91114253d5)
+    k = (k << np.uint64(31)) | (k >> np.uint64(33))
+    k *= np.uint64(0x4cf5ad432745937f)
+    h = k ^ np.uint64(s & 0xFFFFFFFFFFFFFFFF)
+    h = (h << np.uint64(27)) | (h >> np.uint64(37))
+    h *= np.uint64(5)
+    h += np.uint64(0x52dce729)
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(0xff51afd7ed558ccd)
+    h ^= h >> np.uint64(33)
+    h *= np.uint64(0xc4ceb9fe1a85ec53)
+    h ^= h >> np.uint64(33)
+    return h
+
+def canArray(k, xs):
+    """
+    Compute the canonical *k*-mer (see `can`) for each of the *k*-mers
+    in the array `xs`, returning a NumPy uint64 array.
+
+    Requires NumPy. Values of `k` > 32 are not supported.
+    """
+    _requireNumpy('canArray')
+    xs = _asArray(xs)
+    ys = rcArray(k, xs)
+    return np.where(murmerArray(xs, 17) <= murmerArray(ys, 17), xs, ys)
+
 def kmers(k, seq, bothStrands=False):
     """
     A generator for extracting *k*-mers from a string nucleotide
@@ -289,6 +457,80 @@ def kmers(k, seq, bothStrands=False):
             j -= 1
         i += 1
 
+# Random 64-bit seeds for the bases A, C, G & T, as used by ntHash.
+_ntSeeds = (0x3c8bfbb395c60474, 0x3193c18562a02b4c,
+            0x20323ed082572324, 0x295549f54be24456)
+
+def nthash(k, x):
+    """
+    Compute the canonical ntHash of the *k*-mer `x` from scratch. This
+    is the value that `kmersWithHash` computes incrementally.
+
+    The hash of a strand is the XOR of the seeds for its bases, each
+    rotated left by the number of bases to its right, and the canonical
+    hash is the smaller of the hashes of the two strands.
+    """
+    f = 0
+    r = 0
+    for i in xrange(k):
+        b = (x >> (2*(k - 1 - i))) & 3
+        f ^= rol(_ntSeeds[b], k - 1 - i)
+        r ^= rol(_ntSeeds[3 - b], i)
+    return min(f, r)
+
+def kmersWithHash(k, seq, bothStrands=False):
+    """
+    A generator for extracting *k*-mers from a string nucleotide
+    sequence `seq` along with their canonical ntHash (see `nthash`),
+    yielding (*k*-mer, hash) pairs. The parameter `bothStrands`
+    determines whether the reverse complement of each *k*-mer is
+    also yielded (with the same hash).
+
+    The hashes are computed with a rolling update, so the cost per
+    base is constant, regardless of `k`.
+
+    Any *k*-mers overlaying characters *other* than AaCcGgTtUu are
+    skipped, as for `kmers`.
+
+    Values of `k` > 32 are not guaranteed to work.
+    """
+    msk = (1 << (2*k)) - 1
+    s = 2*(k-1)
+    hs = _ntSeeds
+    hsk = tuple([rol(h, k) for h in hs])
+    hcs = tuple([hs[3 - b] for b in xrange(4)])
+    hcs1 = tuple([ror(h, 1) for h in hcs])
+    hcsk = tuple([rol(h, k - 1) for h in hcs])
+    j = 0
+    x = 0
+    xb = 0
+    f = 0
+    r = 0
+    for c in seq:
+        b = _nucTup[ord(c)]
+        if b is None:
+            j = 0
+            x = 0
+            xb = 0
+            f = 0
+            r = 0
+            continue
+        if j < k:
+            f = rol(f, 1) ^ hs[b]
+            r ^= rol(hcs[b], j)
+            j += 1
+        else:
+            o = x >> s
+            f = rol(f, 1) ^ hsk[o] ^ hs[b]
+            r = ror(r, 1) ^ hcs1[o] ^ hcsk[b]
+        x = ((x << 2) | b) & msk
+        xb = (xb >> 2) | ((3 - b) << s)
+        if j == k:
+            h = min(f, r)
+            yield (x, h)
+            if bothStrands:
+                yield (xb, h)
+
 def kmersList(k, seq, bothStrands=False):
     """
     Extract *k*-mers from a string nucleotide sequence `seq` and
@@ -380,6 +622,91 @@ def kmersLists(k, seq):
         i += 1
     return (resFwd, resRev)
 
+def _windows(k, cs, rev=False):
+    """
+    Compute the sliding window *k*-mers over the array of 2-bit base
+    codes `cs`, by combining windows of doubling widths. If `rev` is
+    true, the first base in each window is the least significant,
+    rather than the most significant.
+    """
+    n = len(cs)
+    res = None
+    rw = 0
+    p = cs
+    pw = 1
+    kk = k
+    while True:
+        if kk & 1:
+            if res is None:
+                res = p
+            else:
+                m = n - (rw + pw) + 1
+                if rev:
+                    res = np.left_shift(p[rw:rw+m], np.uint64(2*rw)) | res[:m]
+                else:
+                    res = np.left_shift(res[:m], np.uint64(2*pw)) | p[rw:rw+m]
+            rw += pw
+        kk >>= 1
+        if kk == 0:
+            break
+        m = n - 2*pw + 1
+        if rev:
+            q = np.left_shift(p[pw:pw+m], np.uint64(2*pw))
+            q |= p[:m]
+        else:
+            q = np.left_shift(p[:m], np.uint64(2*pw))
+            q |= p[pw:pw+m]
+        p = q
+        pw *= 2
+    return res
+
+def kmersArrays(k, seq):
+    """
+    Extract *k*-mers from a string nucleotide sequence `seq` and
+    return the forward and reverse complement *k*-mers as a pair of
+    NumPy uint64 arrays. The results are the same as those from
+    `kmersLists`, but are computed with vector operations rather than
+    one base at a time.
+
+    If `seq` is a list of sequences, *k*-mers are extracted from each
+    in turn and returned together. No *k*-mers span the boundary
+    between two sequences. The list may also be a block of reads
+    returned by `pykmer.file.readFastqBlock`, in which case the
+    sequence is taken from each 4-line read.
+
+    Any *k*-mers overlaying characters *other* than AaCcGgTtUu are
+    skipped.
+
+    Requires NumPy. Values of `k` > 32 are not supported.
+    """
+    _requireNumpy('kmersArrays')
+    assert 0 < k <= 32
+    if not isinstance(seq, str):
+        if len(seq) > 0 and not isinstance(seq[0], basestring):
+            seq = [rd[1] for rd in seq]
+        seq = 'N'.join(seq)
+    n = len(seq)
+    if n < k:
+        return (np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64))
+
+    bs = _nucArr[np.frombuffer(seq, dtype=np.uint8)]
+    bad = bs > 3
+    anyBad = bad.any()
+    if anyBad:
+        bs[bad] = 0
+    cs = bs.astype(np.uint64)
+
+    fwd = _windows(k, cs)
+    bwd = _windows(k, np.uint64(3) - cs, True)
+
+    if anyBad:
+        nb = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(bad, out=nb[1:])
+        good = (nb[k:] - nb[:-k]) == 0
+        fwd = fwd[good]
+        bwd = bwd[good]
+    return (fwd, bwd)
+
 def kmersWithPos(k, seq, bothStrands=False):
     """
     Extract *k*-mers from a string nucleotide sequence `seq`.
@@ -520,3 +847,80 @@ def kmersWithPosLists(k, seq):
             j -= 1
         i += 1
     return (fwdRes, revRes)
+
+def minimizers(k, w, seq, s=17):
+    """
+    A generator for extracting the minimizers of the windows of `w`
+    consecutive *k*-mers in the string nucleotide sequence `seq`.
+
+    The *k*-mers are ordered by their Murmer hash (see `murmer`) with
+    the seed `s`, and each *k*-mer is considered in its canonical form,
+    so for the default seed, the minimizer is the *k*-mer `can` would
+    choose. Ties are broken in favour of the leftmost *k*-mer.
+
+    For each window, a tuple (i, p, m) is yielded, where i is the
+    position in `seq` of the first *k*-mer in the window, p is the
+    position of the minimizer, and m is the minimizer itself. Positions
+    are numbered from 0.
+
+    A monotone queue of candidate minimizers is maintained, so the
+    work done per position is amortized constant. Windows overlaying
+    characters *other* than AaCcGgTtUu are skipped.
+    """
+    q = collections.deque()
+    itr = kmersWithPos(k, seq, True)
+    last = -2
+    n = 0
+    for (x, p) in itr:
+        (xb, _) = itr.next()
+        p -= 1
+        if p != last + 1:
+            q.clear()
+            n = 0
+        last = p
+        n += 1
+        h = murmer(x, s)
+        hb = murmer(xb, s)
+        if hb < h:
+            h = hb
+            x = xb
+        while len(q) > 0 and q[-1][0] > h:
+            q.pop()
+        q.append((h, p, x))
+        if n >= w:
+            i = p - w + 1
+            while q[0][1] < i:
+                q.popleft()
+            yield (i, q[0][1], q[0][2])
+
+def superkmers(k, w, seq, s=17):
+    """
+    A generator for splitting the string nucleotide sequence `seq`
+    into super-*k*-mers: maximal runs of consecutive windows of `w`
+    *k*-mers sharing the same minimizer (see `minimizers`).
+
+    For each super-*k*-mer, a tuple (m, b, e) is yielded where m is
+    the shared minimizer, and seq[b:e] is the super-*k*-mer. Adjacent
+    super-*k*-mers overlap by w + k - 2 bases, so each window of w + k - 1
+    bases belongs to exactly one super-*k*-mer.
+
+    To partition the *K*-mers of a sequence by their minimizing *k*-mer
+    (for some k < *K*), use w = *K* - k + 1.
+    """
+    z = w + k - 1
+    m0 = None
+    p0 = None
+    i0 = None
+    i1 = None
+    for (i, p, m) in minimizers(k, w, seq, s):
+        if i0 is not None and p == p0 and i == i1 + 1:
+            i1 = i
+            continue
+        if i0 is not None:
+            yield (m0, i0, i1 + z)
+        m0 = m
+        p0 = p
+        i0 = i
+        i1 = i
+    if i0 is not None:
+        yield (m0, i0, i1 + z)
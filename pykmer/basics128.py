@@ -0,0 +1,184 @@
+"""
+Basic functions for *k*-mers with 32 < *k* <= 64.
+
+The functions in `pykmer.basics` assume that a *k*-mer fits in a single
+64-bit word. This module provides equivalents of the manipulation and
+comparison functions for *k*-mers that occupy two 64-bit words, so
+that values of *k* up to 64 may be used.
+
+The functions `kmer`, `render`, `kmers`, `kmersList` and `kmersLists`
+from `pykmer.basics` work for any value of *k*, since they use Python's
+arbitrary precision integers, and are re-exported here for convenience.
+
+The functions
+
+`rc`
+    for computing the reverse complement of a *k*-mer
+`can`
+    for computing the canonical choice between a *k*-mer and its reverse
+    complement.
+`ham`
+    for computing the Hamming distance (number of substitutions) between
+    two *k*-mers
+`lcp`
+    for computing longest common matchinng prefix betwen two *k*-mers
+`murmer`
+    for computing the Murmer hash of a *k*-mer
+
+have the same signatures as their counterparts in `pykmer.basics`.
+
+Individual *k*-mers are Python integers less than 2**128, but sets of
+them should be stored *packed* in an `array.array('L')` with two words
+per *k*-mer: the most significant word followed by the least significant
+word. The functions `pack`, `unpack`, `sort` and `merge` operate on this
+representation, which takes 16 bytes per *k*-mer, rather than the much
+larger space taken by a list of Python long integers.
+"""
+
+__docformat__ = 'restructuredtext'
+
+from pykmer.basics import kmer, render, kmers, kmersList, kmersLists
+import pykmer.basics as basics
+from pykmer.bits import ffs, rev, popcnt, m1
+
+import array
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+M64 = 0xFFFFFFFFFFFFFFFF
+
+def rc(k, x):
+    """
+    Compute the reverse complement of a *k*-mer `x`.
+
+    Values of `k` > 64 are not supported.
+    """
+    hi = rev(~(x >> 64) & M64)
+    lo = rev(~x & M64)
+    return ((lo << 64) | hi) >> (128 - 2*k)
+
+def ham(x, y):
+    """
+    Compute the Hamming distance between two k-mers `x` and `y`.
+    """
+    z = x ^ y
+    v = z | (z >> 1)
+    return popcnt((v >> 64) & m1) + popcnt(v & m1)
+
+def lcp(k, x, y):
+    """
+    Find the length of the common matching prefix between 2 k-mers `x` and `y`.
+    """
+    z = x ^ y
+    if z == 0:
+        return k
+    zh = z >> 64
+    if zh > 0:
+        f = 64 + ffs(zh)
+    else:
+        f = ffs(z)
+    v = 1 + f // 2
+    return k - v
+
+def murmer(x, s):
+    """
+    Compute the Murmer hash of the *k*-mer `x` with the seed `s`.
+
+    The least significant word is hashed with the seed `s`, and the
+    result is used as the seed for hashing the most significant word.
+    As a consequence, the hash values differ from those computed by
+    `pykmer.basics.murmer`, even for small *k*-mers.
+    """
+    return basics.murmer(x >> 64, basics.murmer(x & M64, s))
+
+def can(k, x):
+    """
+    Return a canonical choice between `x` and its reverse complement,
+    choosing the one with the smaller Murmer hash (see `murmer` and
+    `pykmer.basics.can`).
+    """
+    xh = murmer(x, 17)
+    xb = rc(k, x)
+    xbh = murmer(xb, 17)
+    if xh <= xbh:
+        return x
+    else:
+        return xb
+
+def pack(xs):
+    """
+    Pack the sequence of *k*-mers `xs` into an `array.array('L')`,
+    with two words per *k*-mer.
+    """
+    a = array.array('L', [])
+    for x in xs:
+        a.append(x >> 64)
+        a.append(x & M64)
+    return a
+
+def unpack(a):
+    """
+    A generator yielding the *k*-mers in the packed array `a`.
+    """
+    n = len(a)
+    i = 0
+    while i < n:
+        yield (a[i] << 64) | a[i+1]
+        i += 2
+
+def item(a, i):
+    """
+    Return the `i`th *k*-mer in the packed array `a`.
+    """
+    return (a[2*i] << 64) | a[2*i+1]
+
+def sort(a):
+    """
+    Sort the packed array of *k*-mers `a` in place.
+
+    If NumPy is available, the array is sorted without creating
+    intermediate Python integers.
+    """
+    if np is not None:
+        v = np.frombuffer(a, dtype=[('hi', '=u8'), ('lo', '=u8')])
+        v.sort(order=('hi', 'lo'))
+        return
+    xs = list(unpack(a))
+    xs.sort()
+    i = 0
+    for x in xs:
+        a[i] = x >> 64
+        a[i+1] = x & M64
+        i += 2
+
+def merge(a, b, dedup=False):
+    """
+    Merge the two sorted packed arrays of *k*-mers `a` and `b`,
+    returning a new packed array. If `dedup` is true, *k*-mers
+    occuring in both `a` and `b` are only included once.
+    """
+    r = array.array('L', [])
+    za = len(a)
+    zb = len(b)
+    i = 0
+    j = 0
+    while i < za and j < zb:
+        x = (a[i], a[i+1])
+        y = (b[j], b[j+1])
+        if x < y:
+            r.extend(a[i:i+2])
+            i += 2
+        elif y < x:
+            r.extend(b[j:j+2])
+            j += 2
+        else:
+            r.extend(a[i:i+2])
+            i += 2
+            if dedup:
+                j += 2
+    r.extend(a[i:])
+    r.extend(b[j:])
+    return r
@@ -96,3 +96,59 @@ def ffs(x):
                 return _ffsBits[x8] + 8
             else:
                 return _ffsBits[x]
+
+def rol(x, n):
+    """
+    Rotate the 64-bit integer `x` left by `n` bits.
+    """
+    n &= 63
+    return ((x << n) | (x >> (64 - n))) & 0xFFFFFFFFFFFFFFFF
+
+def ror(x, n):
+    """
+    Rotate the 64-bit integer `x` right by `n` bits.
+    """
+    n &= 63
+    return ((x >> n) | (x << (64 - n))) & 0xFFFFFFFFFFFFFFFF
+
+def evens(x):
+    """
+    Gather the bits in the even numbered positions of the 64-bit
+    integer `x` in to the least significant 32 bits of the result,
+    preserving their order.
+    """
+    x &= m1
+    x = (x | (x >> 1)) & m2
+    x = (x | (x >> 2)) & m3
+    x = (x | (x >> 4)) & m4
+    x = (x | (x >> 8)) & m5
+    x = (x | (x >> 16)) & m6
+    return x
+
+_pop8 = [popcnt(i) for i in xrange(256)]
+
+_sel8 = [0 for i in xrange(256*8)]
+for _i in xrange(256):
+    _j = 0
+    for _k in xrange(8):
+        if (_i >> _k) & 1:
+            _sel8[8*_i + _j] = _k
+            _j += 1
+del _i, _j, _k
+
+def select(x, j):
+    """
+    Find the position of the `j`th (counting from 0, from the least
+    significant bit) set bit in the 64-bit integer `x`. It is an error
+    for `x` to have `j` or fewer set bits.
+    """
+    p = 0
+    b = x & 0xFF
+    c = _pop8[b]
+    while c <= j:
+        j -= c
+        p += 8
+        x >>= 8
+        b = x & 0xFF
+        c = _pop8[b]
+    return p + _sel8[8*b + j]
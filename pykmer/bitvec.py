@@ -1,11 +1,41 @@
 """
 A basic fixed-size bit vector class.
+
+As well as getting and setting individual bits, a bit vector supports
+
+* `rank1` and `select1`, which are answered in constant time using an
+  index built (on demand) after the bit vector has been modified: a
+  rank9 style directory of the number of set bits before each 512 bit
+  superblock, and of the number before each word within it, and the
+  positions of every 512th set bit;
+* setting and clearing the bits at an array of positions at once
+  (`setMany` and `clearMany`);
+* word-wise `&`, `|`, `^` and `andnot` between bit vectors of the
+  same size;
+* counting the bits set in a range (`popcount`).
+
+The word-wise and bulk operations use NumPy if it is available.
+
+Bit vectors may be stored in a container with `writeBitvec` and read
+back with `readBitvec`.
 """
 
 __docformat__ = "restructuredtext"
 
+from pykmer.bits import popcnt, select
+import pykmer.container.vectors as vectors
+
 import array
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+M64 = 0xFFFFFFFFFFFFFFFF
+
+_selectSample = 512
+
 class bitvec:
     """A basic bit vector class."""
 
@@ -15,7 +45,8 @@ class bitvec:
         """
         self.size = n
         self.words = (n + 63) // 64
-        self.data = array.array('L', [0 for i in xrange(self.words)])
+        self.data = array.array('L', [0]) * self.words
+        self.idx = None
 
     def __len__(self):
         """Return the number of bits in the bit vector."""
@@ -34,8 +65,208 @@ class bitvec:
         Set the bit at position `i` to the value of the least
         significant bit of `x`.
         """
-        w = i // 64
+        w = i >> 6
+        m = 1 << (i & 63)
+        if x & 1:
+            self.data[w] |= m
+        else:
+            self.data[w] &= M64 ^ m
+        self.idx = None
+
+    def setMany(self, xs):
+        """
+        Set the bits at each of the positions in `xs`.
+        """
+        if np is not None and self.words > 0 and len(xs) > 0:
+            v = np.frombuffer(self.data, dtype=np.uint64)
+            p = np.array(xs, dtype=np.uint64)
+            np.bitwise_or.at(v, p >> np.uint64(6), np.left_shift(np.uint64(1), p & np.uint64(63)))
+        else:
+            d = self.data
+            for i in xs:
+                d[i >> 6] |= 1 << (i & 63)
+        self.idx = None
+
+    def clearMany(self, xs):
+        """
+        Clear the bits at each of the positions in `xs`.
+        """
+        if np is not None and self.words > 0 and len(xs) > 0:
+            v = np.frombuffer(self.data, dtype=np.uint64)
+            p = np.array(xs, dtype=np.uint64)
+            np.bitwise_and.at(v, p >> np.uint64(6), ~np.left_shift(np.uint64(1), p & np.uint64(63)))
+        else:
+            d = self.data
+            for i in xs:
+                d[i >> 6] &= M64 ^ (1 << (i & 63))
+        self.idx = None
+
+    def _combine(self, other, op, npop):
+        assert self.size == other.size
+        r = bitvec(self.size)
+        if np is not None and self.words > 0:
+            u = np.frombuffer(self.data, dtype=np.uint64)
+            v = np.frombuffer(other.data, dtype=np.uint64)
+            npop(u, v, out=np.frombuffer(r.data, dtype=np.uint64))
+        else:
+            a = self.data
+            b = other.data
+            c = r.data
+            for w in xrange(self.words):
+                c[w] = op(a[w], b[w])
+        return r
+
+    def __and__(self, other):
+        """Return the bitwise AND of two bit vectors."""
+        return self._combine(other, lambda x, y: x & y, np and np.bitwise_and)
+
+    def __or__(self, other):
+        """Return the bitwise OR of two bit vectors."""
+        return self._combine(other, lambda x, y: x | y, np and np.bitwise_or)
+
+    def __xor__(self, other):
+        """Return the bitwise XOR of two bit vectors."""
+        return self._combine(other, lambda x, y: x ^ y, np and np.bitwise_xor)
+
+    def andnot(self, other):
+        """
+        Return a bit vector with the bits set in this bit vector, but
+        not in `other`.
+        """
+        if np is not None:
+            def npop(u, v, out):
+                np.bitwise_and(u, np.invert(v), out=out)
+        else:
+            npop = None
+        return self._combine(other, lambda x, y: x & (M64 ^ y), npop)
+
+    def popcount(self, i = 0, j = None):
+        """
+        Return the number of bits set in positions [`i`, `j`). By
+        default, the whole bit vector is counted.
+        """
+        if j is None:
+            j = self.size
+        if i >= j:
+            return 0
+        if self.idx is not None:
+            return self.rank1(j) - self.rank1(i)
+        d = self.data
+        wi = i >> 6
+        wj = j >> 6
+        if wi == wj:
+            return popcnt((d[wi] >> (i & 63)) & ((1 << (j - i)) - 1))
+        c = popcnt(d[wi] >> (i & 63))
+        for w in xrange(wi + 1, wj):
+            c += popcnt(d[w])
+        if j & 63:
+            c += popcnt(d[wj] & ((1 << (j & 63)) - 1))
+        return c
+
+    def count(self):
+        """
+        Return the number of bits set in the bit vector.
+        """
+        return self.popcount()
+
+    def buildIndex(self):
+        """
+        Build the index used by `rank1` and `select1`. This is done
+        automatically when they are first used after the bit vector
+        has been modified.
+        """
+        d = self.data
+        nw = self.words
+        ns = nw // 8 + 1
+        rk = array.array('L', [0]) * (2*ns)
+        sl = array.array('L', [])
+        t = 0
+        for s in xrange(ns):
+            rk[2*s] = t
+            rel = 0
+            c = 0
+            for j in xrange(8):
+                w = 8*s + j
+                if j > 0:
+                    rel |= c << (9*(j - 1))
+                if w >= nw:
+                    continue
+                v = d[w]
+                k = popcnt(v)
+                while t + c + k > _selectSample * len(sl):
+                    sl.append(64*w + select(v, _selectSample * len(sl) - t - c))
+                c += k
+            rk[2*s + 1] = rel
+            t += c
+        self.idx = (rk, sl, t)
+
+    def rank1(self, i):
+        """
+        Return the number of bits set in positions [0, `i`).
+        """
+        if self.idx is None:
+            self.buildIndex()
+        rk = self.idx[0]
+        w = i >> 6
+        s = w >> 3
+        j = w & 7
+        r = rk[2*s]
+        if j > 0:
+            r += (rk[2*s + 1] >> (9*(j - 1))) & 0x1FF
         b = i & 63
-        self.data[w] &= 0xFFFFFFFFFFFFFFFF - (1 << b)
-        self.data[w] |= (x & 1) << b
+        if b:
+            r += popcnt(self.data[w] & ((1 << b) - 1))
+        return r
+
+    def rank0(self, i):
+        """
+        Return the number of bits not set in positions [0, `i`).
+        """
+        return i - self.rank1(i)
+
+    def select1(self, j):
+        """
+        Return the position of the `j`th (counting from 0) set bit. It
+        is an error for `j` to be negative, or not less than the number
+        of bits set.
+        """
+        if self.idx is None:
+            self.buildIndex()
+        (rk, sl, t) = self.idx
+        assert 0 <= j < t
+        q = j // _selectSample
+        s = sl[q] >> 9
+        if q + 1 < len(sl):
+            h = sl[q + 1] >> 9
+        else:
+            h = len(rk) // 2 - 1
+        # Find the last superblock in [s, h] starting at or before j.
+        while s < h:
+            m = (s + h + 1) // 2
+            if rk[2*m] <= j:
+                s = m
+            else:
+                h = m - 1
+        j -= rk[2*s]
+        rel = rk[2*s + 1]
+        k = 0
+        while k < 7 and ((rel >> (9*k)) & 0x1FF) <= j:
+            k += 1
+        if k > 0:
+            j -= (rel >> (9*(k - 1))) & 0x1FF
+        return 64*(8*s + k) + select(self.data[8*s + k], j)
+
+def writeBitvec(z, v, nm):
+    """
+    Write the bit vector `v` to the container `z` with the name `nm`.
+    """
+    vectors.write64(z, v.data, nm)
+    z.meta[nm + '-bits'] = v.size
 
+def readBitvec(z, nm):
+    """
+    Read the bit vector with the name `nm` from the container `z`.
+    """
+    v = bitvec(z.meta[nm + '-bits'])
+    v.data = vectors.read64array(z, nm, v.words)
+    return v
@@ -8,6 +8,15 @@ containts at least the two following files:
     container object represents this at runtime as the member
     variable `meta`.
 
+So that opening a container is cheap however much meta-data it holds,
+large values (lists, tuples and arrays with more than `metaThreshold`
+elements, such as the names in an index) are each stored in a member of
+their own, `__meta__.<key>`, and are only read when they are first
+used. The dictionary in `__meta__` then holds just the small values,
+along with the format version (`__version__`) and the list of keys
+stored separately (`__lazy__`). Containers written in the original
+format, with all the meta-data in `__meta__`, can still be read.
+
 The container may also contain additional files corresponding to
 data objects that belong together. In practice this typically means
 files containing k-mers, counts, and other related items.
@@ -18,18 +27,100 @@ data in to the container. This is done with an additional object
 which creates a temporary file, and on closing moves it in to the
 container.
 
+Alternatively, a container may be stored as a casket (see
+`pykmer.container.casket`), by passing `backend='casket'` when the
+container is created. Data is then streamed straight in to the casket,
+without the temporary file, and the meta-data is stored in the
+`__meta__` member as before. When a container is opened for reading
+the format is detected from the file itself. Casket members are not
+compressed (the `comp` flag is ignored), but may be memory mapped for
+reading by passing `mmap=True`, and may have the CRC32 of each member
+recorded and checked on reading by passing `crc=True`.
+
 """
 
 __docformat__ = 'restructuredtext'
 
 from pykmer.file import tmpfile
+from pykmer.container import casket
 
+import array
+import collections
 import cPickle
 import os
 import types
 import warnings
 import zipfile
 
+metaVersion = 2
+
+metaThreshold = 1024
+
+def _dumpMetaValue(v):
+    if isinstance(v, array.array):
+        return 'a' + v.typecode + v.tostring()
+    return 'p' + cPickle.dumps(v, 2)
+
+def _loadMetaValue(s):
+    if s[0] == 'a':
+        v = array.array(s[1], [])
+        v.fromstring(s[2:])
+        return v
+    return cPickle.loads(s[1:])
+
+class Meta(collections.MutableMapping):
+    """
+    A dictionary of meta-data, for which the values of the keys in
+    `lazy` are loaded when they are first used, with `loader`. All the
+    mapping methods (`items`, `__iter__`, `__len__`, etc.) include the
+    keys which have not been loaded yet, and iterating over the values
+    loads them.
+    """
+    def __init__(self, d = {}, lazy = [], loader = None):
+        self.loaded = dict(d)
+        self.lazy = set(lazy)
+        self.loader = loader
+
+    def __getitem__(self, k):
+        if k in self.loaded:
+            return self.loaded[k]
+        if k not in self.lazy:
+            raise KeyError(k)
+        v = self.loader(k)
+        self.loaded[k] = v
+        self.lazy.discard(k)
+        return v
+
+    def __contains__(self, k):
+        return k in self.loaded or k in self.lazy
+
+    def __setitem__(self, k, v):
+        self.lazy.discard(k)
+        self.loaded[k] = v
+
+    def __delitem__(self, k):
+        if k in self.lazy:
+            self.lazy.discard(k)
+            return
+        del self.loaded[k]
+
+    def __iter__(self):
+        # Iterate over a copy of the keys, since iterating over the
+        # values moves keys from `lazy` to `loaded`.
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.loaded) + len(self.lazy)
+
+    def keys(self):
+        return self.loaded.keys() + list(self.lazy)
+
+    def has_key(self, k):
+        return k in self
+
+    def __repr__(self):
+        return 'Meta(%r, lazy=%r)' % (self.loaded, sorted(self.lazy))
+
 class SelfZippingFile:
     def __init__(self, z, zfn, comp):
         self.z = z
@@ -58,23 +149,131 @@ class SelfZippingFile:
     def write(self, x):
         self.tf.write(x)
 
+class CasketSpoolFile:
+    """
+    A file for a member of a casket container created while another
+    member is being streamed in. The content is spooled to a temporary
+    file, and added to the casket once the other stream is closed.
+    """
+    def __init__(self, c, afn):
+        self.c = c
+        self.afn = afn
+        self.tfn = tmpfile('.csf')
+        self.tf = open(self.tfn, 'w')
+
+    def __enter__(self):
+        return self.tf
+
+    def __exit__(self, t, v, tb):
+        if t is not None:
+            return False
+        self.close()
+        return True
+
+    def close(self):
+        self.tf.close()
+        self.c._addSpooled(self.afn, self.tfn)
+
+    def write(self, x):
+        self.tf.write(x)
+
+class CasketStreamFile:
+    """
+    A file for a member being streamed straight in to a casket
+    container.
+    """
+    def __init__(self, c, afn):
+        self.c = c
+        self.f = c.z.add_stream(afn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, v, tb):
+        if t is not None:
+            return False
+        self.close()
+        return True
+
+    def close(self):
+        self.f.close()
+        self.c._addPending()
+
+    def write(self, x):
+        self.f.write(x)
+
+def isZip(nm):
+    """
+    Determine whether the file `nm` is a ZIP file (rather than a
+    casket). Caskets have no magic number, so a file which ends with a
+    well formed casket TOC is taken to be a casket, and otherwise the
+    file must have a ZIP end of central directory record.
+    """
+    if casket.isCasket(nm):
+        return False
+    return zipfile.is_zipfile(nm)
+
 class container:
-    def __init__(self, nm, mode):
+    def __init__(self, nm, mode, backend = None, mmap = False, crc = None):
         self.nm = nm
         self.mode = mode
         self.z = None
         self.meta = None
 
-        if self.mode == 'r':
+        if backend is None:
+            backend = 'zip'
+            if self.mode != 'w' and casket.isCasket(self.nm):
+                backend = 'casket'
+        assert backend in ['zip', 'casket']
+        self.backend = backend
+
+        if self.backend == 'casket':
+            self.z = casket.casket(self.nm, self.mode, mmap, crc)
+            self.pending = []
+            if self.mode == 'r' or self.mode == 'a':
+                self._readMeta()
+            else:
+                self.meta = Meta()
+        elif self.mode == 'r':
             self.z = zipfile.ZipFile(self.nm, self.mode, allowZip64=True)
-            self.meta = cPickle.load(self.z.open('__meta__'))
+            self._readMeta()
         elif self.mode == 'a':
-            with zipfile.ZipFile(self.nm, 'r') as z:
-                self.meta = cPickle.load(z.open('__meta__'))
             self.z = zipfile.ZipFile(self.nm, self.mode, allowZip64=True)
+            self._readMeta()
         else:
             self.z = zipfile.ZipFile(self.nm, self.mode, allowZip64=True)
-            self.meta = {}
+            self.meta = Meta()
+
+    def _readMeta(self):
+        with self.open('__meta__') as f:
+            m = cPickle.loads(f.read())
+        v = m.pop('__version__', 1)
+        assert v <= metaVersion
+        lazy = m.pop('__lazy__', [])
+        self.meta = Meta(m, lazy, self._readMetaValue)
+
+    def _readMetaValue(self, k):
+        with self.open('__meta__.' + k) as f:
+            return _loadMetaValue(f.read())
+
+    def _writeMeta(self):
+        """
+        Write the meta-data, storing the large values in their own
+        members. Values that were stored separately and have not been
+        loaded are left as they are.
+        """
+        m = {}
+        lazy = []
+        for (k, v) in self.meta.loaded.items():
+            if isinstance(v, (list, tuple, array.array)) and len(v) > metaThreshold:
+                self.add('__meta__.' + k, _dumpMetaValue(v))
+                lazy.append(k)
+            else:
+                m[k] = v
+        lazy += list(self.meta.lazy)
+        m['__version__'] = metaVersion
+        m['__lazy__'] = lazy
+        self.add('__meta__', cPickle.dumps(m, 2))
 
     def __enter__(self):
         return self
@@ -88,26 +287,75 @@ class container:
 
     def creat(self, fn, comp = False):
         assert self.z is not None
+        if self.backend == 'casket':
+            if self.z.fip is not None:
+                return CasketSpoolFile(self, fn)
+            return CasketStreamFile(self, fn)
         return SelfZippingFile(self.z, fn, comp)
 
     def add(self, fn, bytes):
         assert self.z is not None
+        if self.backend == 'casket':
+            if self.z.fip is not None:
+                self.pending.append(('content', fn, bytes))
+            else:
+                self.z.add_content(fn, bytes)
+            return
         self.z.writestr(fn, bytes)
 
     def write(self, zfn, fn, comp = False):
         assert self.z is not None
+        if self.backend == 'casket':
+            self.add_file(zfn, fn)
+            return
         flg = zipfile.ZIP_STORED
         if comp:
             flg = zipfile.ZIP_DEFLATED
         self.z.write(fn, zfn, flg)
 
+    def add_file(self, zfn, fn):
+        if self.z.fip is not None:
+            self.pending.append(('file', zfn, fn))
+        else:
+            self.z.add_file(zfn, fn)
+
+    def _addSpooled(self, zfn, tfn):
+        if self.z.fip is not None:
+            self.pending.append(('spool', zfn, tfn))
+        else:
+            self.z.add_file(zfn, tfn)
+            os.remove(tfn)
+
+    def _addPending(self):
+        """
+        Add the casket members that were created while a stream
+        was open.
+        """
+        pending = self.pending
+        self.pending = []
+        for (kind, zfn, x) in pending:
+            if kind == 'spool':
+                self._addSpooled(zfn, x)
+            elif kind == 'file':
+                self.add_file(zfn, x)
+            else:
+                self.add(zfn, x)
+
     def open(self, fn):
         return self.z.open(fn)
 
     def close(self):
         assert self.z is not None
+        if self.backend == 'casket':
+            if self.mode == 'w' or self.mode == 'a':
+                assert self.z.fip is None
+                self._addPending()
+                self._writeMeta()
+            self.z.close()
+            self.z = None
+            return
         if (self.mode == 'w' or self.mode == 'a'):
             with warnings.catch_warnings():
                 warnings.simplefilter("ignore")
-                self.z.writestr('__meta__', cPickle.dumps(self.meta))
+                self._writeMeta()
         self.z.close()
@@ -37,24 +37,81 @@ The `add_stream()` method returns a file-like object supporting
 `write()` in to which the content of the file may be written. The
 file object acts as a context manager. If a stream is open, then
 no other file may be written until it is closed.
+
+A casket may also be opened for reading with the casket memory mapped
+(`casket(fn, 'r', mmap=True)`). Reading files then involves no system
+calls, the file objects returned by `open()` are independent of one
+another, and the pages of the casket are shared between all the
+processes that map it. In addition, the `view()` method returns a
+zero-copy buffer over the content of a file, and the `array()` method
+returns a read-only NumPy array over it.
+
+An existing casket may be opened with mode 'a' to add (or replace)
+files. The new files are written after the old TOC, and a new TOC is
+written when the casket is closed. Since the old versions of the files
+(and the old TOCs) remain in the casket, the `compact()` method may be
+used to rewrite it with just the most recent version of each file.
+
+If a casket is created with `crc=True`, the TOC entry for each file
+includes the CRC32 of its content, <offset, length, crc>. When a casket
+is opened for appending, CRCs are written if its TOC has them, unless
+`crc` is given. The CRC of a file is checked the first time it is read
+in full: when a file object from `open()` that has been read
+sequentially from the start reaches the end, or is closed (the rest of
+the file is read to complete the check), or when `view()` or `array()`
+is used on the file. `ChecksumError` is raised if it does not match.
+Once a file has been checked it is not checked again. The `verify()`
+method checks all the files in a casket.
 """
 
 import json
+import mmap as _mmap
 import os
 import struct
+import tempfile
+import zlib
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class MultipleOpenFiles(Exception):
     def __init__(self):
-        super(MultipleOpenFiles, elf).__init__('cannot add to archive while streaming object open')
+        super(MultipleOpenFiles, self).__init__('cannot add to archive while streaming object open')
+
+class ChecksumError(Exception):
+    def __init__(self, afn):
+        super(ChecksumError, self).__init__('checksum mismatch for ' + afn)
 
 _block_size_ = 1024*1024 # 1MB
 
 class CasketReader(object):
-    def __init__(self, fo, p, l):
+    def __init__(self, fo, p, l, afn = None, crc = None, ar = None):
         self.fo = fo
         self.p = p
         self.l = l
         self.o = 0
+        self.afn = afn
+        self.crc = crc
+        self.ar = ar
+        self.c = 0
+        self.seq = True
+
+    def _check(self, w):
+        """
+        Accumulate the CRC of content read sequentially from the start
+        of the file, checking it when the end is reached.
+        """
+        if self.crc is None or not self.seq:
+            return
+        self.c = zlib.crc32(w, self.c)
+        if self.o == self.l:
+            if (self.c & 0xFFFFFFFF) != self.crc:
+                raise ChecksumError(self.afn)
+            if self.ar is not None:
+                self.ar.verified.add(self.afn)
+            self.crc = None
 
     def read(self, z = None):
         """
@@ -73,9 +130,91 @@ class CasketReader(object):
         w = self.fo.read(z)
         assert len(w) == z
         self.o += z
+        self._check(w)
 
         return w
 
+    def seekable(self):
+        return True
+
+    def seek(self, o, whence = os.SEEK_SET):
+        """
+        Set the position within the casket object.
+        """
+        if whence == os.SEEK_CUR:
+            o += self.o
+        elif whence == os.SEEK_END:
+            o += self.l
+        assert 0 <= o
+        o = min(o, self.l)
+        if o == 0:
+            self.c = 0
+            self.seq = True
+        elif o != self.o:
+            self.seq = False
+        self.o = o
+
+    def tell(self):
+        return self.o
+
+    def close(self):
+        """
+        Close the reader. If the file has been read sequentially from
+        the start, and has a CRC which has not been checked, the rest of
+        the file is read, and the CRC checked.
+        """
+        if self.crc is not None and self.seq:
+            while self.o < self.l:
+                self.read(_block_size_)
+        self.crc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, v, tb):
+        if t is not None:
+            return False
+        self.close()
+        return True
+
+class CasketMappedReader(CasketReader):
+    """
+    A reader for a casket object in a memory mapped casket.
+    """
+    def __init__(self, mm, p, l, afn = None, crc = None, ar = None):
+        super(CasketMappedReader, self).__init__(None, p, l, afn, crc, ar)
+        self.mm = mm
+
+    def read(self, z = None):
+        """
+        Read content from a casket object. The parameter `z` is the
+        number of bytes to read. If `z` is None, then the rest of
+        the file is read.
+        """
+        if z is None:
+            z = self.l - self.o
+        z = min(z, self.l - self.o)
+
+        if z == 0:
+            return ''
+
+        q = self.p + self.o
+        self.o += z
+        w = self.mm[q:q+z]
+        self._check(w)
+        return w
+
+def _view(mm, p, l):
+    """
+    Return a zero-copy view of the region of `mm` of length `l` at
+    offset `p`: a memoryview where possible, and a buffer otherwise
+    (mmap objects do not support memoryview in Python 2).
+    """
+    try:
+        return memoryview(mm)[p:p+l]
+    except TypeError:
+        return buffer(mm, p, l)
+
 class CasketStreamWriter(object):
     def __init__(self, ar, afn):
         self.ar = ar
@@ -83,6 +222,7 @@ class CasketStreamWriter(object):
         self.ar.fo.seek(0, os.SEEK_END)
         self.p = self.ar.fo.tell()
         self.l = 0
+        self.c = 0
         self.closed = False
 
     def write(self, dat):
@@ -90,15 +230,21 @@ class CasketStreamWriter(object):
         Write content in to a casket file.
         """
         self.l += len(dat)
+        if self.ar.mode == 'a':
+            # Files may also be read in append mode.
+            self.ar.fo.seek(0, os.SEEK_END)
         self.ar.fo.write(dat)
+        if self.ar.crc:
+            self.c = zlib.crc32(dat, self.c)
 
     def close(self):
         """
         Close a stream writing in to a casket.
         """
         assert not self.closed
-        self.ar.updateToc(self.afn, self.p, self.l)
+        self.ar.updateToc(self.afn, self.p, self.l, self.c)
         self.ar.fip = None
+        self.closed = True
 
     def __enter__(self):
         return self
@@ -110,21 +256,59 @@ class CasketStreamWriter(object):
             self.close()
         return True
 
+def isCasket(fn):
+    """
+    Determine whether the file `fn` is a casket, by checking that it
+    ends with a well formed TOC. (An empty file is an empty casket.)
+    """
+    with open(fn) as f:
+        f.seek(0, os.SEEK_END)
+        n = f.tell()
+        if n == 0:
+            return True
+        if n < 8:
+            return False
+        f.seek(-8, os.SEEK_END)
+        z = struct.unpack('Q', f.read(8))[0]
+        if z + 8 > n:
+            return False
+        f.seek(-(8+z), os.SEEK_END)
+        w = f.read(z)
+    if not w.startswith('{'):
+        return False
+    try:
+        return isinstance(json.loads(w), dict)
+    except ValueError:
+        return False
+
 class casket(object):
-    def __init__(self, fn, mode='r'):
+    def __init__(self, fn, mode='r', mmap=False, crc=None):
         self.fn = fn
         self.mode = mode
+        self.mm = None
+        self.crc = bool(crc)
+        self.verified = set()
         if mode == 'r':
             self.fo = open(fn, mode)
             self.toc = {}
             self._readToc()
             self.stale = False
             self.fip = None
+            if mmap and os.fstat(self.fo.fileno()).st_size > 0:
+                self.mm = _mmap.mmap(self.fo.fileno(), 0, access=_mmap.ACCESS_READ)
         elif mode == 'w':
-            self.fo = open(fn, mode)
+            self.fo = open(fn, 'w+')
             self.toc = {}
             self.stale = True
             self.fip = None
+        elif mode == 'a':
+            self.fo = open(fn, 'r+')
+            self.toc = {}
+            self._readToc()
+            if crc is None:
+                self.crc = any([len(e) > 2 for es in self.toc.values() for e in es])
+            self.stale = False
+            self.fip = None
 
     def list(self):
         """
@@ -139,7 +323,7 @@ class casket(object):
         return r
 
     def add_file(self, afn, fn):
-        assert self.mode == 'w'
+        assert self.mode in ['w', 'a']
 
         if self.fip is not None:
             raise MultipleOpenFiles
@@ -149,16 +333,19 @@ class casket(object):
 
         with open(fn, 'r') as f:
             l = 0
+            c = 0
             w = f.read(_block_size_)
             while len(w) > 0:
                 l += len(w)
                 self.fo.write(w)
+                if self.crc:
+                    c = zlib.crc32(w, c)
                 w = f.read(_block_size_)
 
-        self.updateToc(afn, p, l)
+        self.updateToc(afn, p, l, c)
 
     def add_content(self, afn, data):
-        assert self.mode == 'w'
+        assert self.mode in ['w', 'a']
 
         if self.fip is not None:
             raise MultipleOpenFiles
@@ -168,10 +355,13 @@ class casket(object):
         l = len(data)
         self.fo.write(data)
 
-        self.updateToc(afn, p, l)
+        c = 0
+        if self.crc:
+            c = zlib.crc32(data)
+        self.updateToc(afn, p, l, c)
 
     def add_stream(self, afn):
-        assert self.mode == 'w'
+        assert self.mode in ['w', 'a']
 
         if self.fip is not None:
             raise MultipleOpenFiles
@@ -180,22 +370,130 @@ class casket(object):
         return self.fip
 
     def open(self, afn):
-        assert self.mode == 'r'
+        assert self.mode in ['r', 'a']
 
-        (p, l) = self.toc[afn][-1]
+        e = self.toc[afn][-1]
+        (p, l) = e[:2]
+        crc = None
+        if len(e) > 2 and afn not in self.verified:
+            crc = e[2]
 
-        return CasketReader(self.fo, p, l)
+        if self.mm is not None:
+            return CasketMappedReader(self.mm, p, l, afn, crc, self)
+        return CasketReader(self.fo, p, l, afn, crc, self)
+
+    def _checkView(self, afn, v):
+        """
+        Check the CRC of the file `afn`, given a view `v` of its whole
+        content, if it has one that has not been checked.
+        """
+        e = self.toc[afn][-1]
+        if len(e) < 3 or afn in self.verified:
+            return
+        if (zlib.crc32(v) & 0xFFFFFFFF) != e[2]:
+            raise ChecksumError(afn)
+        self.verified.add(afn)
+
+    def verify(self):
+        """
+        Check the CRCs of the files in the casket which have them,
+        raising `ChecksumError` if any do not match.
+        """
+        self.verified.clear()
+        for afn in self.toc.keys():
+            f = self.open(afn)
+            while len(f.read(_block_size_)) > 0:
+                pass
+
+    def view(self, afn):
+        """
+        Return a zero-copy buffer over the content of the file `afn`.
+        The casket must have been opened with `mmap=True`, and the
+        buffer is only valid until the casket is closed.
+        """
+        assert self.mm is not None
 
-    def updateToc(self, afn, p, l):
+        (p, l) = self.toc[afn][-1][:2]
+
+        self._checkView(afn, _view(self.mm, p, l))
+        v = _view(self.mm, p, l)
+        self._checkView(afn, v)
+        return v
+
+    def array(self, afn, dtype, offset = 0, count = -1):
+        """
+        Return a read-only NumPy array of type `dtype` over the content
+        of the file `afn`, starting `offset` bytes in to the file,
+        without copying. The casket must have been opened with
+        `mmap=True`.
+
+        Requires NumPy.
+        """
+        if np is None:
+            raise ImportError('casket.array requires numpy')
+        assert self.mm is not None
+
+        (p, l) = self.toc[afn][-1][:2]
+
+        self._checkView(afn, _view(self.mm, p, l))
+        v = _view(self.mm, p + offset, l - offset)
+        return np.frombuffer(v, dtype=dtype, count=count)
+
+    def updateToc(self, afn, p, l, c = 0):
         if afn not in self.toc:
             self.toc[afn] = []
-        self.toc[afn].append((p, l))
+        if self.crc:
+            self.toc[afn].append((p, l, c & 0xFFFFFFFF))
+        else:
+            self.toc[afn].append((p, l))
+        self.stale = True
+
+    def compact(self):
+        """
+        Rewrite the casket keeping only the most recent version of each
+        file, and a single TOC. The casket must have been opened for
+        writing or appending, and no stream may be open.
+        """
+        assert self.mode in ['w', 'a']
+
+        if self.fip is not None:
+            raise MultipleOpenFiles
+
+        d = os.path.dirname(os.path.abspath(self.fn))
+        (fd, tfn) = tempfile.mkstemp(suffix='.compact', dir=d)
+        toc = {}
+        try:
+            with os.fdopen(fd, 'w') as f:
+                for (afn, es) in sorted(self.toc.items()):
+                    e = es[-1]
+                    (p, l) = e[:2]
+                    q = f.tell()
+                    self.fo.seek(p, os.SEEK_SET)
+                    n = l
+                    while n > 0:
+                        w = self.fo.read(min(n, _block_size_))
+                        assert len(w) > 0
+                        f.write(w)
+                        n -= len(w)
+                    toc[afn] = [[q, l] + list(e[2:])]
+            os.chmod(tfn, os.fstat(self.fo.fileno()).st_mode & 0777)
+        except:
+            os.remove(tfn)
+            raise
+        self.fo.close()
+        os.rename(tfn, self.fn)
+        self.fo = open(self.fn, 'r+')
+        self.toc = toc
         self.stale = True
 
     def flush(self):
         pass
 
     def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+
         if not self.stale:
             self.fo.close()
             self.fo = None
@@ -217,6 +515,9 @@ class casket(object):
         return True
 
     def _readToc(self):
+        self.fo.seek(0, os.SEEK_END)
+        if self.fo.tell() == 0:
+            return
         self.fo.seek(-8, os.SEEK_END)
         w = self.fo.read(8)
         z = struct.unpack('Q', w)[0]
@@ -0,0 +1,295 @@
+"""
+This module provides a columnar layout for the *k*-mer counts of many
+samples in a single container.
+
+A matrix consists of one sorted vector of *k*-mers, which is shared by
+all the samples, and one vector of counts per sample, giving the count
+(possibly 0) of each *k*-mer in that sample. All the vectors are written
+in blocks of `pykmer.container.vectors.blockSize` elements, so the
+blocks of the count vectors line up with the blocks of the *k*-mers, and
+the block directories of the vectors (see `pykmer.container.vectors`)
+may be used to read a range of rows without reading the whole of any
+vector.
+
+For a matrix named `nm` the members of the container are
+
+`nm + '-kmers'`
+    the shared vector of *k*-mers.
+`nm + '-counts-' + str(j)`
+    the vector of counts for sample `j`.
+
+and the meta-data holds the number of rows (`nm + '-N'`) and the list of
+sample names (`nm + '-samples'`).
+
+A matrix is written with a `MatrixWriter` (or `writeMatrix` or
+`mergeCounts`), and read with a `matrix` object, which provides access
+to the column of counts for a single sample, and to rows of counts for
+*k*-mers.
+
+So that matrices with many samples do not need a file (and a writer)
+per sample open at once, the writer spools the rows of counts to a
+single temporary file, and when it is closed, writes the count vectors
+from it in batches of at most `maxColumns` samples.
+"""
+
+__docformat__ = 'restructuredtext'
+
+from pykmer.file import tmpfile
+import pykmer.container.vectors as vectors
+
+import array
+import heapq
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+maxColumns = 64
+
+_spoolSize = 1 << 20
+
+def _column(nm, j):
+    return nm + '-counts-' + str(j)
+
+class MatrixWriter:
+    """
+    A writer for a count matrix over the list of sample names
+    `samples`. Rows are added in *k*-mer order with `append` or
+    `appendBlock`.
+    """
+    def __init__(self, K, z, samples, nm = 'matrix'):
+        assert 'K' not in z.meta or z.meta['K'] == K
+        self.K = K
+        self.z = z
+        self.nm = nm
+        self.samples = list(samples)
+        if K > 32:
+            self.kw = vectors.writer128(z, nm + '-kmers')
+        else:
+            self.kw = vectors.writer64(z, nm + '-kmers')
+        self.tfn = tmpfile('.rows')
+        self.tf = open(self.tfn, 'w+')
+        self.rows = array.array('I', [])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, v, tb):
+        if t is not None:
+            self.tf.close()
+            os.remove(self.tfn)
+            return False
+        self.close()
+        return True
+
+    def _spool(self):
+        self.rows.tofile(self.tf)
+        self.rows = array.array('I', [])
+
+    def append(self, x, cs):
+        """
+        Append the *k*-mer `x`, with the counts `cs`, one per sample.
+        """
+        assert len(cs) == len(self.samples)
+        self.kw.append(x)
+        self.rows.extend(cs)
+        if len(self.rows) >= _spoolSize:
+            self._spool()
+
+    def appendBlock(self, xs, cols):
+        """
+        Append the array of *k*-mers `xs` (a packed array, for K > 32),
+        with the list `cols` of arrays of counts, one per sample.
+        """
+        S = len(self.samples)
+        assert len(cols) == S
+        self.kw.appendBlock(xs)
+        if S == 0:
+            return
+        m = len(cols[0])
+        if np is not None:
+            v = np.empty((m, S), dtype=np.uint32)
+            for j in xrange(S):
+                v[:, j] = cols[j]
+            self.rows.fromstring(v.tostring())
+        else:
+            for i in xrange(m):
+                for j in xrange(S):
+                    self.rows.append(cols[j][i])
+        if len(self.rows) >= _spoolSize:
+            self._spool()
+
+    def _columns(self, j0, j1):
+        """
+        Write the count vectors for samples [`j0`, `j1`) from the
+        spooled rows.
+        """
+        S = len(self.samples)
+        cws = [vectors.writer32(self.z, _column(self.nm, j)) for j in xrange(j0, j1)]
+        self.tf.seek(0)
+        m = max(1, _spoolSize // S)
+        while True:
+            s = self.tf.read(4 * S * m)
+            if len(s) == 0:
+                break
+            if np is not None:
+                v = np.frombuffer(s, dtype=np.uint32).reshape(-1, S)
+                for j in xrange(j0, j1):
+                    cws[j - j0].appendBlock(array.array('I', v[:, j].tostring()))
+            else:
+                rs = array.array('I', [])
+                rs.fromstring(s)
+                for j in xrange(j0, j1):
+                    cws[j - j0].appendBlock(rs[j::S])
+        for w in cws:
+            assert w.n == self.kw.n
+            w.close()
+
+    def close(self):
+        self.kw.close()
+        self._spool()
+        self.tf.flush()
+        S = len(self.samples)
+        for j in xrange(0, S, maxColumns):
+            self._columns(j, min(S, j + maxColumns))
+        self.tf.close()
+        os.remove(self.tfn)
+        self.z.meta['K'] = self.K
+        self.z.meta[self.nm + '-N'] = self.kw.n
+        self.z.meta[self.nm + '-samples'] = self.samples
+
+def writeMatrix(K, z, samples, vs, nm = 'matrix'):
+    """
+    Write the sequence `vs` of (kmer, counts) pairs, in *k*-mer order,
+    as a matrix over the sample names `samples`.
+    """
+    with MatrixWriter(K, z, samples, nm) as w:
+        for (x, cs) in vs:
+            w.append(x, cs)
+    return w.kw.n
+
+def _tag(j, xs):
+    for (x, c) in xs:
+        yield (x, j, c)
+
+def mergeCounts(K, z, samples, srcs, nm = 'matrix'):
+    """
+    Write a matrix from the list `srcs` of sequences of (kmer, count)
+    pairs in *k*-mer order, one for each of the sample names `samples`.
+    The matrix has a row for each *k*-mer occurring in any sample.
+    """
+    assert len(samples) == len(srcs)
+    S = len(srcs)
+    n = 0
+    with MatrixWriter(K, z, samples, nm) as w:
+        x0 = None
+        cs = None
+        for (x, j, c) in heapq.merge(*[_tag(j, srcs[j]) for j in xrange(S)]):
+            if x != x0:
+                if cs is not None:
+                    w.append(x0, cs)
+                    n += 1
+                x0 = x
+                cs = [0 for i in xrange(S)]
+            cs[j] += c
+        if cs is not None:
+            w.append(x0, cs)
+            n += 1
+    return n
+
+class matrix:
+    """
+    A count matrix in the container `z`.
+    """
+    def __init__(self, z, nm = 'matrix'):
+        self.z = z
+        self.nm = nm
+        self.K = z.meta['K']
+        self.N = z.meta[nm + '-N']
+        self.samples = z.meta[nm + '-samples']
+
+    def sample(self, j):
+        """
+        Return the index of sample `j`, which may be given by name.
+        """
+        if isinstance(j, basestring):
+            return self.samples.index(j)
+        assert 0 <= j < len(self.samples)
+        return j
+
+    def kmers(self):
+        """
+        Read the *k*-mers of the matrix in to an array (a packed array,
+        for K > 32).
+        """
+        if self.K > 32:
+            return vectors.read128array(self.z, self.nm + '-kmers', self.N)
+        return vectors.read64array(self.z, self.nm + '-kmers', self.N)
+
+    def column(self, j):
+        """
+        Read the counts for sample `j` (an index or name) in to an
+        array. None of the other samples' counts are read.
+        """
+        j = self.sample(j)
+        return vectors.read32array(self.z, _column(self.nm, j), self.N)
+
+    def rank(self, x):
+        """
+        Return the row number of the *k*-mer `x`, or None if it is not
+        in the matrix. Only the block of *k*-mers that would hold `x`
+        is read.
+        """
+        nm = self.nm + '-kmers'
+        if self.K > 32:
+            (r, y) = vectors.findGeneric(self.z, nm, 2*self.N, x, 'L', True)
+        else:
+            (r, y) = vectors.findGeneric(self.z, nm, self.N, x, 'L')
+        if y != x:
+            return None
+        return r
+
+    def rowAt(self, r):
+        """
+        Return an array of the counts in row `r`, reading just the
+        block of each column that holds it.
+        """
+        res = array.array('I', [])
+        for j in xrange(len(self.samples)):
+            for a in vectors.read32range(self.z, _column(self.nm, j), self.N, r, r + 1):
+                res.extend(a)
+        return res
+
+    def row(self, x):
+        """
+        Return an array of the counts of the *k*-mer `x` in each
+        sample, or None if it is not in the matrix.
+        """
+        r = self.rank(x)
+        if r is None:
+            return None
+        return self.rowAt(r)
+
+    def rows(self, i, j):
+        """
+        Return the *k*-mers in rows [`i`, `j`) as an array (a packed
+        array, for K > 32), along with a list of arrays of their counts,
+        one per sample.
+        """
+        nm = self.nm + '-kmers'
+        if self.K > 32:
+            xs = _concat('L', vectors.read128range(self.z, nm, self.N, i, j))
+        else:
+            xs = _concat('L', vectors.read64range(self.z, nm, self.N, i, j))
+        cols = []
+        for s in xrange(len(self.samples)):
+            cols.append(_concat('I', vectors.read32range(self.z, _column(self.nm, s), self.N, i, j)))
+        return (xs, cols)
+
+def _concat(w, blks):
+    r = array.array(w, [])
+    for a in blks:
+        r.extend(a)
+    return r
@@ -1,6 +1,9 @@
 """
 This module provides functions for reading and writing sorted sequences
 of *k*-mers in a compressed representation.
+
+For K > 32, the *k*-mers are stored as pairs of 64-bit words, and
+`readKmersBlock` yields packed arrays (see `pykmer.basics128`).
 """
 
 __docformat__ = 'restructuredtext'
@@ -8,14 +11,26 @@ __docformat__ = 'restructuredtext'
 import pykmer.container.vectors as vectors
 from itertools import izip
 
-def writeKmers(K, xs, z, nm=None):
+def writeKmers(K, xs, z, nm=None, enc=None, threads=0):
+    """
+    Write the sorted *k*-mers `xs` to the container `z`. If `enc` is
+    'delta', the *k*-mers are stored with the delta encoding (see
+    `pykmer.container.vectors`), which is considerably more compact for
+    dense sets of *k*-mers. If `threads` > 0, the blocks of *k*-mers
+    are compressed in parallel (see `pykmer.container.vectors`). The
+    readers determine the encoding and compression from the metadata.
+    """
     assert 'K' not in z.meta or z.meta['K'] == K
     assert nm is not None or 'kmers' not in z.meta
 
     if nm is None:
         nm = str(K) + '-mers'
 
-    n = vectors.write64(z, xs, nm)
+    if K > 32:
+        assert enc is None
+        n = vectors.write128(z, xs, nm, threads)
+    else:
+        n = vectors.write64(z, xs, nm, enc, threads)
     z.meta['kmers'] = nm
     z.meta['K'] = K
     z.meta[nm + '-' + 'N'] = n
@@ -23,13 +38,17 @@ def writeKmers(K, xs, z, nm=None):
     return n
 
 class KmerWriter:
-    def __init__(self, K, z, nm = None):
+    def __init__(self, K, z, nm = None, enc = None, threads = 0):
         self.K = K
         if nm is None:
             nm = str(K) + '-mers'
         self.nm = nm
         self.z = z
-        self.w = vectors.writer64(z, nm)
+        if K > 32:
+            assert enc is None
+            self.w = vectors.writer128(z, nm, threads)
+        else:
+            self.w = vectors.writer64(z, nm, enc, threads)
 
     def __enter__(self):
         return self.w
@@ -46,8 +65,8 @@ class KmerWriter:
         self.z.meta['K'] = self.K
         self.z.meta[self.nm + '-' + 'N'] = self.w.n
 
-def kmerWriter(z, K, nm = None):
-    return KmerWriter(K, z, nm)
+def kmerWriter(z, K, nm = None, enc = None, threads = 0):
+    return KmerWriter(K, z, nm, enc, threads)
 
 def readKmers(z, nm = None):
     assert nm is not None or 'kmers' in z.meta
@@ -58,6 +77,8 @@ def readKmers(z, nm = None):
     K = z.meta['K']
     N = z.meta[nm + '-' + 'N']
 
+    if K > 32:
+        return vectors.read128(z, nm, N)
     return vectors.read64(z, nm, N)
 
 def readKmersBlock(z, nm = None):
@@ -69,8 +90,62 @@ def readKmersBlock(z, nm = None):
     K = z.meta['K']
     N = z.meta[nm + '-' + 'N']
 
+    if K > 32:
+        return vectors.read128block(z, nm, N)
     return vectors.read64block(z, nm, N)
 
+def readKmersArray(z, nm = None):
+    """
+    Read the whole of a vector of *k*-mers in to a single array
+    (a packed array, for K > 32).
+    """
+    assert nm is not None or 'kmers' in z.meta
+
+    if nm is None:
+        nm = z.meta['kmers']
+
+    K = z.meta['K']
+    N = z.meta[nm + '-' + 'N']
+
+    if K > 32:
+        return vectors.read128array(z, nm, N)
+    return vectors.read64array(z, nm, N)
+
+def readKmersRange(z, i, j, nm = None):
+    """
+    Read the *k*-mers with ranks in the range [`i`, `j`) as a sequence
+    of arrays (packed arrays, for K > 32), reading only the blocks of
+    the vector that contain them.
+    """
+    assert nm is not None or 'kmers' in z.meta
+
+    if nm is None:
+        nm = z.meta['kmers']
+
+    K = z.meta['K']
+    N = z.meta[nm + '-' + 'N']
+
+    if K > 32:
+        return vectors.read128range(z, nm, N, i, j)
+    return vectors.read64range(z, nm, N, i, j)
+
+def seekKmer(z, x, nm = None):
+    """
+    Return the rank of the first *k*-mer not less than `x`, reading
+    only the block of the vector that contains it.
+    """
+    assert nm is not None or 'kmers' in z.meta
+
+    if nm is None:
+        nm = z.meta['kmers']
+
+    K = z.meta['K']
+    N = z.meta[nm + '-' + 'N']
+
+    if K > 32:
+        return vectors.seek128(z, nm, N, x)
+    return vectors.seek64(z, nm, N, x)
+
 def writeCounts(K, xs, z, nm=None):
     assert 'K' not in z.meta or z.meta['K'] == K
     assert nm is not None or 'counts' not in z.meta
@@ -133,7 +208,20 @@ def readCountsBlock(z, nm = None):
     K = z.meta['K']
     N = z.meta[nm + '-' + 'N']
 
-    return vectors.read32Block(z, nm, N)
+    return vectors.read32block(z, nm, N)
+
+def readCountsArray(z, nm = None):
+    """
+    Read the whole of a vector of counts in to a single array.
+    """
+    assert nm is not None or 'counts' in z.meta
+
+    if nm is None:
+        nm = z.meta['counts']
+
+    N = z.meta[nm + '-' + 'N']
+
+    return vectors.read32array(z, nm, N)
 
 def writeKmersAndCounts(K, vs, z, nm = None):
     if nm is None:
@@ -150,6 +238,10 @@ def writeKmersAndCounts(K, vs, z, nm = None):
                     cw.append(c)
 
 def writeKmersAndCountsBlock(K, vs, z, nm = None):
+    """
+    Write the sequence `vs` of pairs of arrays of *k*-mers (packed
+    arrays, for K > 32) and counts.
+    """
     if nm is None:
         with KmerWriter(K, z) as kw, CountsWriter(K, z) as cw:
                 for (xs,cs) in vs:
@@ -171,61 +263,43 @@ def readKmersAndCounts(z, nm=None):
     return izip(xs, cs)
 
 def readKmersAndCountsBlock(z, nm=None):
+    """
+    A generator yielding aligned pairs of arrays of *k*-mers (packed
+    arrays, for K > 32) and their counts. Where the blocks of the two
+    vectors line up, as they do when written with `writeKmersAndCounts`
+    or `writeKmersAndCountsBlock`, the blocks are yielded as they are
+    read, otherwise they are sliced to align them.
+    """
     if nm is None:
-        xs = readKmers(z)
-        cs = readCounts(z)
+        kn = z.meta['kmers']
+        cn = z.meta['counts']
     else:
-        xs = readKmers(z, nm + '-kmers')
-        cs = readCounts(z, nm + '-counts')
-
-    B = 65536
-    moreXs = True
-    moreCs = True
+        kn = nm + '-kmers'
+        cn = nm + '-counts'
+    assert z.meta[kn + '-N'] == z.meta[cn + '-N']
 
-    try:
-        xsBlk = xs.next()
-        xsZ = len(xsBlk)
-    except StopIteration:
-        moreXs = False
+    xs = readKmersBlock(z, kn)
+    cs = readCountsBlock(z, cn)
 
-    try:
-        csBlk = cs.next()
-        csZ = len(csBlk)
-    except StopIteration:
-        moreCs = False
+    m = 1
+    if z.meta['K'] > 32:
+        m = 2
 
-    blk = []
+    xBlk = None
+    xsZ = 0
     i = 0
-    j = 0
-    n = 0
-    while moreXs and moreYs:
-        while i < xsZ and j < csZ and n < B:
-            blk.append((xsBlk[i], csBlk[j]))
-
-        if moreXs and i == xsZ:
-            try:
-                xsBlk = xs.next()
-                xsZ = len(xsBlk)
+    for csBlk in cs:
+        csZ = len(csBlk)
+        j = 0
+        while j < csZ:
+            if i == xsZ:
+                xBlk = xs.next()
+                xsZ = len(xBlk) // m
                 i = 0
-            except StopIteration:
-                moreXs = False
-
-        if moreCs and j == csZ:
-            try:
-                csBlk = cs.next()
-                csZ = len(csBlk)
-                j = 0
-            except StopIteration:
-                moreCs = False
-
-        if n == B:
-            yield blk
-            blk = []
-            n = 0
-
-    if n > 0:
-        yield blk
-
-    assert moreXs == False
-    assert moreYs == False
-
+            t = min(xsZ - i, csZ - j)
+            if t == xsZ and t == csZ:
+                yield (xBlk, csBlk)
+            else:
+                yield (xBlk[m*i:m*(i+t)], csBlk[j:j+t])
+            i += t
+            j += t
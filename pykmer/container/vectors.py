@@ -1,73 +1,350 @@
 """
 This module provides functions for reading and writing sorted sequences
 of *k*-mers in a compressed representation.
+
+Vectors are stored as a sequence of blocks, each a length followed by
+the data. As well as reading vectors an element at a time, they may be
+read a block at a time (`read64block` and friends), as NumPy views of
+the blocks (`read64view` and friends) or in to a single preallocated
+array (`read64array` and friends).
+
+Sorted vectors of 64-bit values (such as *k*-mers) may be written with
+the delta encoding (enc='delta'), in which each block holds its first
+value and element count, followed by the differences between successive
+elements packed with `pykmer.codec64`. Since each block starts with an
+absolute value, blocks may be decoded independently. The encoding is
+recorded in the container's metadata (as `nm + '-enc'`), and the readers
+decode such vectors automatically.
+
+The writers also record a block directory in the metadata (as
+`nm + '-dir'`), an `array.array('L')` with four entries per block: the
+byte offset of the block within the member, the offset of its first
+element, and its first and last values. Using the directory, the range
+readers (`read64range` and friends) and `seek64` skip straight to the
+block holding a given element or value, without decoding the blocks
+before it, and `partition` divides a vector in to block aligned ranges
+that may be processed independently.
+
+Given `threads` > 0, the writers compress each block with zlib in a
+pool of that many threads, rather than leaving compression to the
+container (which compresses a member on a single thread). The blocks are
+written in order as they are completed, and the compression is recorded
+in the metadata (as `nm + '-comp'`). The readers decompress such blocks
+in a pool of `readThreads` threads (by default, up to 4, depending on
+the number of CPUs), which is created when it is first needed, and
+shared by all the readers.
 """
 
 __docformat__ = 'restructuredtext'
 
+import pykmer.codec64 as codec64
+
 import array
+import bisect
+import collections
+import multiprocessing
+import os
 import struct
+import threading
+import zlib
+from multiprocessing.pool import ThreadPool
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 blockSize = 65536
 
+readThreads = min(4, multiprocessing.cpu_count())
+
+compressionLevel = 6
+
+_deltaHeader = 'LLL'
+_deltaHeaderSize = struct.calcsize(_deltaHeader)
+
+def _encodeDelta(a):
+    """
+    Encode the block `a` of sorted 64-bit values. If the block is not
+    sorted, or a difference does not fit in the 60 bits supported by
+    `codec64`, the values are stored unencoded.
+    """
+    m = len(a)
+    if m == 0:
+        return struct.pack(_deltaHeader, 0, 0, 0)
+    ds = []
+    p = a[0]
+    for x in a:
+        d = x - p
+        if d < 0 or d >= (1 << codec64.W):
+            return struct.pack(_deltaHeader, a[0], m, 1) + a.tostring()
+        ds.append(d)
+        p = x
+    ws = array.array('L', codec64.encode(ds[1:]))
+    return struct.pack(_deltaHeader, a[0], m, 0) + ws.tostring()
+
+def _decodeDelta(s):
+    """
+    Decode a block encoded with `_encodeDelta`, returning an array.
+    """
+    (x, m, kind) = struct.unpack(_deltaHeader, s[:_deltaHeaderSize])
+    if kind == 0 and m > 1 and np is not None:
+        return array.array('L', _decodeDeltaArray(s, x, m).tostring())
+    a = array.array('L', [])
+    a.fromstring(s[_deltaHeaderSize:])
+    if kind == 1 or m == 0:
+        return a
+    r = array.array('L', [0]) * m
+    r[0] = x
+    i = 1
+    for d in codec64.decode(a):
+        x += d
+        r[i] = x
+        i += 1
+    return r
+
+def _decodeDeltaArray(s, x, m):
+    """
+    Decode the `m` - 1 codec64 deltas of a delta encoded block with
+    NumPy, returning the values as a NumPy uint64 array. The words are
+    grouped by their tag (the number of codes in them), so the codes
+    are extracted a group at a time, and the values rebuilt with a
+    cumulative sum.
+    """
+    ws = np.frombuffer(s, dtype=np.uint64, offset=_deltaHeaderSize)
+    tags = (ws & np.uint64(15)).astype(np.int64)
+    offs = np.cumsum(tags) - tags
+    ds = np.empty(m - 1, dtype=np.uint64)
+    for t in np.unique(tags).tolist():
+        b = codec64._codes[t]
+        msk = np.uint64((1 << b) - 1)
+        sel = np.flatnonzero(tags == t)
+        v = ws[sel] >> np.uint64(4)
+        o = offs[sel]
+        for j in xrange(t):
+            ds[o + j] = (v >> np.uint64(j*b)) & msk
+    r = np.empty(m, dtype=np.uint64)
+    r[0] = x
+    np.cumsum(ds, out=r[1:])
+    r[1:] += np.uint64(x)
+    return r
+
+def _encoding(z, nm):
+    """
+    Return the encoding of the vector `nm`, or None if it is stored
+    unencoded.
+    """
+    return z.meta.get(nm + '-enc')
+
+def _encode(a, enc):
+    if enc == 'delta':
+        return _encodeDelta(a)
+    return a.tostring()
+
+class _Directory:
+    """
+    Accumulate the block directory of a vector as it is written.
+    """
+    def __init__(self, w):
+        self.ordered = w in 'BHIL'
+        self.d = array.array('L', [])
+        self.off = 0
+        self.n = 0
+
+    def add(self, a, l, first, last):
+        """
+        Record a block of `a` elements, stored in `l` bytes (not
+        including the length).
+        """
+        if len(a) > 0:
+            if not self.ordered:
+                first = 0
+                last = 0
+            self.d.extend([self.off, self.n, first, last])
+        self.off += struct.calcsize('L') + l
+        self.n += len(a)
+
+    def save(self, z, nm):
+        z.meta[nm + '-dir'] = self.d
+
 class GenericWriter:
-    def __init__(self, z, nm, w):
+    def __init__(self, z, nm, w, enc=None, threads=0):
+        assert enc is None or (enc == 'delta' and w == 'L')
         self.w = w
-        self.f = z.creat(nm, True)
+        self.enc = enc
+        self.pool = None
+        if threads > 0:
+            self.pool = ThreadPool(threads)
+            self.q = collections.deque()
+            self.qMax = 2*threads
+            self.f = z.creat(nm, False)
+            z.meta[nm + '-comp'] = 'zlib'
+        else:
+            self.f = z.creat(nm, True)
         self.a = array.array(self.w)
+        self.m = blockSize
         self.n = 0
         self.closed = False
+        self.z = z
+        self.nm = nm
+        self.dir = _Directory(w)
+        if enc is not None:
+            z.meta[nm + '-enc'] = enc
 
     def __enter__(self):
         return self
 
     def __exit__(self, t, v, tb):
         if t is not None:
+            self.stopPool()
             return False
         self.close()
         return True
 
+    def stopPool(self):
+        """
+        Stop the threads compressing blocks, if there are any.
+        """
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
     def close(self):
-        if len(self.a) > 0:
-            self.flush()
+        try:
+            if len(self.a) > 0:
+                self.flush()
+            if self.pool is not None:
+                while len(self.q) > 0:
+                    self.writeNext()
+        finally:
+            self.stopPool()
         self.f.close()
+        self.dir.save(self.z, self.nm)
         self.closed = True
 
     def append(self, x):
         self.n += 1
         self.a.append(x)
-        if len(self.a) == blockSize:
+        if len(self.a) == self.m:
             self.flush()
 
     def appendBlock(self, xs):
-        self.n += 1
+        self.n += len(xs)
+        self.extend(xs)
+
+    def extend(self, xs):
+        """
+        Add the array `xs` to the current block, writing out full
+        blocks of `blockSize` elements.
+        """
         self.a.extend(xs)
-        if len(self.a) >= blockSize:
+        while len(self.a) >= self.m:
+            rest = self.a[self.m:]
+            del self.a[self.m:]
             self.flush()
+            self.a = rest
 
     def flush(self):
-        s = self.a.tostring()
+        s = _encode(self.a, self.enc)
+        (first, last) = self.bounds()
+        if self.pool is None:
+            self.writeBlock(s, self.a, first, last)
+        else:
+            r = self.pool.apply_async(zlib.compress, (s, compressionLevel))
+            self.q.append((r, self.a, first, last))
+            while len(self.q) > self.qMax:
+                self.writeNext()
+        self.a = array.array(self.w, [])
+
+    def writeNext(self):
+        """
+        Write the oldest block being compressed, once it is done.
+        """
+        (r, a, first, last) = self.q.popleft()
+        self.writeBlock(r.get(), a, first, last)
+
+    def writeBlock(self, s, a, first, last):
         v = struct.pack('L', len(s))
         self.f.write(v)
         self.f.write(s)
-        self.a = array.array(self.w, [])
+        self.dir.add(a, len(s), first, last)
+
+    def bounds(self):
+        if len(self.a) == 0:
+            return (0, 0)
+        return (self.a[0], self.a[-1])
 
     def __del__(self):
         assert self.closed == True
 
-def writer64(z, nm):
-    return GenericWriter(z, nm, 'L')
+class Writer128(GenericWriter):
+    """
+    A writer for 128-bit values, which are stored as pairs of 64-bit
+    words, most significant word first, with `blockSize` values in
+    each block.
+    """
+    def __init__(self, z, nm, threads=0):
+        GenericWriter.__init__(self, z, nm, 'L', None, threads)
+        self.m = 2*blockSize
+
+    def bounds(self):
+        """
+        The directory records the most significant words of the first
+        and last values in each block.
+        """
+        if len(self.a) == 0:
+            return (0, 0)
+        return (self.a[0], self.a[-2])
+
+    def append(self, x):
+        self.n += 1
+        self.a.append(x >> 64)
+        self.a.append(x & 0xFFFFFFFFFFFFFFFF)
+        if len(self.a) >= self.m:
+            self.flush()
+
+    def appendBlock(self, xs):
+        """
+        Append the packed array `xs` (see `pykmer.basics128.pack`).
+        """
+        self.n += len(xs) // 2
+        self.extend(xs)
+
+def writer128(z, nm, threads=0):
+    return Writer128(z, nm, threads)
+
+def writer64(z, nm, enc=None, threads=0):
+    return GenericWriter(z, nm, 'L', enc, threads)
 
-def writer32(z, nm):
-    return GenericWriter(z, nm, 'I')
+def writer32(z, nm, threads=0):
+    return GenericWriter(z, nm, 'I', None, threads)
 
-def writer16(z, nm):
-    return GenericWriter(z, nm, 'H')
+def writer16(z, nm, threads=0):
+    return GenericWriter(z, nm, 'H', None, threads)
 
-def writeGeneric(z, xs, nm, w):
+def writeGeneric(z, xs, nm, w, enc=None, threads=0):
     """
     """
+    if threads > 0:
+        with GenericWriter(z, nm, w, enc, threads) as wr:
+            a = wr.a
+            i = 0
+            for x in xs:
+                a.append(x)
+                i += 1
+                if i == blockSize:
+                    wr.n += i
+                    wr.flush()
+                    a = wr.a
+                    i = 0
+            wr.n += i
+        return wr.n
+    assert enc is None or (enc == 'delta' and w == 'L')
+    if enc is not None:
+        z.meta[nm + '-enc'] = enc
     n = 0
+    d = _Directory(w)
     with z.creat(nm, True) as f:
         a = array.array(w, [])
         i = 0
@@ -76,50 +353,189 @@ def writeGeneric(z, xs, nm, w):
             n += 1
             i += 1
             if i == blockSize:
-                s = a.tostring()
+                s = _encode(a, enc)
                 v = struct.pack('L', len(s))
                 f.write(v)
                 f.write(s)
+                d.add(a, len(s), a[0], a[-1])
                 a = array.array(w, [])
                 i = 0
-        s = a.tostring()
+        s = _encode(a, enc)
         v = struct.pack('L', len(s))
         f.write(v)
         f.write(s)
+        if i > 0:
+            d.add(a, len(s), a[0], a[-1])
+    d.save(z, nm)
     return n
 
-def write64(z, xs, nm):
-    return writeGeneric(z, xs, nm, 'L')
+def write128(z, xs, nm, threads=0):
+    with writer128(z, nm, threads) as w:
+        for x in xs:
+            w.append(x)
+    return w.n
 
-def write32(z, xs, nm):
-    return writeGeneric(z, xs, nm, 'I')
+def write64(z, xs, nm, enc=None, threads=0):
+    return writeGeneric(z, xs, nm, 'L', enc, threads)
 
-def write32s(z, xs, nm):
-    return writeGeneric(z, xs, nm, 'i')
+def write32(z, xs, nm, threads=0):
+    return writeGeneric(z, xs, nm, 'I', None, threads)
 
-def write16(z, xs, nm):
-    return writeGeneric(z, xs, nm, 'H')
+def write32s(z, xs, nm, threads=0):
+    return writeGeneric(z, xs, nm, 'i', None, threads)
 
-def readGeneric(z, nm, n, w):
+def write16(z, xs, nm, threads=0):
+    return writeGeneric(z, xs, nm, 'H', None, threads)
+
+def _skip(f, n):
+    """
+    Skip forward `n` bytes in the file `f`, seeking if it is possible,
+    and reading and discarding the bytes otherwise (as is necessary for
+    compressed ZIP members).
     """
+    seekable = getattr(f, 'seekable', None)
+    if seekable is not None and seekable():
+        f.seek(n, 1)
+        return
+    while n > 0:
+        s = f.read(min(n, 1024*1024))
+        assert len(s) > 0
+        n -= len(s)
+
+def _storedBlocks(f):
+    """
+    A generator yielding the blocks stored in `f`, as strings.
     """
     W = struct.calcsize('L')
+    while True:
+        v = f.read(W)
+        if len(v) != W:
+            break
+        l = struct.unpack('L', v)[0]
+        s = f.read(l)
+        assert len(s) == l
+        yield s
+
+_pool = None
+_poolKey = None
+_poolLock = threading.Lock()
+
+def _readPool():
+    """
+    Return the pool of `readThreads` threads shared by the readers,
+    creating it if necessary (or if `readThreads` has changed, or the
+    process has forked since it was created).
+    """
+    global _pool, _poolKey
+    k = (readThreads, os.getpid())
+    with _poolLock:
+        if _poolKey != k:
+            if _pool is not None and _poolKey[1] == k[1]:
+                _pool.close()
+            _pool = ThreadPool(readThreads)
+            _poolKey = k
+        return _pool
+
+def _decompressBlocks(blocks):
+    """
+    A generator decompressing the sequence of `blocks` in the shared
+    pool of `readThreads` threads, yielding them in order.
+    """
+    if readThreads <= 1:
+        for s in blocks:
+            yield zlib.decompress(s)
+        return
+    pool = _readPool()
+    q = collections.deque()
+    for s in blocks:
+        q.append(pool.apply_async(zlib.decompress, (s,)))
+        if len(q) > 2*readThreads:
+            yield q.popleft().get()
+    while len(q) > 0:
+        yield q.popleft().get()
+
+def readBlocks(z, nm, n, w, off=0):
+    """
+    A generator yielding the stored blocks of the vector `nm` as
+    strings, until `n` elements of type `w` have been read. Compressed
+    blocks are decompressed, but encoded blocks are yielded as stored
+    (see `readArrays`). If `off` is given, reading begins with the block
+    at that byte offset.
+    """
+    enc = _encoding(z, nm)
+    comp = z.meta.get(nm + '-comp')
+    assert comp is None or comp == 'zlib'
+    m = struct.calcsize(w)
+    if n <= 0:
+        return
     with z.open(nm) as f:
-        while n > 0:
-            v = f.read(W)
-            if len(v) != W:
+        if off > 0:
+            _skip(f, off)
+        blocks = _storedBlocks(f)
+        if comp is not None:
+            blocks = _decompressBlocks(blocks)
+        for s in blocks:
+            yield s
+            if enc is None:
+                n -= len(s) // m
+            else:
+                n -= struct.unpack(_deltaHeader, s[:_deltaHeaderSize])[1]
+            if n <= 0:
                 break
-            l = struct.unpack('L', v)[0]
-            s = f.read(l)
-            assert len(s) == l
+
+def _mappedViews(z, nm, n, w):
+    """
+    If the container `z` is a memory mapped casket, and the vector `nm`
+    is stored neither encoded nor compressed, return a generator
+    yielding its blocks as read-only NumPy arrays of type `w` referring
+    directly to the mapped file. Otherwise return None.
+    """
+    if np is None or getattr(z, 'backend', None) != 'casket':
+        return None
+    if z.z.mm is None or _encoding(z, nm) is not None:
+        return None
+    if z.meta.get(nm + '-comp') is not None:
+        return None
+    return _mappedBlocks(z.z.view(nm), n, np.dtype(w))
+
+def _mappedBlocks(v, n, dt):
+    h = struct.calcsize('L')
+    p = 0
+    while n > 0:
+        l = struct.unpack_from('L', v, p)[0]
+        m = l // dt.itemsize
+        yield np.frombuffer(v, dtype=dt, count=m, offset=p+h)
+        p += h + l
+        n -= m
+
+def readArrays(z, nm, n, w, off=0):
+    """
+    A generator yielding the blocks of the vector `nm` as arrays
+    of type `w`, decoding them if necessary.
+    """
+    enc = _encoding(z, nm)
+    for s in readBlocks(z, nm, n, w, off):
+        if enc is None:
             a = array.array(w, [])
             a.fromstring(s)
-            m = len(a)
-            i = 0
-            while i < m:
-                yield a[i]
-                i += 1
-            n -= m
+        else:
+            a = _decodeDelta(s)
+        yield a
+
+def readGeneric(z, nm, n, w):
+    """
+    """
+    for a in readArrays(z, nm, n, w):
+        m = len(a)
+        i = 0
+        while i < m:
+            yield a[i]
+            i += 1
+
+def read128(z, nm, n):
+    itr = readGeneric(z, nm, 2*n, 'L')
+    for hi in itr:
+        yield (hi << 64) | itr.next()
 
 def read64(z, nm, n):
     return readGeneric(z, nm, n, 'L')
@@ -136,19 +552,14 @@ def read16(z, nm, n):
 def readGenericBlock(z, nm, n, w):
     """
     """
-    W = struct.calcsize('L')
-    with z.open(nm) as f:
-        while n > 0:
-            v = f.read(W)
-            if len(v) != W:
-                break
-            l = struct.unpack('L', v)[0]
-            s = f.read(l)
-            assert len(s) == l
-            a = array.array(w, [])
-            a.fromstring(s)
-            yield a
-            n -= m
+    return readArrays(z, nm, n, w)
+
+def read128block(z, nm, n):
+    """
+    Read 128-bit values in blocks of packed arrays
+    (see `pykmer.basics128.pack`).
+    """
+    return readGenericBlock(z, nm, 2*n, 'L')
 
 def read64block(z, nm, n):
     return readGenericBlock(z, nm, n, 'L')
@@ -162,3 +573,242 @@ def read32sblock(z, nm, n):
 def read16block(z, nm, n):
     return readGenericBlock(z, nm, n, 'H')
 
+
+def readGenericView(z, nm, n, w):
+    """
+    A generator yielding the blocks of the vector `nm` as read-only
+    NumPy arrays of type `w`, which refer directly to the data read
+    from the container, without copying or per-element iteration.
+    (Encoded blocks are necessarily decoded first.) If the container is
+    a memory mapped casket, the arrays refer directly to the mapped file.
+
+    Requires NumPy.
+    """
+    if np is None:
+        raise ImportError('readGenericView requires numpy')
+    if n <= 0:
+        return
+    vs = _mappedViews(z, nm, n, w)
+    if vs is not None:
+        for v in vs:
+            yield v
+        return
+    dt = np.dtype(w)
+    if _encoding(z, nm) is not None:
+        for a in readArrays(z, nm, n, w):
+            yield np.frombuffer(a, dtype=dt)
+        return
+    for s in readBlocks(z, nm, n, w):
+        yield np.frombuffer(s, dtype=dt)
+
+def read128view(z, nm, n):
+    """
+    Read 128-bit values in blocks of packed NumPy arrays (see
+    `pykmer.basics128.pack`).
+    """
+    return readGenericView(z, nm, 2*n, 'L')
+
+def read64view(z, nm, n):
+    return readGenericView(z, nm, n, 'L')
+
+def read32view(z, nm, n):
+    return readGenericView(z, nm, n, 'I')
+
+def read32sview(z, nm, n):
+    return readGenericView(z, nm, n, 'i')
+
+def read16view(z, nm, n):
+    return readGenericView(z, nm, n, 'H')
+
+def readGenericArray(z, nm, n, w):
+    """
+    Read the whole of the vector `nm`, which has `n` elements of type
+    `w`, returning it as an `array.array`. The array is allocated once,
+    and filled a block at a time, so there is no per-element work.
+    """
+    a = array.array(w, [0]) * n
+    if np is not None and n > 0 and _encoding(z, nm) is None:
+        v = np.frombuffer(a, dtype=np.dtype(w))
+        bs = _mappedViews(z, nm, n, w)
+        if bs is None:
+            bs = (np.frombuffer(s, dtype=v.dtype) for s in readBlocks(z, nm, n, w))
+        i = 0
+        for b in bs:
+            v[i:i+len(b)] = b
+            i += len(b)
+        assert i == n
+        return a
+    i = 0
+    for b in readArrays(z, nm, n, w):
+        a[i:i+len(b)] = b
+        i += len(b)
+    assert i == n
+    return a
+
+def read128array(z, nm, n):
+    """
+    Read 128-bit values in to a single packed array (see
+    `pykmer.basics128.pack`).
+    """
+    return readGenericArray(z, nm, 2*n, 'L')
+
+def read64array(z, nm, n):
+    return readGenericArray(z, nm, n, 'L')
+
+def read32array(z, nm, n):
+    return readGenericArray(z, nm, n, 'I')
+
+def read32sarray(z, nm, n):
+    return readGenericArray(z, nm, n, 'i')
+
+def read16array(z, nm, n):
+    return readGenericArray(z, nm, n, 'H')
+
+def readDirectory(z, nm):
+    """
+    Return the block directory of the vector `nm` (see above), or None
+    if the vector was written without one.
+    """
+    return z.meta.get(nm + '-dir')
+
+def partition(z, nm, n, p):
+    """
+    Divide the vector `nm` of `n` elements in to (at most) `p`
+    contiguous ranges of roughly equal size, aligned to block
+    boundaries, returning a list of (begin, end) element offsets.
+    """
+    d = readDirectory(z, nm)
+    if d is None or len(d) == 0:
+        return [(0, n)]
+    es = d[1::4]
+    res = []
+    i = 0
+    for q in xrange(1, p):
+        b = bisect.bisect_left(es, (q * n) // p)
+        if b == len(es):
+            break
+        j = es[b]
+        if j > i:
+            res.append((i, j))
+            i = j
+    res.append((i, n))
+    return res
+
+def readGenericRange(z, nm, n, i, j, w):
+    """
+    A generator yielding the elements of the vector `nm` (of `n`
+    elements of type `w`) with offsets in the range [`i`, `j`) as a
+    sequence of arrays. Reading begins with the block holding element
+    `i`, as found with the block directory.
+    """
+    j = min(j, n)
+    if i >= j:
+        return
+    d = readDirectory(z, nm)
+    off = 0
+    e = 0
+    if d is not None and len(d) > 0:
+        b = bisect.bisect_right(d[1::4], i) - 1
+        off = d[4*b]
+        e = d[4*b + 1]
+    for a in readArrays(z, nm, j - e, w, off):
+        m = len(a)
+        lo = max(i - e, 0)
+        hi = min(j - e, m)
+        if lo == 0 and hi == m:
+            yield a
+        elif lo < hi:
+            yield a[lo:hi]
+        e += m
+        if e >= j:
+            break
+
+def read128range(z, nm, n, i, j):
+    """
+    Read the 128-bit values with offsets in the range [`i`, `j`) as a
+    sequence of packed arrays (see `pykmer.basics128.pack`).
+    """
+    return readGenericRange(z, nm, 2*n, 2*i, 2*j, 'L')
+
+def read64range(z, nm, n, i, j):
+    return readGenericRange(z, nm, n, i, j, 'L')
+
+def read32range(z, nm, n, i, j):
+    return readGenericRange(z, nm, n, i, j, 'I')
+
+def read32srange(z, nm, n, i, j):
+    return readGenericRange(z, nm, n, i, j, 'i')
+
+def read16range(z, nm, n, i, j):
+    return readGenericRange(z, nm, n, i, j, 'H')
+
+def _bisect128(a, x):
+    """
+    Return the number of 128-bit values in the packed array `a` that
+    are less than `x`.
+    """
+    lo = 0
+    hi = len(a) // 2
+    while lo < hi:
+        m = (lo + hi) // 2
+        if ((a[2*m] << 64) | a[2*m + 1]) < x:
+            lo = m + 1
+        else:
+            hi = m
+    return lo
+
+def findGeneric(z, nm, n, x, w, wide = False):
+    """
+    Find the first element of the sorted vector `nm` (of `n` elements
+    of type `w`) that is not less than `x`, returning a tuple of its
+    offset and value, or (`n`, None) if there is none. If `wide` is
+    true, the vector holds 128-bit values (written with `writer128`),
+    so `n` is twice the number of values, and the offset returned is
+    in values. Using the block directory, reading begins with the
+    block that holds the element.
+    """
+    k = 1
+    key = x
+    if wide:
+        k = 2
+        key = x >> 64
+    d = readDirectory(z, nm)
+    off = 0
+    e = 0
+    if d is not None and len(d) > 0:
+        b = bisect.bisect_left(d[3::4], key)
+        if 4*b == len(d):
+            return (n // k, None)
+        off = d[4*b]
+        e = d[4*b + 1]
+    for a in readArrays(z, nm, n - e, w, off):
+        if wide:
+            j = _bisect128(a, x)
+            if 2*j < len(a):
+                return (e // 2 + j, (a[2*j] << 64) | a[2*j + 1])
+        else:
+            j = bisect.bisect_left(a, x)
+            if j < len(a):
+                return (e + j, a[j])
+        e += len(a)
+    return (n // k, None)
+
+def seekGeneric(z, nm, n, x, w):
+    """
+    Return the offset of the first element of the sorted vector `nm`
+    (of `n` elements of type `w`) that is not less than `x`. Using the
+    block directory, only the block that holds it is read.
+    """
+    return findGeneric(z, nm, n, x, w)[0]
+
+def seek128(z, nm, n, x):
+    return findGeneric(z, nm, 2*n, x, 'L', True)[0]
+
+def seek64(z, nm, n, x):
+    return seekGeneric(z, nm, n, x, 'L')
+
+def seek32(z, nm, n, x):
+    return seekGeneric(z, nm, n, x, 'I')
+
+def seek16(z, nm, n, x):
+    return seekGeneric(z, nm, n, x, 'H')
@@ -0,0 +1,266 @@
+"""
+This module provides a compressed representation of a sorted set of
+integers, using the Elias-Fano encoding, with the same rank/select
+interface as `pykmer.sparse.sparse`.
+
+Each of the *N* elements of a set drawn from the domain [0, 2**B) is
+split in to its low *L* = floor(log2(2**B/*N*)) bits, which are stored
+verbatim in a packed array, and its remaining high bits, which are
+stored in unary in a bit vector: element *i* with high part *h* sets bit
+*h* + *i*. The high bit vector has at most 2*N* + 1 bits, so the set
+takes about 2 + log2(2**B/*N*) bits per element, rather than the 64 bits
+per element taken by a sorted array.
+
+To find the *i*th set bit (for `select`) and the *h*th unset bit (for
+`rank`) of the high bit vector quickly, the positions of every 256th set
+and unset bit are sampled.
+
+See https://en.wikipedia.org/wiki/Succinct_data_structure for more
+general information about the API.
+"""
+
+__docformat__ = 'restructuredtext'
+
+from pykmer.bits import popcnt, select
+
+import array
+
+M64 = 0xFFFFFFFFFFFFFFFF
+
+_sampleBits = 8
+
+class eliasfano:
+    """
+    The eliasfano class is for presenting a sorted set of integers,
+    compressed with the Elias-Fano encoding, through a rank/select
+    interface.
+    """
+
+    def __init__(self, B, xs):
+        """
+        Create a new Elias-Fano set object.
+
+        The parameter `B` is the width of the elements in bits. It is
+        an error to attempt to include elements >= 2**B.
+
+        The parameter `xs` gives the elements of the set. These must be
+        in sorted order. Unlike `pykmer.sparse.sparse`, `xs` is only
+        iterated over once, and need not support ordinal access.
+        """
+        self.B = B
+        if not hasattr(xs, '__len__'):
+            xs = array.array('L', xs)
+        n = len(xs)
+        self.N = n
+        if n == 0:
+            self.L = B
+        else:
+            self.L = max(0, ((1 << B) // n).bit_length() - 1)
+        L = self.L
+        self.mask = (1 << L) - 1
+
+        z = n + ((1 << B) >> L) + 1
+        self.hi = array.array('L', [0]) * ((z + 63) // 64 + 1)
+        self.lo = array.array('L', [0]) * ((n * L + 63) // 64 + 1)
+
+        hi = self.hi
+        lo = self.lo
+        mask = self.mask
+        p = 0
+        i = 0
+        for x in xs:
+            assert x >= p
+            p = x
+            h = (x >> L) + i
+            hi[h >> 6] |= 1 << (h & 63)
+            if L > 0:
+                v = x & mask
+                b = i * L
+                w = b >> 6
+                o = b & 63
+                lo[w] |= (v << o) & M64
+                if o + L > 64:
+                    lo[w + 1] |= v >> (64 - o)
+            i += 1
+
+        # Sample the positions of every 256th set and unset bit.
+        S = 1 << _sampleBits
+        self.s1 = array.array('L', [])
+        self.s0 = array.array('L', [])
+        c1 = 0
+        c0 = 0
+        for w in xrange(len(hi)):
+            v = hi[w]
+            k1 = popcnt(v)
+            k0 = 64 - k1
+            while c1 + k1 > S * len(self.s1):
+                self.s1.append(64*w + select(v, S * len(self.s1) - c1))
+            while c0 + k0 > S * len(self.s0):
+                self.s0.append(64*w + select(~v & M64, S * len(self.s0) - c0))
+            c1 += k1
+            c0 += k0
+
+    def size(self):
+        """
+        Return the number of possible elements in the set.  That is,
+        the size of the domain.
+        """
+        return 1 << self.B
+
+    def count(self):
+        """
+        Return the number of elements in the set.
+        """
+        return self.N
+
+    def space(self):
+        """
+        Return the number of bits used by the representation.
+        """
+        return 64 * (len(self.hi) + len(self.lo) + len(self.s0) + len(self.s1))
+
+    def _low(self, i):
+        L = self.L
+        if L == 0:
+            return 0
+        b = i * L
+        w = b >> 6
+        o = b & 63
+        v = self.lo[w] >> o
+        if o + L > 64:
+            v |= self.lo[w + 1] << (64 - o)
+        return v & self.mask
+
+    def _select1(self, i):
+        """
+        Find the position of the `i`th set bit in the high bits.
+        """
+        p = self.s1[i >> _sampleBits]
+        j = i & ((1 << _sampleBits) - 1)
+        w = p >> 6
+        v = self.hi[w] & ~((1 << (p & 63)) - 1)
+        c = popcnt(v)
+        while c <= j:
+            j -= c
+            w += 1
+            v = self.hi[w]
+            c = popcnt(v)
+        return 64*w + select(v, j)
+
+    def _select0(self, i):
+        """
+        Find the position of the `i`th unset bit in the high bits.
+        """
+        p = self.s0[i >> _sampleBits]
+        j = i & ((1 << _sampleBits) - 1)
+        w = p >> 6
+        v = ~self.hi[w] & M64 & ~((1 << (p & 63)) - 1)
+        c = popcnt(v)
+        while c <= j:
+            j -= c
+            w += 1
+            v = ~self.hi[w] & M64
+            c = popcnt(v)
+        return 64*w + select(v, j)
+
+    def _find(self, x):
+        """
+        Return the rank of `x`, and the low bits of the element with
+        that rank, if it has the same high bits as `x`, or None.
+        """
+        if x >> self.B:
+            return (self.N, None)
+        h = x >> self.L
+        if h == 0:
+            p = 0
+        else:
+            p = self._select0(h - 1) + 1
+        r = p - h
+        xl = x & self.mask
+        hi = self.hi
+        while (hi[p >> 6] >> (p & 63)) & 1:
+            l = self._low(r)
+            if l >= xl:
+                return (r, l)
+            r += 1
+            p += 1
+        return (r, None)
+
+    def rank(self, x):
+        """
+        The `rank` method returns, given `x`, the rank of `x` in the set,
+        which is the number of elements in the set which are strictly
+        less than `x`.
+
+        Values of `x` >= 2**B yield the number of elements in the set.
+        """
+        return self._find(x)[0]
+
+    def rank2(self, x0, x1):
+        """
+        Perform `rank` operations on x0 and x1. Equivalent to
+            return(rank(x0), rank(x1))
+
+        It is an error if x1 < x0.
+        """
+        assert x0 <= x1
+        return (self.rank(x0), self.rank(x1))
+
+    def access(self, x):
+        """
+        Return the rank of `x` if it is in the set, and None
+        otherwise.
+        """
+        (r, l) = self._find(x)
+        if l is not None and l == x & self.mask:
+            return r
+        return None
+
+    def rankMany(self, qs):
+        """
+        Return an `array.array('L')` of the ranks of each of the
+        queries `qs` (see `pykmer.sparse.sparse.rankMany`).
+        """
+        return array.array('L', [self.rank(x) for x in qs])
+
+    def accessMany(self, qs):
+        """
+        Return an `array.array('l')` of the ranks of each of the
+        queries `qs`, with -1 for those not in the set (see
+        `pykmer.sparse.sparse.accessMany`).
+        """
+        res = array.array('l', [-1]) * len(qs)
+        for i in xrange(len(qs)):
+            r = self.access(qs[i])
+            if r is not None:
+                res[i] = r
+        return res
+
+    def select(self, i):
+        """
+        The `select` method returns, given `i`, the ith smallest item
+        in the set.
+
+        Given the set s, is an error for `i` to be outside the interval
+        [0, s.count()).
+        """
+        assert 0 <= i
+        assert i < self.N
+        p = self._select1(i)
+        return ((p - i) << self.L) | self._low(i)
+
+    def __iter__(self):
+        """
+        Iterate over the elements of the set in order.
+        """
+        L = self.L
+        hi = self.hi
+        i = 0
+        for w in xrange(len(hi)):
+            v = hi[w]
+            while v:
+                t = v & -v
+                p = 64*w + t.bit_length() - 1
+                yield ((p - i) << L) | self._low(i)
+                i += 1
+                v ^= t
@@ -4,17 +4,43 @@ data formats.
 
 The FASTQ parser is not strictly conformant since it assumes the input
 to be in a line oriented form (which is usually true).
+
+The functions `readFastaChunks`, `readFastqChunks` and
+`readFastqChunkOffsets` parse large blocks of input at a time, rather
+than a line at a time, and yield batches of records. They are
+considerably faster than the line oriented parsers when large inputs
+are processed.
+
+The classes `GzipReader` and `GzipWriter` decompress and compress gzip
+files in-process. BGZF files (gzip files made of independently
+compressed blocks, as used for BAM files and by `bgzip`) are inflated
+in parallel with a pool of threads, and `GzipWriter` produces BGZF
+files, compressing blocks in parallel. A `Prefetcher` reads ahead
+from a file on a background thread, so input and processing overlap.
 """
 
 __docformat__ = 'restructuredtext'
 
+import array
 import bz2
+import collections
 import gzip
 import os
 import os.path
+import struct
+import Queue
 import subprocess
 import sys
+import threading
+import time
 import uuid
+import zlib
+from multiprocessing.pool import ThreadPool
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 def readFasta(file):
     """
@@ -76,33 +102,567 @@ def readFastqBlock(file, n=1024):
     if len(grps) > 0:
         yield grps
 
-def openFile(fn, mode='r'):
+defaultChunkSize = 8*1024*1024
+
+def _readChunks(file, chunkSize, cut):
+    """
+    Read `file` in blocks of `chunkSize` bytes, yielding chunks which
+    end on a record boundary. The function `cut` is called with each
+    block read, and a state value describing the data carried over
+    from the previous blocks (None to begin with). It returns the
+    position in the block of the last record boundary (-1 if there is
+    none), and the state for the data after it. Any data after the
+    boundary is carried over to the next chunk, and the last chunk is
+    yielded as is.
+
+    Only the new block is searched for a boundary, and the carried
+    blocks are kept in a list until a boundary is found, so a single
+    large record (e.g. a chromosome) takes time linear in its size.
+    """
+    parts = []
+    st = None
+    while True:
+        w = file.read(chunkSize)
+        if len(w) == 0:
+            break
+        (p, st) = cut(w, st)
+        if p < 0:
+            parts.append(w)
+            continue
+        if p == len(w):
+            parts.append(w)
+            buf = ''.join(parts)
+            parts = []
+        else:
+            parts.append(w[:p])
+            buf = ''.join(parts)
+            parts = [w[p:]]
+        if len(buf):
+            yield buf
+    if len(parts):
+        yield ''.join(parts)
+
+def _cutFastq(w, st):
+    """
+    Find the end of the last complete FASTQ record in `w`, where `st`
+    is the number of newlines (fewer than 4) in the carried data.
+    """
+    c = st or 0
+    n = c + w.count('\n')
+    e = n % 4
+    if n < 4:
+        return (-1, n)
+    p = len(w)
+    for i in xrange(e + 1):
+        p = w.rfind('\n', 0, p)
+    return (p + 1, e)
+
+def _completeFastq(buf):
+    """
+    Return the number of complete records in a chunk of FASTQ, allowing
+    for a missing newline at the end of the input.
+    """
+    n = buf.count('\n')
+    if len(buf) and buf[-1] != '\n':
+        n += 1
+    return n // 4
+
+def readFastqChunks(file, chunkSize=defaultChunkSize):
+    """
+    Read input from the file object `file`, which is assumed to be
+    in line-oriented FASTQ format (not full multi-line FASTQ), in
+    chunks of about `chunkSize` bytes. Yields a list of the sequences
+    (as strings) for each chunk.
+    """
+    for buf in _readChunks(file, chunkSize, _cutFastq):
+        n = _completeFastq(buf)
+        seqs = buf.split('\n', 4*n)[1:4*n:4]
+        if '\r' in buf:
+            seqs = [seq.rstrip('\r') for seq in seqs]
+        yield seqs
+
+def readFastqChunkOffsets(file, chunkSize=defaultChunkSize):
+    """
+    Read input from the file object `file`, which is assumed to be
+    in line-oriented FASTQ format (not full multi-line FASTQ), in
+    chunks of about `chunkSize` bytes. For each chunk, yields a tuple
+    containing the chunk itself, and an `array.array('L')` with the
+    begin and end offsets of each sequence in the chunk, so that the
+    ith sequence is chunk[offs[2*i]:offs[2*i+1]].
+
+    No strings are created for the individual lines or sequences,
+    and if NumPy is available, the offsets are computed with vector
+    operations.
+    """
+    for buf in _readChunks(file, chunkSize, _cutFastq):
+        n = _completeFastq(buf)
+        if np is not None:
+            nls = np.flatnonzero(np.frombuffer(buf, dtype=np.uint8) == 10)
+            if len(nls) < 4*n:
+                nls = np.append(nls, len(buf))
+            nls = nls[:4*n].reshape(n, 4)
+            offs = np.empty((n, 2), dtype=np.uint64)
+            offs[:, 0] = nls[:, 0] + 1
+            offs[:, 1] = nls[:, 1]
+            offs = array.array('L', offs.tostring())
+        else:
+            offs = array.array('L', [])
+            p = 0
+            for i in xrange(n):
+                b = buf.find('\n', p) + 1
+                e = buf.find('\n', b)
+                if e < 0:
+                    e = len(buf)
+                offs.append(b)
+                offs.append(e)
+                p = buf.find('\n', e + 1)
+                p = buf.find('\n', p + 1) + 1
+        if '\r' in buf:
+            for i in xrange(1, len(offs), 2):
+                if offs[i] > offs[i-1] and buf[offs[i]-1] == '\r':
+                    offs[i] -= 1
+        yield (buf, offs)
+
+def _cutFasta(w, st):
+    """
+    Find the start of the last FASTA record in `w`, where `st` is true
+    if the carried data ends with a newline.
+    """
+    p = w.rfind('\n>')
+    if p >= 0:
+        p += 1
+    elif st and w[0] == '>':
+        p = 0
+    return (p, w[-1] == '\n')
+
+def readFastaChunks(file, chunkSize=defaultChunkSize):
+    """
+    Read input from the file object `file`, which is assumed to be in
+    FASTA format, in chunks of about `chunkSize` bytes. Yields a list
+    of the (name, sequence) tuples for each chunk.
+    """
+    first = True
+    for buf in _readChunks(file, chunkSize, _cutFasta):
+        if first:
+            first = False
+            if buf[0] != '>':
+                # Skip anything before the first record.
+                buf = buf[buf.find('\n>') + 1:]
+                if len(buf) == 0 or buf[0] != '>':
+                    continue
+        cr = '\r' in buf
+        res = []
+        for rec in buf[1:].split('\n>'):
+            p = rec.find('\n')
+            if p < 0:
+                res.append((rec.strip(), ''))
+                continue
+            seq = rec[p+1:].replace('\n', '')
+            if cr:
+                seq = seq.replace('\r', '')
+            res.append((rec[:p].strip(), seq))
+        yield res
+
+class BlockReader(object):
+    """
+    A read-only file-like object over a sequence of blocks (strings)
+    of data, supporting `read`, `readline` and iteration over lines.
+    """
+    def __init__(self, blocks):
+        self.blocks = iter(blocks)
+        self.buf = ''
+        self.pos = 0
+
+    def _fill(self):
+        try:
+            w = self.blocks.next()
+        except StopIteration:
+            return False
+        if self.pos < len(self.buf):
+            self.buf = self.buf[self.pos:] + w
+        else:
+            self.buf = w
+        self.pos = 0
+        return True
+
+    def read(self, n=-1):
+        """
+        Read up to `n` bytes. If `n` is negative or omitted, read
+        all the remaining data.
+        """
+        if n is None or n < 0:
+            r = [self.buf[self.pos:]]
+            for w in self.blocks:
+                r.append(w)
+            self.buf = ''
+            self.pos = 0
+            return ''.join(r)
+        while len(self.buf) - self.pos < n:
+            if not self._fill():
+                break
+        r = self.buf[self.pos:self.pos+n]
+        self.pos += len(r)
+        return r
+
+    def readline(self):
+        """
+        Read a line, including the trailing newline, if any.
+        """
+        while True:
+            p = self.buf.find('\n', self.pos)
+            if p >= 0:
+                r = self.buf[self.pos:p+1]
+                self.pos = p + 1
+                return r
+            if not self._fill():
+                r = self.buf[self.pos:]
+                self.pos = len(self.buf)
+                return r
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        l = self.readline()
+        if len(l) == 0:
+            raise StopIteration
+        return l
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, v, tb):
+        self.close()
+        return False
+
+_bgzfHeader = '<BBBBIBBHBBHH'
+_bgzfMaxBlock = 65280
+_bgzfEof = '\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+
+def _isBgzf(h):
+    """
+    Return true iff the string `h` starts with a BGZF block header.
+    """
+    if len(h) < 18 or h[0:2] != '\x1f\x8b' or (ord(h[3]) & 4) == 0:
+        return False
+    xlen = struct.unpack('<H', h[10:12])[0]
+    return xlen >= 6 and h[12:14] == 'BC'
+
+def _skipPadding(f, w):
+    """
+    Check that the data `w`, and the rest of the file `f`, are all NUL
+    bytes (which gzip allows after the last member), raising
+    `zlib.error` if they are not.
+    """
+    while len(w):
+        if len(w.strip('\0')):
+            raise zlib.error('trailing garbage after gzip data')
+        w = f.read(1024*1024)
+
+def _bgzfBlocks(f):
+    """
+    A generator yielding the raw (compressed) blocks of a BGZF file.
+    """
+    while True:
+        h = f.read(12)
+        if len(h) == 0:
+            return
+        if h[0] == '\0':
+            _skipPadding(f, h)
+            return
+        assert len(h) == 12
+        xlen = struct.unpack('<H', h[10:12])[0]
+        x = f.read(xlen)
+        bsize = None
+        i = 0
+        while i + 4 <= xlen:
+            slen = struct.unpack('<H', x[i+2:i+4])[0]
+            if x[i:i+2] == 'BC':
+                bsize = struct.unpack('<H', x[i+4:i+6])[0]
+            i += 4 + slen
+        assert bsize is not None
+        w = f.read(bsize + 1 - 12 - xlen)
+        yield h + x + w
+
+def _inflate(blks):
+    return ''.join([zlib.decompress(blk, 16 + zlib.MAX_WBITS) for blk in blks])
+
+def _deflate(args):
+    (dat, level) = args
+    res = []
+    for i in xrange(0, len(dat), _bgzfMaxBlock):
+        w = dat[i:i+_bgzfMaxBlock]
+        c = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        cw = c.compress(w) + c.flush()
+        res.append(struct.pack(_bgzfHeader, 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(cw) + 25))
+        res.append(cw)
+        res.append(struct.pack('<II', zlib.crc32(w) & 0xFFFFFFFF, len(w)))
+    return ''.join(res)
+
+class GzipReader(BlockReader):
+    """
+    A file-like object for reading a gzip compressed file.
+
+    If the file is in BGZF format, batches of blocks are inflated by a
+    pool of `threads` threads, and the output is delivered in order.
+    Other gzip files (including those with multiple members) are
+    inflated sequentially. NUL padding after the last member is
+    ignored, as it is by gzip.
+    """
+    def __init__(self, fn, threads=4, batchSize=1024*1024):
+        self.f = open(fn, 'rb')
+        self.pool = None
+        h = self.f.read(18)
+        self.f.seek(0)
+        if _isBgzf(h):
+            self.pool = ThreadPool(threads)
+            BlockReader.__init__(self, self._parallel(threads, batchSize))
+        else:
+            BlockReader.__init__(self, self._sequential(batchSize))
+
+    def _parallel(self, threads, batchSize):
+        q = collections.deque()
+        blks = []
+        z = 0
+        for blk in _bgzfBlocks(self.f):
+            blks.append(blk)
+            z += len(blk)
+            if z < batchSize:
+                continue
+            q.append(self.pool.apply_async(_inflate, (blks,)))
+            blks = []
+            z = 0
+            if len(q) >= 2*threads:
+                yield q.popleft().get()
+        if len(blks):
+            q.append(self.pool.apply_async(_inflate, (blks,)))
+        while len(q):
+            yield q.popleft().get()
+
+    def _sequential(self, batchSize):
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        while True:
+            w = self.f.read(batchSize)
+            if len(w) == 0:
+                break
+            r = [d.decompress(w)]
+            while len(d.unused_data):
+                u = d.unused_data
+                if u[0] == '\0':
+                    yield ''.join(r)
+                    _skipPadding(self.f, u)
+                    return
+                d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                r.append(d.decompress(u))
+            yield ''.join(r)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+class GzipWriter(object):
+    """
+    A file-like object for writing a BGZF (blocked gzip) compressed
+    file. The output may be read by any gzip implementation.
+
+    Written data is accumulated in batches of `batchSize` bytes, which
+    are compressed by a pool of `threads` threads, and written in
+    order. The compression level is given by `level`.
+    """
+    def __init__(self, fn, threads=4, level=6, batchSize=1024*1024):
+        self.f = open(fn, 'wb')
+        self.threads = threads
+        self.level = level
+        self.batchSize = batchSize
+        self.pool = ThreadPool(threads)
+        self.q = collections.deque()
+        self.buf = []
+        self.z = 0
+
+    def write(self, w):
+        self.buf.append(w)
+        self.z += len(w)
+        if self.z >= self.batchSize:
+            self.flush()
+
+    def flush(self):
+        if self.z == 0:
+            return
+        dat = ''.join(self.buf)
+        self.buf = []
+        self.z = 0
+        for i in xrange(0, len(dat), self.batchSize):
+            w = dat[i:i+self.batchSize]
+            self.q.append(self.pool.apply_async(_deflate, ((w, self.level),)))
+            while len(self.q) > 2*self.threads:
+                self.f.write(self.q.popleft().get())
+
+    def close(self):
+        if self.f is None:
+            return
+        self.flush()
+        while len(self.q):
+            self.f.write(self.q.popleft().get())
+        self.f.write(_bgzfEof)
+        self.f.close()
+        self.f = None
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, t, v, tb):
+        self.close()
+        return False
+
+class Prefetcher(BlockReader):
+    """
+    A read-only file-like object which reads ahead from the file
+    object `f` on a background thread, so that reading (and
+    decompression, for pipes and `GzipReader` objects) overlaps with
+    the processing of the data.
+
+    Blocks of `blockSize` bytes are read in to a queue holding at most
+    `depth` blocks. The method `stats` reports where time has been
+    spent waiting, showing whether processing is limited by the input
+    or by the consumer.
+
+    Closing the prefetcher stops the background thread, but closes `f`
+    only if `owner` is true (as it is when `openFile` opened `f`), so
+    that, e.g., `sys.stdin` is left open.
+    """
+    def __init__(self, f, depth=4, blockSize=1024*1024, owner=False):
+        self.f = f
+        self.owner = owner
+        self.blockSize = blockSize
+        self.q = Queue.Queue(depth)
+        self.stopped = False
+        self.error = None
+        self.readTime = 0.0
+        self.fullTime = 0.0
+        self.stallTime = 0.0
+        self.nBlocks = 0
+        self.nBytes = 0
+        BlockReader.__init__(self, self._get())
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _put(self, w):
+        t0 = time.time()
+        while not self.stopped:
+            try:
+                self.q.put(w, True, 0.1)
+                break
+            except Queue.Full:
+                pass
+        self.fullTime += time.time() - t0
+
+    def _run(self):
+        try:
+            while not self.stopped:
+                t0 = time.time()
+                w = self.f.read(self.blockSize)
+                self.readTime += time.time() - t0
+                if len(w) == 0:
+                    break
+                self.nBlocks += 1
+                self.nBytes += len(w)
+                self._put(w)
+        except Exception as e:
+            self.error = e
+        self._put(None)
+
+    def _get(self):
+        while True:
+            t0 = time.time()
+            w = self.q.get()
+            self.stallTime += time.time() - t0
+            if w is None:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield w
+
+    def stats(self):
+        """
+        Return a dictionary with the number of `blocks` and `bytes`
+        read, the time the background thread has spent reading
+        (`readTime`) and waiting for room in the queue (`fullTime`), and
+        the time the consumer has spent waiting for data (`stallTime`).
+
+        If the stall time dominates, processing is limited by the input
+        (I/O-bound); if the full time dominates, it is limited by the
+        consumer (CPU-bound).
+        """
+        return {'blocks': self.nBlocks, 'bytes': self.nBytes,
+                'readTime': self.readTime, 'fullTime': self.fullTime,
+                'stallTime': self.stallTime}
+
+    def close(self):
+        if self.stopped:
+            return
+        self.stopped = True
+        self.thread.join()
+        if self.owner:
+            self.f.close()
+
+def openFile(fn, mode='r', threads=0, prefetch=0):
     """
     Open a file "cleverly".
 
     If the file name ends with ".gz" or ".bz2", it is compressed
     or uncompressed on the fly (according to the mode).
 
+    If `threads` is greater than zero, ".gz" files are read with a
+    `GzipReader` and written with a `GzipWriter`, using that many
+    threads, rather than with an external gunzip process and the
+    gzip module, respectively.
+
+    If `prefetch` is greater than zero, files opened for reading are
+    wrapped in a `Prefetcher` which reads up to that many blocks ahead
+    on a background thread.
+
     In read mode (mode='r'), the filename '-' is interpreted as stdin.
 
     In write mode (mode='w'), the filename '-' is interpreted as stdout.
     """
     if mode == 'r':
         if fn == "-":
-            return sys.stdin
-        if fn.endswith(".gz"):
-            p = subprocess.Popen(['gunzip', '-c', fn],
-                                 bufsize=1024*1024,
-                                 stdout=subprocess.PIPE)
-            return p.stdout
-        if fn.endswith(".bz2"):
+            f = sys.stdin
+        elif fn.endswith(".gz"):
+            if threads > 0:
+                f = GzipReader(fn, threads)
+            else:
+                p = subprocess.Popen(['gunzip', '-c', fn],
+                                     bufsize=1024*1024,
+                                     stdout=subprocess.PIPE)
+                f = p.stdout
+        elif fn.endswith(".bz2"):
             p = subprocess.Popen(['bunzip2', '-c', fn],
                                  bufsize=1024*1024,
                                  stdout=subprocess.PIPE)
+            f = p.stdout
+        else:
+            f = open(fn, mode)
+        if prefetch > 0:
+            f = Prefetcher(f, prefetch, owner=(f is not sys.stdin))
+        return f
     if mode == 'w':
         if fn == "-":
             return sys.stdout
         if fn.endswith(".gz"):
+            if threads > 0:
+                return GzipWriter(fn, threads)
             # slower than we'd like, but stable
             return gzip.open(fn, 'wb')
         if fn.endswith(".bz2"):
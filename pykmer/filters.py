@@ -0,0 +1,474 @@
+"""
+This module provides probabilistic set membership structures for
+*k*-mers, which are useful for screening out *k*-mers which occur only
+once (which are mostly the result of sequencing errors) before they
+are counted exactly.
+
+`bloom`
+    is a blocked Bloom filter. Each *k*-mer is hashed (with `murmer`)
+    to a single block of 512 bits (a cache line), and the *k* probe
+    positions within that block are derived from the same hash value
+    by a second hash, so each query touches only one block. Since the
+    number of *k*-mers in each block varies, a blocked filter has a
+    higher false positive rate than a standard one with the same
+    number of bits, so the size is chosen using the false positive
+    rate averaged over the (Poisson distributed) block loads.
+`cqf`
+    is a counting quotient filter. Each *k*-mer is hashed to a
+    fingerprint of q + r bits, which is split in to a quotient, which
+    selects a slot, and a remainder, which is stored in the slot (or,
+    if it is taken, in a later slot, in sorted runs), along with a
+    count. The slots are described by the occupied, continuation and
+    shifted bit vectors of the original quotient filter. Unlike the
+    counting quotient filter of Pandey et al., the counts are held in
+    a separate array, rather than being encoded in the remainder
+    slots. The remainders are held in an array of the smallest type
+    that fits r bits, and the counts in an array of a type chosen when
+    the filter is created (32 bits by default), so each slot takes the
+    3 bits of the bit vectors plus the widths of the two types.
+
+Both are sized from the expected number of *k*-mers and the desired
+false positive rate, and both provide batch operations over arrays of
+*k*-mers, which hash the whole batch at once with `murmerArray` if
+NumPy is available. They may be stored in a container with `writeBloom`
+and `writeCqf`, and read back with `readBloom` and `readCqf`.
+"""
+
+__docformat__ = 'restructuredtext'
+
+from pykmer.basics import murmer, murmerArray
+from pykmer.bitvec import bitvec, readBitvec, writeBitvec
+import pykmer.container.vectors as vectors
+
+import array
+import math
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def _blockedFpr(blocks, k, N):
+    """
+    Estimate the false positive rate of a blocked Bloom filter with
+    `blocks` blocks of 512 bits and `k` probes holding `N` *k*-mers:
+    the false positive rate of a block holding j *k*-mers, averaged
+    over a Poisson distribution of j.
+    """
+    l = float(N) / blocks
+    d = 10 * math.sqrt(l) + 10
+    e = 0.0
+    for j in xrange(max(0, int(l - d)), int(l + d) + 1):
+        p = math.exp(j * math.log(l) - l - math.lgamma(j + 1))
+        e += p * (1 - (1 - 1.0/512) ** (k * j)) ** k
+    return e
+
+def _bloomSize(N, fpr):
+    """
+    Return the number of blocks, and the number of probes, for a
+    blocked Bloom filter holding `N` *k*-mers with a false positive
+    rate of at most `fpr`.
+    """
+    m = -N * math.log(fpr) / (math.log(2) ** 2)
+    blocks = max(1, int(math.ceil(m / 512)))
+    while True:
+        l = float(N) / blocks
+        kMax = min(64, int(512 / l * math.log(2)) + 2)
+        (e, k) = min([(_blockedFpr(blocks, k, N), k) for k in xrange(1, kMax + 1)])
+        if e <= fpr:
+            return (blocks, k)
+        blocks += max(1, blocks // 100)
+
+def _hashes(xs, s):
+    """
+    Hash the *k*-mers `xs` with the seed `s`, returning a list of
+    hash values.
+    """
+    if np is not None:
+        return murmerArray(xs, s).tolist()
+    return [murmer(x, s) for x in xs]
+
+class bloom:
+    """
+    A blocked Bloom filter over *k*-mers.
+    """
+
+    def __init__(self, N, fpr, s = 17):
+        """
+        Create a Bloom filter sized for `N` *k*-mers with a false
+        positive rate of at most about `fpr`, using `s` as the hash seed.
+        """
+        assert N > 0
+        assert 0 < fpr < 1
+        (self.blocks, self.k) = _bloomSize(N, fpr)
+        self.s = s
+        self.bits = bitvec(512 * self.blocks)
+
+    def _probes(self, x):
+        # The block is chosen with one hash, and the first 7 probes
+        # are successive 9 bit fields of a second. Deriving the probes
+        # by double hashing within the block would give only 18 bits
+        # of distinct probe patterns, which is too few.
+        h = murmer(x, self.s)
+        g = murmer(x, self.s + 1)
+        b = 512 * (h % self.blocks)
+        v = ((h >> 32) & 511) | 1
+        return [b + (((g >> (9 * (i % 7))) + (i // 7) * v) & 511) for i in xrange(self.k)]
+
+    def add(self, x):
+        """
+        Add the *k*-mer `x` to the filter, returning true if it was
+        (probably) already present.
+        """
+        d = self.bits.data
+        seen = 1
+        for p in self._probes(x):
+            w = p >> 6
+            m = 1 << (p & 63)
+            if not d[w] & m:
+                seen = 0
+                d[w] |= m
+        self.bits.idx = None
+        return seen
+
+    def __contains__(self, x):
+        d = self.bits.data
+        for p in self._probes(x):
+            if not (d[p >> 6] >> (p & 63)) & 1:
+                return False
+        return True
+
+    def _probeArray(self, xs):
+        h = murmerArray(xs, self.s)
+        g = murmerArray(xs, self.s + 1)
+        b = h % np.uint64(self.blocks) * np.uint64(512)
+        v = ((h >> np.uint64(32)) & np.uint64(511)) | np.uint64(1)
+        return [b + (((g >> np.uint64(9 * (i % 7))) + np.uint64(i // 7) * v) & np.uint64(511))
+                for i in xrange(self.k)]
+
+    def addMany(self, xs):
+        """
+        Add the *k*-mers in the array `xs` to the filter, returning an
+        `array.array('B')` with 1 for each *k*-mer which was (probably)
+        already present, either before the call, or earlier in `xs`.
+        """
+        n = len(xs)
+        if np is None or n == 0:
+            return array.array('B', [self.add(x) for x in xs])
+        res = array.array('B', [1]) * n
+        r = np.frombuffer(res, dtype=np.uint8)
+        d = np.frombuffer(self.bits.data, dtype=np.uint64)
+        ps = self._probeArray(xs)
+        for p in ps:
+            w = p >> np.uint64(6)
+            m = np.left_shift(np.uint64(1), p & np.uint64(63))
+            r &= ((d[w] & m) != 0)
+        # Probes of repeated k-mers within the batch are not seen as
+        # set by the gather above, so find them by sorting.
+        ks = np.array(xs, dtype=np.uint64)
+        o = np.argsort(ks, kind='mergesort')
+        dup = np.zeros(n, dtype=bool)
+        dup[o[1:]] = ks[o[1:]] == ks[o[:-1]]
+        r |= dup
+        for p in ps:
+            np.bitwise_or.at(d, p >> np.uint64(6), np.left_shift(np.uint64(1), p & np.uint64(63)))
+        self.bits.idx = None
+        return res
+
+    def containsMany(self, xs):
+        """
+        Query the *k*-mers in the array `xs`, returning an
+        `array.array('B')` with 1 for each which is (probably) present.
+        """
+        n = len(xs)
+        if np is None or n == 0:
+            return array.array('B', [int(x in self) for x in xs])
+        res = array.array('B', [1]) * n
+        r = np.frombuffer(res, dtype=np.uint8)
+        d = np.frombuffer(self.bits.data, dtype=np.uint64)
+        for p in self._probeArray(xs):
+            w = p >> np.uint64(6)
+            m = np.left_shift(np.uint64(1), p & np.uint64(63))
+            r &= ((d[w] & m) != 0)
+        return res
+
+def writeBloom(z, f, nm):
+    """
+    Write the Bloom filter `f` to the container `z` with the name `nm`.
+    """
+    writeBitvec(z, f.bits, nm)
+    z.meta[nm + '-bloom'] = (f.blocks, f.k, f.s)
+
+def readBloom(z, nm):
+    """
+    Read the Bloom filter with the name `nm` from the container `z`.
+    """
+    (blocks, k, s) = z.meta[nm + '-bloom']
+    f = bloom(1, 0.5, s)
+    f.blocks = blocks
+    f.k = k
+    f.bits = readBitvec(z, nm)
+    return f
+
+class FilterFull(Exception):
+    """
+    Raised by `cqf` when there is no empty slot in which to add a
+    *k*-mer.
+    """
+    def __init__(self):
+        super(FilterFull, self).__init__('quotient filter is full')
+
+def _remainderType(r):
+    """
+    Return the smallest array typecode which holds `r` bit remainders.
+    """
+    for w in 'BHI':
+        if r <= 8 * array.array(w).itemsize:
+            return w
+    return 'L'
+
+class cqf:
+    """
+    A counting quotient filter over *k*-mers.
+    """
+
+    def __init__(self, N, fpr, s = 17, counts = 'I'):
+        """
+        Create a counting quotient filter sized for `N` distinct
+        *k*-mers with a false positive rate of about `fpr`, using `s`
+        as the hash seed. The filter has 2**q quotients, where q is chosen
+        to keep the load below 3/4, and r remainder bits, where r is
+        chosen to give the false positive rate. Since `murmer` yields
+        64 bit hash values, q + r may not exceed 64.
+
+        The counts are held in an array of type `counts` ('B', 'H' or
+        'I'), and saturate at its largest value. For screening out
+        *k*-mers which occur once, 'B' is enough, and takes a quarter
+        of the memory of the default 'I' for the counts: with r <= 8,
+        a slot then takes 19 bits rather than 43.
+
+        If there is no room to add a *k*-mer, `FilterFull` is raised,
+        and the filter is left as it was before the *k*-mer was added.
+        """
+        assert N > 0
+        assert 0 < fpr < 1
+        self.q = max(1, int(math.ceil(math.log(N / 0.75, 2))))
+        self.r = max(1, int(math.ceil(math.log(1.0 / fpr, 2))))
+        assert self.q + self.r <= 64
+        assert counts in 'BHI'
+        self.s = s
+        self.w = counts
+        self.cmax = (1 << (8 * array.array(counts).itemsize)) - 1
+        self._alloc((1 << self.q) + max(64, (1 << self.q) // 8))
+
+    def _alloc(self, n):
+        self.slots = n
+        self.occupied = bitvec(n)
+        self.continuation = bitvec(n)
+        self.shifted = bitvec(n)
+        self.rems = array.array(_remainderType(self.r), [0]) * n
+        self.counts = array.array(self.w, [0]) * n
+        self.n = 0
+
+    def _fingerprint(self, h):
+        return h & ((1 << (self.q + self.r)) - 1)
+
+    def _isEmpty(self, i):
+        return not (self.occupied[i] or self.continuation[i] or self.shifted[i])
+
+    def _runStart(self, fq):
+        """
+        Find the slot where the run for the quotient `fq` starts.
+        """
+        b = fq
+        while self.shifted[b]:
+            b -= 1
+        s = b
+        while b != fq:
+            s += 1
+            while self.continuation[s]:
+                s += 1
+            b += 1
+            while not self.occupied[b]:
+                b += 1
+        return s
+
+    def _find(self, f):
+        """
+        Return the slot holding the fingerprint `f`, or None.
+        """
+        fq = f >> self.r
+        fr = f & ((1 << self.r) - 1)
+        if not self.occupied[fq]:
+            return None
+        s = self._runStart(fq)
+        while True:
+            x = self.rems[s]
+            if x == fr:
+                return s
+            if x > fr:
+                return None
+            s += 1
+            if s == self.slots or not self.continuation[s]:
+                return None
+
+    def _hasRoom(self, i):
+        """
+        Return true if there is an empty slot at or after slot `i`.
+        """
+        while i < self.slots:
+            if self._isEmpty(i):
+                return True
+            i += 1
+        return False
+
+    def _insertAt(self, s, fr, c, cont, shf):
+        """
+        Put the remainder `fr` with count `c` in slot `s`, shifting the
+        following slots up to the first empty slot, which the caller
+        must have checked exists.
+        """
+        while True:
+            assert s < self.slots
+            empty = self._isEmpty(s)
+            pr = self.rems[s]
+            pc = self.counts[s]
+            pcont = self.continuation[s]
+            self.rems[s] = fr
+            self.counts[s] = c
+            self.continuation[s] = cont
+            self.shifted[s] = shf
+            if empty:
+                return
+            (fr, c, cont, shf) = (pr, pc, pcont, 1)
+            s += 1
+
+    def _add(self, f, c):
+        fq = f >> self.r
+        fr = f & ((1 << self.r) - 1)
+        c = min(c, self.cmax)
+        if self._isEmpty(fq):
+            self.occupied[fq] = 1
+            self.rems[fq] = fr
+            self.counts[fq] = c
+            self.n += 1
+            return c
+        wasOccupied = self.occupied[fq]
+        if wasOccupied:
+            start = self._runStart(fq)
+            s = start
+            while True:
+                x = self.rems[s]
+                if x == fr:
+                    self.counts[s] = min(self.counts[s] + c, self.cmax)
+                    return self.counts[s]
+                if x > fr:
+                    break
+                s += 1
+                if s == self.slots or not self.continuation[s]:
+                    break
+        # The slots from fq to the insertion point are all in use, so
+        # check there is an empty slot after fq before changing anything.
+        if not self._hasRoom(fq):
+            raise FilterFull
+        cont = 0
+        if wasOccupied:
+            if s == start:
+                self.continuation[start] = 1
+            else:
+                cont = 1
+        else:
+            self.occupied[fq] = 1
+            s = self._runStart(fq)
+        self._insertAt(s, fr, c, cont, int(s != fq))
+        self.n += 1
+        return c
+
+    def add(self, x, c = 1):
+        """
+        Add `c` to the count of the *k*-mer `x`, returning the new
+        count. Counts saturate at the largest value of the count
+        type.
+        """
+        return self._add(self._fingerprint(murmer(x, self.s)), c)
+
+    def count(self, x):
+        """
+        Return the (approximate) count of the *k*-mer `x`, which is
+        never less than the true count, and 0 if it is (definitely)
+        absent.
+        """
+        s = self._find(self._fingerprint(murmer(x, self.s)))
+        if s is None:
+            return 0
+        return self.counts[s]
+
+    def __contains__(self, x):
+        return self.count(x) > 0
+
+    def __len__(self):
+        """
+        Return the number of distinct fingerprints in the filter.
+        """
+        return self.n
+
+    def addMany(self, xs, cs = None):
+        """
+        Add the *k*-mers in the array `xs` (with counts `cs`, or 1 each)
+        to the filter. The fingerprints are inserted in sorted order,
+        which keeps the shifting of slots to a minimum. If `FilterFull`
+        is raised, the *k*-mers added before it remain in the filter.
+        """
+        fs = [self._fingerprint(h) for h in _hashes(xs, self.s)]
+        if cs is None:
+            fs.sort()
+            for f in fs:
+                self._add(f, 1)
+            return
+        for i in sorted(xrange(len(fs)), key=fs.__getitem__):
+            self._add(fs[i], cs[i])
+
+    def countMany(self, xs):
+        """
+        Return an `array.array('L')` of the counts of the *k*-mers in
+        the array `xs`.
+        """
+        res = array.array('L', [0]) * len(xs)
+        i = 0
+        for h in _hashes(xs, self.s):
+            s = self._find(self._fingerprint(h))
+            if s is not None:
+                res[i] = self.counts[s]
+            i += 1
+        return res
+
+def writeCqf(z, f, nm):
+    """
+    Write the counting quotient filter `f` to the container `z` with
+    the name `nm`.
+    """
+    writeBitvec(z, f.occupied, nm + '-occupied')
+    writeBitvec(z, f.continuation, nm + '-continuation')
+    writeBitvec(z, f.shifted, nm + '-shifted')
+    vectors.writeGeneric(z, f.rems, nm + '-remainders', f.rems.typecode)
+    vectors.writeGeneric(z, f.counts, nm + '-counts', f.w)
+    z.meta[nm + '-cqf'] = (f.q, f.r, f.s, f.slots, f.n, f.w)
+
+def readCqf(z, nm):
+    """
+    Read the counting quotient filter with the name `nm` from the
+    container `z`.
+    """
+    m = z.meta[nm + '-cqf']
+    (q, r, s, slots, n) = m[:5]
+    w = 'I'
+    if len(m) > 5:
+        w = m[5]
+    f = cqf(1, 0.5, s, w)
+    (f.q, f.r, f.slots, f.n) = (q, r, slots, n)
+    f.occupied = readBitvec(z, nm + '-occupied')
+    f.continuation = readBitvec(z, nm + '-continuation')
+    f.shifted = readBitvec(z, nm + '-shifted')
+    f.rems = vectors.readGenericArray(z, nm + '-remainders', f.slots, _remainderType(r))
+    f.counts = vectors.readGenericArray(z, nm + '-counts', f.slots, w)
+    return f
@@ -12,10 +12,11 @@ __docformat__ = 'restructuredtext'
 from pykmer.basics import kmers
 from pykmer.misc import uniq
 from pykmer.sparse import sparse
+from pykmer.eliasfano import eliasfano
 from pykmer.file import openFile, readFasta
 from pykmer.container import container
-from pykmer.container.std import readKmers, writeKmers
-from pykmer.container.vectors import read32, write32, read16, write16
+from pykmer.container.std import readKmersArray, writeKmers
+from pykmer.container.vectors import read32array, write32, read16array, write16
 
 import array
 
@@ -30,21 +31,41 @@ class KmerIndex:
     `KmerIndex.names`
         is a list of the reference sequence names used for mapping
         the results of lookup back from sequence numbers to names.
+        If the container stores the names separately (see
+        `pykmer.container`), they are only read when first used.
     `KmerIndex[x]`
         is the lookup method for finding the reference sequence
         numbers for those sequences containing `x`.
+
+    If `compact` is true, the *k*-mers are held in a
+    `pykmer.eliasfano.eliasfano` set, which takes much less memory
+    than the default `pykmer.sparse.sparse` set, but is slower.
     """
-    def __init__(self, z):
+    def __init__(self, z, compact = False):
         self.K = z.meta['K']
-        S = array.array('L', readKmers(z))
-        self.S = sparse(2*self.K, S)
+        S = readKmersArray(z)
+        if compact:
+            self.S = eliasfano(2*self.K, S)
+        else:
+            self.S = sparse(2*self.K, S)
+        del S
         n = z.meta['T']
-        self.T = array.array('I', read32(z, 'offsets', n))
+        self.T = read32array(z, 'offsets', n)
         n = z.meta['U']
-        self.U = array.array('H', read16(z, 'postings', n))
+        self.U = read16array(z, 'postings', n)
         n = z.meta['lens']
-        self.lens = array.array('I', read32(z, 'lens', n))
-        self.names = z.meta['names']
+        self.lens = read32array(z, 'lens', n)
+        if 'names' in z.meta.lazy:
+            self.fn = z.nm
+        else:
+            self.names = z.meta['names']
+
+    def __getattr__(self, nm):
+        if nm != 'names' or 'fn' not in self.__dict__:
+            raise AttributeError(nm)
+        with container(self.fn, 'r') as z:
+            self.names = z.meta['names']
+        return self.names
 
     def __getitem__(self, x):
         r = self.S.access(x)
@@ -55,13 +76,26 @@ class KmerIndex:
             res.append(self.U[i])
         return res
 
-def index(fn):
+    def getMany(self, xs):
+        """
+        Look up a batch of *k*-mers `xs`, returning a list with the list
+        of reference sequence numbers for each, as for `KmerIndex[x]`.
+        """
+        res = []
+        for r in self.S.accessMany(xs):
+            if r < 0:
+                res.append([])
+            else:
+                res.append(self.U[self.T[r]:self.T[r+1]].tolist())
+        return res
+
+def index(fn, compact = False):
     """
     Load a k-mer index into memory and return the resulting KmerIndex
-    object.
+    object (see `KmerIndex` for `compact`).
     """
     with container(fn, 'r') as z:
-        idx = KmerIndex(z)
+        idx = KmerIndex(z, compact)
     return idx
 
 def buildIndex(K, inputs, output):
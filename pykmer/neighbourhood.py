@@ -0,0 +1,113 @@
+"""
+This module provides a Hamming neighbourhood query over a sorted set
+of *k*-mers: given a query *k*-mer, find all the *k*-mers in the set
+that differ from it by no more than *d* substitutions.
+
+The method is based on the pigeonhole principle. The *k*-mer is split
+in to *d* + 1 blocks of bases, and any *k*-mer within Hamming distance
+*d* of the query must agree exactly with it on at least one block.
+For each block, the set is kept sorted on a permutation of the *k*-mers
+that moves that block to the most significant position, so the
+*k*-mers that agree with the query on that block form a contiguous
+range, which can be found with `pykmer.sparse.sparse.rank2`. Only the
+*k*-mers in those ranges need to be compared with the query using `ham`.
+"""
+
+__docformat__ = 'restructuredtext'
+
+from pykmer.basics import ham
+from pykmer.sparse import sparse
+
+import array
+
+class neighbourhood:
+    """
+    A Hamming neighbourhood index over a `pykmer.sparse.sparse` set of
+    *k*-mers.
+    """
+
+    def __init__(self, K, S, d):
+        """
+        Create a new neighbourhood index over the *k*-mers in the
+        sparse set `S` for queries within Hamming distance `d`.
+
+        In addition to `S`, the index holds a permuted copy of the
+        set, along with the corresponding ranks, for each of the `d`
+        blocks after the first.
+        """
+        assert 0 <= d < K
+        self.K = K
+        self.S = S
+        self.d = d
+
+        self.blocks = []
+        a = 0
+        for b in xrange(d + 1):
+            w = K // (d + 1)
+            if b < K % (d + 1):
+                w += 1
+            lo = 2*(K - a - w)
+            self.blocks.append((lo, 2*w, ((1 << (2*w)) - 1) << lo))
+            a += w
+
+        self.perms = [None]
+        for b in xrange(1, d + 1):
+            xs = [(self._perm(b, S.select(r)), r) for r in xrange(S.count())]
+            xs.sort()
+            ks = array.array('L', [x for (x, r) in xs])
+            rs = array.array('L', [r for (x, r) in xs])
+            del xs
+            self.perms.append((sparse(2*K, ks), rs))
+
+    def _perm(self, b, x):
+        """
+        Move block `b` of `x` to the most significant position, keeping
+        the other bases in order.
+        """
+        (lo, w, m) = self.blocks[b]
+        return (((x & m) >> lo) << (2*self.K - w)) | ((x >> (lo + w)) << lo) | (x & ((1 << lo) - 1))
+
+    def query(self, x, d=None):
+        """
+        Find the *k*-mers in the set within Hamming distance `d` of
+        `x`, returning a list of (kmer, rank, distance) tuples, ordered
+        by rank. If `d` is not given, the distance given when the index
+        was constructed is used. It is an error for `d` to exceed it.
+        """
+        if d is None:
+            d = self.d
+        assert d <= self.d
+        res = []
+        for b in xrange(self.d + 1):
+            (lo, w, m) = self.blocks[b]
+            xp = self._perm(b, x)
+            s = 2*self.K - w
+            v0 = (xp >> s) << s
+            v1 = v0 + (1 << s)
+            if b == 0:
+                (r0, r1) = self.S.rank2(v0, v1)
+                for r in xrange(r0, r1):
+                    y = self.S.select(r)
+                    h = ham(x, y)
+                    if h <= d:
+                        res.append((y, r, h))
+                continue
+            (P, rs) = self.perms[b]
+            (r0, r1) = P.rank2(v0, v1)
+            for i in xrange(r0, r1):
+                r = rs[i]
+                y = self.S.select(r)
+                h = ham(x, y)
+                if h > d:
+                    continue
+                # Skip k-mers already found by an earlier block.
+                z = x ^ y
+                seen = False
+                for c in xrange(b):
+                    if z & self.blocks[c][2] == 0:
+                        seen = True
+                        break
+                if not seen:
+                    res.append((y, r, h))
+        res.sort(key=lambda t: t[1])
+        return res
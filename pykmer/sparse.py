@@ -2,6 +2,17 @@
 This module provides a simple rank/select interface to a sorted list/array
 of integers.
 
+To narrow down the binary search, the set keeps a directory counting the
+elements in each of about N/64 buckets, which are defined by the most
+significant bits of the elements, so a search usually only has to
+consider a few dozen elements, however large the set is.
+
+Batches of queries may be resolved together with `rankMany` and
+`accessMany`, which sort the queries and sweep through the set, so
+each search is bounded by the result of the previous one. If NumPy is
+available, and the set is held in an `array.array('L')`, the batch is
+resolved with `numpy.searchsorted` without any per-query Python code.
+
 See https://en.wikipedia.org/wiki/Succinct_data_structure for more
 general information about the API.
 """
@@ -10,6 +21,11 @@ __docformat__ = 'restructuredtext'
 
 import array
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 class sparse:
     """
     The sparse class is for presenting a sparse set of integers through
@@ -28,16 +44,23 @@ class sparse:
         other object which supports ordinal access in the same manner.
         """
         self.B = B
-        self.S = B - 10
+        n = len(xs)
+        D = min(B, (n // 64).bit_length())
+        self.S = B - D
         self.xs = xs
-        self.toc = array.array('I', [0 for i in xrange(1024+1)])
+        w = 'I'
+        if n >= (1 << 32):
+            w = 'L'
+        z = (1 << D) + 1
+        self.toc = array.array(w, [0]) * z
+        toc = self.toc
+        S = self.S
         for x in xs:
-            v = x >> self.S
-            self.toc[v+1] += 1
+            toc[(x >> S) + 1] += 1
         t = 0
-        for i in xrange(1024+1):
-            t += self.toc[i]
-            self.toc[i] = t
+        for i in xrange(z):
+            t += toc[i]
+            toc[i] = t
 
     def size(self):
         """
@@ -58,37 +81,50 @@ class sparse:
         which is the number of elements in the set which are strictly
         less than `x`.
 
-        It is an error for `x` to be outside the interval [0, 2**B).
+        Values of `x` >= 2**B yield the number of elements in the set.
         """
         v = x >> self.S
+        if v + 1 >= len(self.toc):
+            return len(self.xs)
         l = self.toc[v]
-        h = self.toc[v+1] - 1
-        while h >= l:
+        h = self.toc[v+1]
+        xs = self.xs
+        while l < h:
             m = (h + l) // 2
-            y = self.xs[m]
-            if y == x:
-                return m
-            if y < x:
+            if xs[m] < x:
                 l = m + 1
             else:
-                h = m - 1
+                h = m
         return l
 
     def rank2(self, x0, x1):
         """
         Perform `rank` operations on x0 and x1. Equivalent to
             return(rank(x0), rank(x1)),
-        but assumes that x1 has a nearby rank.
+        but is fastest when x1 has a nearby rank, since the rank of x1
+        is found with an exponential (galloping) search from that of x0.
 
-        It is an error if x1 <= x0.
+        It is an error if x1 < x0.
         """
         assert x0 <= x1
         r0 = self.rank(x0)
-        z = len(self.xs)
-        r1 = r0
-        while r1 < z and self.xs[r1] < x1:
-            r1 += 1
-        return (r0, r1)
+        xs = self.xs
+        z = len(xs)
+        l = r0
+        h = r0
+        d = 1
+        while h < z and xs[h] < x1:
+            l = h + 1
+            h = r0 + d
+            d <<= 1
+        h = min(h, z)
+        while l < h:
+            m = (l + h) // 2
+            if xs[m] < x1:
+                l = m + 1
+            else:
+                h = m
+        return (r0, l)
 
     def access(self, x):
         """
@@ -101,6 +137,77 @@ class sparse:
         else:
             return r0
 
+    def _vectorized(self):
+        xs = self.xs
+        return np is not None and isinstance(xs, array.array) and xs.typecode == 'L' and len(xs) > 0
+
+    def _searchsorted(self, qs):
+        v = np.frombuffer(self.xs, dtype=np.uint64)
+        q = np.array(qs, dtype=np.uint64)
+        return (v, q, np.searchsorted(v, q, 'left'))
+
+    def rankMany(self, qs):
+        """
+        Return an `array.array('L')` of the ranks of each of the
+        queries `qs`, in the order of the queries.
+        """
+        n = len(qs)
+        res = array.array('L', [0]) * n
+        if n == 0:
+            return res
+        xs = self.xs
+        z = len(xs)
+        if self._vectorized():
+            (v, q, r) = self._searchsorted(qs)
+            np.frombuffer(res, dtype=np.uint64)[:] = r
+            return res
+        toc = self.toc
+        S = self.S
+        w = len(toc) - 1
+        r = 0
+        for i in sorted(xrange(n), key=qs.__getitem__):
+            x = qs[i]
+            v = x >> S
+            if v >= w:
+                res[i] = z
+                r = z
+                continue
+            l = max(r, toc[v])
+            h = toc[v+1]
+            while l < h:
+                m = (h + l) // 2
+                if xs[m] < x:
+                    l = m + 1
+                else:
+                    h = m
+            res[i] = l
+            r = l
+        return res
+
+    def accessMany(self, qs):
+        """
+        Return an `array.array('l')` of the ranks of each of the
+        queries `qs`, in the order of the queries, with -1 for the
+        queries which are not in the set.
+        """
+        xs = self.xs
+        z = len(xs)
+        res = array.array('l', [-1]) * len(qs)
+        if len(qs) == 0:
+            return res
+        if self._vectorized():
+            (v, q, r) = self._searchsorted(qs)
+            hit = r < z
+            hit[hit] = v[r[hit]] == q[hit]
+            np.frombuffer(res, dtype=np.int64)[hit] = r[hit]
+            return res
+        rs = self.rankMany(qs)
+        for i in xrange(len(qs)):
+            r = rs[i]
+            if r < z and xs[r] == qs[i]:
+                res[i] = r
+        return res
+
     def select(self, i):
         """
         The `select` method returns, given `i`, the ith smallest item
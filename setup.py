@@ -22,6 +22,7 @@ setup(name='pykmer',
         keywords='bioinformatics genomics pathogenomics',
         packages=find_packages(),
         install_requires=['docopt'],
+        extras_require={'numpy': ['numpy']},
         tests_require=['pytest'],
         cmdclass = {'test': PyTest},
         zip_safe=False)
@@ -1,6 +1,7 @@
 import pykmer.basics as basics
 
 import random
+import pytest
 
 def binary(x):
     r = []
@@ -100,3 +101,148 @@ def test_kmers_both():
             ys.append(y)
             ys.append(basics.rc(k, y))
     assert xs == ys
+
+def test_kmersArrays():
+    pytest.importorskip('numpy')
+    s = "CCTCGTACGCCATATTTTCGCATTTCACGTACGTATTGTTTTTGCAACATAATTACCTATTCTCTTTTGGGGGGGGTTTTAGGCATTCCATTTAATNGCTTTTCTTTTAATGCATGGAGTTTTTCCCATTCATCCTTTGATATATTATCTTTACTTGCTTCGAAGTCTNTTGCTGTGAGATGTATATCTTCTGGATGGATTTGTTTACGTTCTTTTGTTACTGGATCTATAGTAAATGGAATCATTTCCTT"
+    for k in [1, 7, 25, 31, 32]:
+        (xs, ys) = basics.kmersArrays(k, s)
+        (us, vs) = basics.kmersLists(k, s)
+        assert list(xs) == us
+        assert list(ys) == vs
+
+def test_kmersArrays_block():
+    pytest.importorskip('numpy')
+    random.seed(17)
+    k = 25
+    seqs = [''.join([random.choice("ACGTN") for i in range(random.randint(0, 150))]) for j in range(100)]
+    (xs, ys) = basics.kmersArrays(k, seqs)
+    us = []
+    vs = []
+    for seq in seqs:
+        (u, v) = basics.kmersLists(k, seq)
+        us += u
+        vs += v
+    assert list(xs) == us
+    assert list(ys) == vs
+
+def test_kmersArrays_fastq_block():
+    pytest.importorskip('numpy')
+    import pykmer.file as file
+    import StringIO
+    random.seed(17)
+    k = 25
+    seqs = [''.join([random.choice("ACGTN") for i in range(random.randint(0, 150))]) for j in range(100)]
+    txt = ''.join(['@r%d\n%s\n+\n%s\n' % (j, seqs[j], 'I' * len(seqs[j])) for j in range(100)])
+    blks = list(file.readFastqBlock(StringIO.StringIO(txt), 40))
+    assert len(blks) == 3
+    for blk in blks:
+        (xs, ys) = basics.kmersArrays(k, blk)
+        (us, vs) = basics.kmersArrays(k, [rd[1] for rd in blk])
+        assert list(xs) == list(us)
+        assert list(ys) == list(vs)
+    (xs, ys) = basics.kmersArrays(k, [])
+    assert len(xs) == 0
+
+def test_rcArray():
+    pytest.importorskip('numpy')
+    random.seed(17)
+    k = 25
+    M = (1 << (2*k)) - 1
+    xs = [random.randint(0, M) for i in xrange(1000)]
+    ys = basics.rcArray(k, xs)
+    assert list(ys) == [basics.rc(k, x) for x in xs]
+
+def test_murmerArray():
+    pytest.importorskip('numpy')
+    random.seed(17)
+    xs = [random.randint(0, 0xFFFFFFFFFFFFFFFF) for i in xrange(1000)]
+    for s in [0, 17, 12345]:
+        ys = basics.murmerArray(xs, s)
+        assert list(ys) == [basics.murmer(x, s) for x in xs]
+
+def test_canArray():
+    pytest.importorskip('numpy')
+    import array
+    random.seed(17)
+    k = 31
+    M = (1 << (2*k)) - 1
+    xs = array.array('L', [random.randint(0, M) for i in xrange(1000)])
+    ys = basics.canArray(k, xs)
+    assert list(ys) == [basics.can(k, x) for x in xs]
+
+def test_minimizers():
+    random.seed(17)
+    k = 11
+    w = 8
+    s = ''.join([random.choice("ACGT") for i in range(300)]) + 'N' + ''.join([random.choice("ACGT") for i in range(100)])
+    ms = list(basics.minimizers(k, w, s))
+    xs = []
+    for i in range(len(s) - k + 1):
+        x = basics.kmer(s[i:i+k])
+        if x is None:
+            xs.append(None)
+        else:
+            xs.append(basics.can(k, x))
+    ys = []
+    for i in range(len(xs) - w + 1):
+        win = xs[i:i+w]
+        if None in win:
+            continue
+        hs = [basics.murmer(x, 17) for x in win]
+        j = hs.index(min(hs))
+        ys.append((i, i + j, win[j]))
+    assert ms == ys
+
+def test_superkmers():
+    random.seed(17)
+    k = 11
+    w = 8
+    s = ''.join([random.choice("ACGT") for i in range(300)]) + 'N' + ''.join([random.choice("ACGT") for i in range(100)])
+    ms = dict([(i, m) for (i, p, m) in basics.minimizers(k, w, s)])
+    n = 0
+    for (m, b, e) in basics.superkmers(k, w, s):
+        for i in range(b, e - (w + k - 1) + 1):
+            assert ms[i] == m
+            n += 1
+    assert n == len(ms)
+
+def test_kmersWithHash():
+    s = "CCTCGTACGCCATATTTTCGCATTTCACGTACGTATTGTTTTTGCAACATAATTACCTATTCTCTTTTGGGGGGGGTTTTAGGCATTCCATTTAATNGCTTTTCTTTTAATGCATGGAGTTTTTCCCATTCATCCTTTGATATATTATCTTTACTTGCTTCGAAGTCTNTTGCTGTGAGATGTATATCTTCTGGATGGATTTGTTTACGTTCTTTTGTTACTGGATCTATAGTAAATGGAATCATTTCCTT"
+    for k in [1, 11, 25, 32]:
+        xhs = list(basics.kmersWithHash(k, s, True))
+        xs = list(basics.kmers(k, s, True))
+        assert [x for (x, h) in xhs] == xs
+        for (x, h) in xhs:
+            assert h == basics.nthash(k, x)
+            assert h == basics.nthash(k, basics.rc(k, x))
+
+def test_myers():
+    s0 = "CAAAAAAAAAAAAAAAATTTTTTTT"
+    s1 = "CAAAAAAAAAAAAATTTTTTTTCGG"
+    k = len(s0)
+    x0 = basics.kmer(s0)
+    x1 = basics.kmer(s1)
+    assert basics.myers(k, x0, x1) == 3
+
+def test_myers_lev():
+    random.seed(17)
+    for k in [1, 5, 16, 25, 31, 32]:
+        M = (1 << (2*k)) - 1
+        x = random.randint(0, M)
+        ys = []
+        for i in range(100):
+            y = list(basics.render(k, x))
+            for j in range(random.randint(0, 4)):
+                y[random.randint(0, k - 1)] = random.choice("ACGT")
+            if random.random() < 0.5:
+                p = random.randint(0, k - 1)
+                y = y[:p] + y[p+1:] + [random.choice("ACGT")]
+            ys.append(basics.kmer(''.join(y)))
+        ds = [basics.lev(k, x, y) for y in ys]
+        assert [basics.myers(k, x, y) for y in ys] == ds
+        assert basics.myersMany(k, x, ys) == ds
+        for d in range(4):
+            es = [(e if e <= d else None) for e in ds]
+            assert [basics.myersBounded(k, x, y, d) for y in ys] == es
+            assert basics.myersMany(k, x, ys, d) == es
@@ -0,0 +1,85 @@
+import pykmer.basics as basics
+import pykmer.basics128 as basics128
+
+import random
+
+def randomSeq(k):
+    return ''.join([random.choice("ACGT") for i in range(k)])
+
+def revComp(s):
+    return ''.join([{'A':'T', 'C':'G', 'G':'C', 'T':'A'}[c] for c in s[::-1]])
+
+def test_rc():
+    random.seed(17)
+    for k in [33, 41, 55, 63, 64]:
+        s = randomSeq(k)
+        x = basics.kmer(s)
+        y = basics128.rc(k, x)
+        assert basics.render(k, y) == revComp(s)
+        assert basics128.rc(k, y) == x
+
+def test_ham():
+    random.seed(17)
+    k = 57
+    for i in range(100):
+        a = randomSeq(k)
+        b = randomSeq(k)
+        h = 0
+        for j in range(k):
+            if a[j] != b[j]:
+                h += 1
+        assert basics128.ham(basics.kmer(a), basics.kmer(b)) == h
+
+def test_lcp():
+    random.seed(17)
+    k = 61
+    for i in range(100):
+        a = randomSeq(k)
+        b = list(a)
+        p = random.randint(0, k - 1)
+        b[p] = "ACGT"[("ACGT".index(a[p]) + 1) % 4]
+        b = ''.join(b)
+        assert basics128.lcp(k, basics.kmer(a), basics.kmer(b)) == p
+    assert basics128.lcp(k, basics.kmer(a), basics.kmer(a)) == k
+
+def test_can():
+    random.seed(17)
+    k = 45
+    for i in range(100):
+        x = basics.kmer(randomSeq(k))
+        y = basics128.rc(k, x)
+        assert basics128.can(k, x) == basics128.can(k, y)
+        assert basics128.can(k, x) in [x, y]
+
+def test_kmers():
+    random.seed(17)
+    k = 51
+    s = randomSeq(200) + 'N' + randomSeq(100)
+    xs = list(basics128.kmers(k, s, True))
+    ys = []
+    for i in range(len(s) - k + 1):
+        y = basics.kmer(s[i:i+k])
+        if y is not None:
+            ys.append(y)
+            ys.append(basics128.rc(k, y))
+    assert xs == ys
+
+def test_pack_sort_merge():
+    random.seed(17)
+    k = 63
+    M = (1 << (2*k)) - 1
+    xs = [random.randint(0, M) for i in range(1000)]
+    ys = [random.randint(0, M) for i in range(1000)] + xs[:10]
+    a = basics128.pack(xs)
+    b = basics128.pack(ys)
+    assert len(a) == 2*len(xs)
+    basics128.sort(a)
+    basics128.sort(b)
+    xs.sort()
+    ys.sort()
+    assert list(basics128.unpack(a)) == xs
+    assert basics128.item(a, 17) == xs[17]
+    c = basics128.merge(a, b)
+    assert list(basics128.unpack(c)) == sorted(xs + ys)
+    d = basics128.merge(a, b, True)
+    assert list(basics128.unpack(d)) == sorted(set(xs + ys))
@@ -12,3 +12,11 @@ def test_popcnt():
         y >>= 1
     j = bits.popcnt(x)
     assert c == j
+
+def test_select():
+    random.seed(17)
+    for i in xrange(1000):
+        x = random.randint(1, (1 << 64) - 1)
+        ps = [p for p in xrange(64) if (x >> p) & 1]
+        for j in xrange(len(ps)):
+            assert bits.select(x, j) == ps[j]
@@ -0,0 +1,88 @@
+from pykmer.file import tmpfile
+import pykmer.bitvec as bitvec
+import pykmer.container as container
+
+import os
+import random
+
+def mk(n, p):
+    v = bitvec.bitvec(n)
+    xs = [i for i in xrange(n) if random.random() < p]
+    for i in xs:
+        v[i] = 1
+    return (v, xs)
+
+def test_get_set():
+    random.seed(17)
+    v = bitvec.bitvec(1000)
+    assert len(v) == 1000
+    for i in xrange(1000):
+        assert v[i] == 0
+    v[63] = 1
+    v[64] = 3
+    v[999] = 1
+    assert v[63] == 1 and v[64] == 1 and v[999] == 1 and v[65] == 0
+    v[64] = 2
+    assert v[64] == 0 and v[63] == 1
+    assert v.count() == 2
+
+def test_rank_select():
+    random.seed(17)
+    for (n, p) in [(1, 1.0), (64, 0.5), (512, 1.0), (10000, 0.5), (100000, 0.01), (70000, 0.9)]:
+        (v, xs) = mk(n, p)
+        assert v.count() == len(xs)
+        r = 0
+        for i in xrange(n + 1):
+            assert v.rank1(i) == r
+            assert v.rank0(i) == i - r
+            if i < n and v[i]:
+                r += 1
+        for j in xrange(len(xs)):
+            assert v.select1(j) == xs[j]
+        v[0] = 1 - v[0]
+        assert v.rank1(1) == v[0]
+
+def test_popcount():
+    random.seed(17)
+    (v, xs) = mk(5000, 0.3)
+    for k in xrange(200):
+        i = random.randint(0, 5000)
+        j = random.randint(0, 5000)
+        c = len([x for x in xs if i <= x < j])
+        assert v.popcount(i, j) == c
+        v.buildIndex()
+        assert v.popcount(i, j) == c
+        v.idx = None
+
+def test_bulk(monkeypatch):
+    random.seed(17)
+    for useNumpy in [True, False]:
+        if not useNumpy:
+            monkeypatch.setattr(bitvec, 'np', None)
+        n = 3000
+        xs = set(random.sample(xrange(n), 1000))
+        ys = set(random.sample(xrange(n), 1000))
+        u = bitvec.bitvec(n)
+        u.setMany(list(xs))
+        w = bitvec.bitvec(n)
+        w.setMany(list(ys))
+        assert set([i for i in xrange(n) if u[i]]) == xs
+        for (r, zs) in [(u & w, xs & ys), (u | w, xs | ys), (u ^ w, xs ^ ys), (u.andnot(w), xs - ys)]:
+            assert set([i for i in xrange(n) if r[i]]) == zs
+            assert r.count() == len(zs)
+        u.clearMany(list(ys))
+        assert set([i for i in xrange(n) if u[i]]) == xs - ys
+        assert u.rank1(n) == len(xs - ys)
+
+def test_rw():
+    random.seed(17)
+    (v, xs) = mk(100000, 0.2)
+    nm = tmpfile()
+    with container.container(nm, 'w') as z:
+        bitvec.writeBitvec(z, v, 'mask')
+    with container.container(nm, 'r') as z:
+        w = bitvec.readBitvec(z, 'mask')
+    assert len(w) == len(v)
+    assert w.data == v.data
+    assert w.select1(len(xs) - 1) == xs[-1]
+    os.remove(nm)
@@ -0,0 +1,174 @@
+import pykmer.container.casket as casket
+from pykmer.file import tmpfile
+
+import array
+import os
+import random
+import pytest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def mkCasket(fn, fs):
+    with casket.casket(fn, 'w') as c:
+        for (afn, dat) in fs:
+            c.add_content(afn, dat)
+
+def test_roundtrip():
+    fn = tmpfile()
+    fs = [('foo', 'the quick brown fox'), ('bar', ''), ('baz', 'jumps over the lazy dog')]
+    mkCasket(fn, fs)
+    with casket.casket(fn, 'r') as c:
+        assert c.list() == [('bar', 0), ('baz', 23), ('foo', 19)]
+        for (afn, dat) in fs:
+            with c.open(afn) as f:
+                assert f.read() == dat
+    os.remove(fn)
+
+def test_stream():
+    fn = tmpfile()
+    with casket.casket(fn, 'w') as c:
+        with c.add_stream('foo') as f:
+            f.write('abc')
+            f.write('def')
+        assert f.closed
+        c.add_content('bar', 'xyz')
+    with casket.casket(fn, 'r') as c:
+        assert c.open('foo').read() == 'abcdef'
+        assert c.open('bar').read() == 'xyz'
+    os.remove(fn)
+
+def test_multiple_open():
+    fn = tmpfile()
+    with casket.casket(fn, 'w') as c:
+        f = c.add_stream('foo')
+        with pytest.raises(casket.MultipleOpenFiles):
+            c.add_content('bar', 'xyz')
+        f.close()
+    os.remove(fn)
+
+def test_mmap():
+    random.seed(17)
+    xs = array.array('L', [random.randint(0, (1 << 64) - 1) for i in xrange(1000)])
+    fn = tmpfile()
+    fs = [('foo', 'the quick brown fox'), ('xs', xs.tostring())]
+    mkCasket(fn, fs)
+    with casket.casket(fn, 'r', mmap=True) as c:
+        for (afn, dat) in fs:
+            f = c.open(afn)
+            g = c.open(afn)
+            assert f.read(4) == dat[:4]
+            assert g.read() == dat
+            f.seek(2, os.SEEK_CUR)
+            assert f.read() == dat[6:]
+            assert str(c.view(afn)) == dat
+        if np is not None:
+            v = c.array('xs', np.uint64)
+            assert v.tolist() == xs.tolist()
+            v = c.array('xs', np.uint64, 8*10, 5)
+            assert v.tolist() == xs[10:15].tolist()
+            assert not v.flags.writeable
+    os.remove(fn)
+
+def test_append_compact():
+    fn = tmpfile()
+    mkCasket(fn, [('foo', 'abc'), ('bar', 'def')])
+    with casket.casket(fn, 'a') as c:
+        assert c.open('foo').read() == 'abc'
+        c.add_content('foo', 'uvwxyz')
+        with c.add_stream('baz') as f:
+            f.write('ghi')
+    with casket.casket(fn, 'r') as c:
+        assert c.list() == [('bar', 3), ('baz', 3), ('foo', 6)]
+        assert c.open('foo').read() == 'uvwxyz'
+        assert len(c.toc['foo']) == 2
+    z0 = os.path.getsize(fn)
+    with casket.casket(fn, 'a') as c:
+        c.compact()
+        c.add_content('qux', 'jkl')
+    assert os.path.getsize(fn) < z0 + 30
+    with casket.casket(fn, 'r') as c:
+        assert len(c.toc['foo']) == 1
+        assert c.open('foo').read() == 'uvwxyz'
+        assert c.open('bar').read() == 'def'
+        assert c.open('baz').read() == 'ghi'
+        assert c.open('qux').read() == 'jkl'
+    os.remove(fn)
+
+def test_crc():
+    fn = tmpfile()
+    with casket.casket(fn, 'w', crc=True) as c:
+        c.add_content('foo', 'the quick brown fox')
+        with c.add_stream('bar') as f:
+            f.write('jumps over ')
+            f.write('the lazy dog')
+    with casket.casket(fn, 'r') as c:
+        assert len(c.toc['foo'][-1]) == 3
+        c.verify()
+        assert c.open('bar').read() == 'jumps over the lazy dog'
+    with open(fn, 'r+') as f:
+        f.seek(4)
+        f.write('Q')
+    for mmap in [False, True]:
+        with casket.casket(fn, 'r', mmap=mmap) as c:
+            assert c.open('bar').read() == 'jumps over the lazy dog'
+            g = c.open('foo')
+            assert g.read(4) == 'the '
+            with pytest.raises(casket.ChecksumError):
+                g.read()
+            with pytest.raises(casket.ChecksumError):
+                c.verify()
+            g = c.open('foo')
+            g.read(4)
+            with pytest.raises(casket.ChecksumError):
+                g.close()
+            g = c.open('foo')
+            g.seek(10)
+            g.seek(0)
+            with pytest.raises(casket.ChecksumError):
+                g.read()
+            if mmap:
+                with pytest.raises(casket.ChecksumError):
+                    c.view('foo')
+                assert str(c.view('bar')) == 'jumps over the lazy dog'
+    os.remove(fn)
+
+def test_crc_append():
+    fn = tmpfile()
+    with casket.casket(fn, 'w', crc=True) as c:
+        c.add_content('foo', 'the quick brown fox')
+    with casket.casket(fn, 'a') as c:
+        assert c.crc
+        c.add_content('bar', 'jumps over')
+        with c.add_stream('baz') as f:
+            f.write('the lazy dog')
+    with casket.casket(fn, 'r', mmap=True) as c:
+        for afn in ['foo', 'bar', 'baz']:
+            assert len(c.toc[afn][-1]) == 3
+        c.verify()
+        assert str(c.view('bar')) == 'jumps over'
+    mkCasket(fn, [('foo', 'abc')])
+    with casket.casket(fn, 'a') as c:
+        assert not c.crc
+        c.add_content('bar', 'def')
+    with casket.casket(fn, 'r') as c:
+        assert len(c.toc['bar'][-1]) == 2
+    os.remove(fn)
+
+def test_compact_tmp():
+    fn = tmpfile()
+    d = os.path.dirname(fn)
+    mkCasket(fn, [('foo', 'abc'), ('bar', 'def')])
+    os.chmod(fn, 0644)
+    before = set([f for f in os.listdir(d) if f.endswith('.compact')])
+    with casket.casket(fn, 'a', crc=True) as c:
+        c.add_content('foo', 'xyz')
+        c.compact()
+    assert set([f for f in os.listdir(d) if f.endswith('.compact')]) == before
+    assert os.stat(fn).st_mode & 0777 == 0644
+    with casket.casket(fn, 'r') as c:
+        assert c.open('foo').read() == 'xyz'
+        assert c.open('bar').read() == 'def'
+    os.remove(fn)
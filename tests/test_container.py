@@ -2,11 +2,15 @@ from pykmer.file import tmpfile
 import pykmer.container as container
 import pykmer.container.vectors as vecs
 import pykmer.container.std as std
+import pykmer.basics128 as basics128
 
+import array
+import cPickle
 import math
 import os
 import random
 import pytest
+import zipfile
 
 def test_rw_0():
     K = 27
@@ -93,3 +97,438 @@ def test_std_0():
 
     os.remove(nm)
 
+
+def test_std_128():
+    K = 55
+    M = (1 << (2*K)) - 1
+    N = 100000
+    random.seed(17)
+    xs = [random.randint(0, M) for i in xrange(N)]
+    xs.sort()
+    nm = tmpfile()
+    with container.container(nm, 'w') as z:
+        std.writeKmers(K, xs, z)
+    with container.container(nm, 'r') as z:
+        ys = list(std.readKmers(z))
+        blks = list(std.readKmersBlock(z))
+        for r in [0, 1, 65535, 65536, N - 1]:
+            assert std.seekKmer(z, xs[r]) == r
+            assert std.seekKmer(z, xs[r] - 1) == r
+        assert std.seekKmer(z, xs[-1] + 1) == N
+
+    assert ys == xs
+    assert sum([len(b) for b in blks]) == 2*N
+
+    os.remove(nm)
+
+    # All the k-mers share their most significant word, so the block
+    # directory cannot tell the blocks apart.
+    xs = [(5 << 64) | (3*i) for i in xrange(100000)]
+    with container.container(nm, 'w') as z:
+        std.writeKmers(K, xs, z)
+    with container.container(nm, 'r') as z:
+        for r in [0, 65535, 65536, 99999]:
+            assert std.seekKmer(z, xs[r]) == r
+            assert std.seekKmer(z, xs[r] - 1) == r
+        assert std.seekKmer(z, xs[-1] + 1) == 100000
+    os.remove(nm)
+
+def test_rw_array():
+    K = 27
+    M = (1 << (2*K)) - 1
+    N = 200000
+    random.seed(17)
+    xs = [random.randint(0, M) for i in xrange(N)]
+    cs = [random.randint(0, 1000) for i in xrange(N)]
+    nm = tmpfile()
+    with container.container(nm, 'w') as z:
+        std.writeKmers(K, xs, z)
+        std.writeCounts(K, cs, z)
+    with container.container(nm, 'r') as z:
+        ys = std.readKmersArray(z)
+        ds = std.readCountsArray(z)
+        bs = list(std.readKmersBlock(z))
+        es = list(std.readCountsBlock(z))
+    assert ys.typecode == 'L'
+    assert list(ys) == xs
+    assert ds.typecode == 'I'
+    assert list(ds) == cs
+    assert sum([list(b) for b in bs], []) == xs
+    assert sum([list(e) for e in es], []) == cs
+
+    os.remove(nm)
+
+def test_rw_view():
+    np = pytest.importorskip('numpy')
+    K = 27
+    M = (1 << (2*K)) - 1
+    N = 200000
+    random.seed(17)
+    xs = [random.randint(0, M) for i in xrange(N)]
+    nm = tmpfile()
+    with container.container(nm, 'w') as z:
+        vecs.write64(z, xs, 'wibble')
+    with container.container(nm, 'r') as z:
+        vs = list(vecs.read64view(z, 'wibble', N))
+    assert len(vs) == (N + vecs.blockSize - 1) // vecs.blockSize
+    assert vs[0].dtype == np.uint64
+    assert list(np.concatenate(vs)) == xs
+
+    os.remove(nm)
+
+def test_rw_view_mapped():
+    np = pytest.importorskip('numpy')
+    random.seed(17)
+    N = 2*vecs.blockSize + 100
+    xs = [random.randint(0, 1000000) for i in xrange(N)]
+    nm = tmpfile()
+    with container.container(nm, 'w', backend='casket') as z:
+        vecs.write32(z, xs, 'xs')
+    with container.container(nm, 'r', mmap=True) as z:
+        vs = list(vecs.read32view(z, 'xs', N))
+        assert len(vs) == 3
+        ws = list(vecs.read32view(z, 'xs', N))
+        assert all([np.may_share_memory(v, w) for (v, w) in zip(vs, ws)])
+        assert list(np.concatenate(vs)) == xs
+        assert vecs.read32array(z, 'xs', N).tolist() == xs
+    os.remove(nm)
+
+def test_delta():
+    K = 25
+    M = (1 << (2*K)) - 1
+    N = 200000
+    random.seed(17)
+    xs = sorted([random.randint(0, M) for i in xrange(N)])
+    xs[100:110] = [xs[100] for i in xrange(10)]
+    nm = tmpfile()
+    with container.container(nm, 'w') as z:
+        std.writeKmers(K, xs, z, enc='delta')
+    with container.container(nm, 'r') as z:
+        assert list(std.readKmers(z)) == xs
+        assert std.readKmersArray(z).tolist() == xs
+        assert sum([b.tolist() for b in std.readKmersBlock(z)], []) == xs
+    os.remove(nm)
+
+def test_delta_numpy(monkeypatch):
+    random.seed(17)
+    xs = sorted([random.randint(0, (1 << 40) - 1) for i in xrange(100000)])
+    xs[10:20] = [xs[10] for i in xrange(10)]
+    xs += [(1 << 64) - 1]
+    a = array.array('L', xs)
+    s = vecs._encodeDelta(a)
+    assert vecs._decodeDelta(s) == a
+    monkeypatch.setattr(vecs, 'np', None)
+    assert vecs._decodeDelta(s) == a
+
+def test_delta_size():
+    K = 15
+    M = (1 << (2*K)) - 1
+    random.seed(17)
+    xs = sorted(set([random.randint(0, M) for i in xrange(200000)]))
+    for backend in ['zip', 'casket']:
+        sz = {}
+        for enc in [None, 'delta']:
+            nm = tmpfile()
+            with container.container(nm, 'w', backend=backend) as z:
+                std.writeKmers(K, xs, z, enc=enc)
+            sz[enc] = os.path.getsize(nm)
+            os.remove(nm)
+        # The zip members are deflated, which takes up some of the slack.
+        assert sz['delta'] < sz[None]
+        if backend == 'casket':
+            assert sz['delta'] < sz[None] // 2
+
+def test_delta_writer():
+    random.seed(17)
+    N = 150000
+    xs = sorted([random.randint(0, (1 << 64) - 1) for i in xrange(N)])
+    xs[5:10] = [0 for i in xrange(5)]
+    nm = tmpfile()
+    with container.container(nm, 'w') as z:
+        with vecs.writer64(z, 'wibble', 'delta') as w:
+            for x in xs:
+                w.append(x)
+    with container.container(nm, 'r') as z:
+        assert z.meta['wibble-enc'] == 'delta'
+        assert list(vecs.read64(z, 'wibble', N)) == xs
+    os.remove(nm)
+
+def test_directory():
+    K = 25
+    M = (1 << (2*K)) - 1
+    N = 200000
+    random.seed(17)
+    xs = sorted(set([random.randint(0, M) for i in xrange(N)]))
+    N = len(xs)
+    for enc in [None, 'delta']:
+        nm = tmpfile()
+        with container.container(nm, 'w') as z:
+            std.writeKmers(K, xs, z, enc=enc)
+        with container.container(nm, 'r') as z:
+            d = vecs.readDirectory(z, z.meta['kmers'])
+            assert len(d) == 4*((N + vecs.blockSize - 1) // vecs.blockSize)
+            for b in xrange(len(d) // 4):
+                assert d[4*b+2] == xs[d[4*b+1]]
+            for (i, j) in [(0, 10), (70000, 70010), (65530, 140000), (N - 5, N + 5), (10, 10)]:
+                ys = sum([a.tolist() for a in std.readKmersRange(z, i, j)], [])
+                assert ys == xs[i:j]
+            for i in [0, 1, 65535, 65536, 150000, N - 1]:
+                assert std.seekKmer(z, xs[i]) == i
+                assert std.seekKmer(z, xs[i] + 1) == i + 1
+            assert std.seekKmer(z, M + 1) == N
+            rs = vecs.partition(z, z.meta['kmers'], N, 3)
+            assert rs[0][0] == 0 and rs[-1][1] == N
+            assert sum([j - i for (i, j) in rs]) == N
+        os.remove(nm)
+
+def test_casket_backend():
+    K = 25
+    M = (1 << (2*K)) - 1
+    N = 150000
+    random.seed(17)
+    xs = sorted(set([random.randint(0, M) for i in xrange(N)]))
+    cs = [random.randint(1, 100) for x in xs]
+    N = len(xs)
+    for mmap in [False, True]:
+        nm = tmpfile()
+        with container.container(nm, 'w', backend='casket') as z:
+            std.writeKmersAndCounts(K, zip(xs, cs), z)
+            z.add('wibble', 'wobble')
+        assert not container.isZip(nm)
+        with container.container(nm, 'r', mmap=mmap) as z:
+            assert z.backend == 'casket'
+            assert z.meta['K'] == K
+            assert list(std.readKmers(z)) == xs
+            assert list(std.readCounts(z)) == cs
+            assert std.readKmersArray(z).tolist() == xs
+            ys = sum([a.tolist() for a in std.readKmersRange(z, 70000, 70100)], [])
+            assert ys == xs[70000:70100]
+            assert std.seekKmer(z, xs[100000]) == 100000
+            assert z.open('wibble').read() == 'wobble'
+        os.remove(nm)
+
+def test_casket_crc():
+    random.seed(17)
+    N = 2*vecs.blockSize
+    xs = [random.randint(0, 1000) for i in xrange(N)]
+    nm = tmpfile()
+    with container.container(nm, 'w', backend='casket', crc=True) as z:
+        vecs.write32(z, xs, 'xs')
+    with container.container(nm, 'r') as z:
+        assert len(z.z.toc['xs'][-1]) == 3
+        assert list(vecs.read32(z, 'xs', N)) == xs
+    with container.container(nm, 'r') as z:
+        (p, l) = z.z.toc['xs'][-1][:2]
+    with open(nm, 'r+') as f:
+        f.seek(p + 12)
+        f.write('\xff')
+    for mmap in [False, True]:
+        with container.container(nm, 'r', mmap=mmap) as z:
+            with pytest.raises(container.casket.ChecksumError):
+                list(vecs.read32(z, 'xs', N))
+    os.remove(nm)
+
+def test_casket_detect():
+    # A first member of 19280 = 0x4B50 bytes makes the casket start
+    # with 'PK', like a zip file.
+    K = 25
+    random.seed(17)
+    xs = sorted(set([random.randint(0, (1 << (2*K)) - 1) for i in xrange(3000)]))[:2410]
+    nm = tmpfile()
+    with container.container(nm, 'w', backend='casket') as z:
+        std.writeKmers(K, xs, z)
+    with open(nm) as f:
+        assert f.read(2) == 'PK'
+    assert not container.isZip(nm)
+    with container.container(nm, 'r') as z:
+        assert z.backend == 'casket'
+        assert list(std.readKmers(z)) == xs
+    os.remove(nm)
+    with container.container(nm, 'w') as z:
+        std.writeKmers(K, xs, z)
+    assert container.isZip(nm)
+    with container.container(nm, 'r') as z:
+        assert z.backend == 'zip'
+    os.remove(nm)
+
+def test_threads():
+    K = 25
+    M = (1 << (2*K)) - 1
+    N = 300000
+    random.seed(17)
+    xs = sorted([random.randint(0, M) for i in xrange(N)])
+    for backend in ['zip', 'casket']:
+        for enc in [None, 'delta']:
+            nm = tmpfile()
+            with container.container(nm, 'w', backend=backend) as z:
+                std.writeKmers(K, xs, z, enc=enc, threads=3)
+                with vecs.writer32(z, 'counts', threads=2) as w:
+                    for x in xs:
+                        w.append(x & 0xFFFF)
+            with container.container(nm, 'r') as z:
+                assert z.meta[z.meta['kmers'] + '-comp'] == 'zlib'
+                assert list(std.readKmers(z)) == xs
+                assert std.readKmersArray(z).tolist() == xs
+                ys = sum([a.tolist() for a in std.readKmersRange(z, 200000, 200100)], [])
+                assert ys == xs[200000:200100]
+                assert std.seekKmer(z, xs[150000]) == 150000
+                assert list(vecs.read32(z, 'counts', N)) == [x & 0xFFFF for x in xs]
+            os.remove(nm)
+
+def test_thread_pools(monkeypatch):
+    random.seed(17)
+    N = 200000
+    xs = sorted([random.randint(0, (1 << 50) - 1) for i in xrange(N)])
+    monkeypatch.setattr(vecs, 'readThreads', 2)
+    nm = tmpfile()
+    with container.container(nm, 'w') as z:
+        w = vecs.writer64(z, 'xs', threads=2)
+        with pytest.raises(ValueError):
+            with w:
+                for x in xs:
+                    w.append(x)
+                raise ValueError
+        assert w.pool is None
+        vecs.write64(z, xs, 'ys', threads=2)
+    with container.container(nm, 'r') as z:
+        assert list(vecs.read64(z, 'ys', N)) == xs
+        p = vecs._readPool()
+        assert vecs.read64array(z, 'ys', N).tolist() == xs
+        assert vecs._readPool() is p
+    os.remove(nm)
+
+def test_lazy_meta():
+    random.seed(17)
+    names = ['seq%d' % i for i in xrange(5000)]
+    xs = array.array('L', [random.randint(0, 1000) for i in xrange(5000)])
+    for backend in ['zip', 'casket']:
+        nm = tmpfile()
+        with container.container(nm, 'w', backend=backend) as z:
+            z.meta['K'] = 25
+            z.meta['names'] = names
+            z.meta['xs'] = xs
+            z.meta['small'] = [1, 2, 3]
+        with container.container(nm, 'r') as z:
+            assert z.meta.lazy == set(['names', 'xs'])
+            assert z.meta['K'] == 25
+            assert z.meta['small'] == [1, 2, 3]
+            assert 'names' in z.meta
+            assert sorted(z.meta.keys()) == ['K', 'names', 'small', 'xs']
+            assert z.meta['names'] == names
+            assert z.meta.get('xs') == xs
+            assert z.meta.get('wibble') is None
+            assert len(z.meta.lazy) == 0
+        os.remove(nm)
+
+    nm = tmpfile()
+    with container.container(nm, 'w') as z:
+        z.meta['names'] = names
+    with container.container(nm, 'a') as z:
+        z.meta['K'] = 25
+    with container.container(nm, 'r') as z:
+        assert z.meta['K'] == 25
+        assert z.meta['names'] == names
+    os.remove(nm)
+
+def test_lazy_meta_iterate():
+    names = ['seq%d' % i for i in xrange(5000)]
+    for backend in ['zip', 'casket']:
+        nm = tmpfile()
+        with container.container(nm, 'w', backend=backend) as z:
+            z.meta['K'] = 25
+            z.meta['names'] = names
+        with container.container(nm, 'r') as z:
+            assert len(z.meta) == 2
+            assert sorted(z.meta) == ['K', 'names']
+            assert z.meta.has_key('names')
+            assert sorted(z.meta.iterkeys()) == ['K', 'names']
+            assert dict(z.meta.items()) == {'K': 25, 'names': names}
+            assert len(z.meta.lazy) == 0
+        with container.container(nm, 'r') as z:
+            assert sorted(z.meta.values()) == [25, names]
+            assert dict(z.meta.iteritems()) == {'K': 25, 'names': names}
+            assert dict(z.meta) == {'K': 25, 'names': names}
+        with container.container(nm, 'r') as z:
+            assert z.meta.pop('names') == names
+            assert z.meta.keys() == ['K']
+        os.remove(nm)
+
+def test_old_meta():
+    nm = tmpfile()
+    with zipfile.ZipFile(nm, 'w') as z:
+        z.writestr('__meta__', cPickle.dumps({'K': 25, 'names': ['a', 'b']}))
+    with container.container(nm, 'r') as z:
+        assert z.meta['K'] == 25
+        assert z.meta['names'] == ['a', 'b']
+    os.remove(nm)
+
+def test_casket_append():
+    K = 25
+    random.seed(17)
+    xs = sorted(set([random.randint(0, (1 << (2*K)) - 1) for i in xrange(1000)]))
+    nm = tmpfile()
+    with container.container(nm, 'w', backend='casket') as z:
+        std.writeKmers(K, xs, z)
+    with container.container(nm, 'a') as z:
+        assert z.backend == 'casket'
+        std.writeCounts(K, [1 for x in xs], z)
+    with container.container(nm, 'r') as z:
+        assert list(std.readKmers(z)) == xs
+        assert list(std.readCounts(z)) == [1 for x in xs]
+    os.remove(nm)
+
+def test_kmers_and_counts_block():
+    random.seed(17)
+    for K in [25, 40]:
+        M = (1 << (2*K)) - 1
+        N = 200000
+        xs = sorted([random.randint(0, M) for i in xrange(N)])
+        cs = [random.randint(1, 1000) for i in xrange(N)]
+        blks = []
+        i = 0
+        while i < N:
+            j = min(N, i + random.randint(1, 50000))
+            if K > 32:
+                xb = basics128.pack(xs[i:j])
+            else:
+                xb = array.array('L', xs[i:j])
+            blks.append((xb, array.array('I', cs[i:j])))
+            i = j
+        nm = tmpfile()
+        with container.container(nm, 'w') as z:
+            std.writeKmersAndCountsBlock(K, blks, z)
+        with container.container(nm, 'r') as z:
+            assert z.meta[z.meta['kmers'] + '-N'] == N
+            assert z.meta[z.meta['counts'] + '-N'] == N
+            ys = []
+            ds = []
+            for (xb, cb) in std.readKmersAndCountsBlock(z):
+                if K > 32:
+                    xb = list(basics128.unpack(xb))
+                assert len(xb) == len(cb)
+                assert len(cb) == vecs.blockSize or len(ys) + len(cb) == N
+                ys += list(xb)
+                ds += cb.tolist()
+            assert ys == xs
+            assert ds == cs
+            assert list(std.readKmersAndCounts(z)) == zip(xs, cs)
+        os.remove(nm)
+
+def test_kmers_and_counts_block_unaligned():
+    K = 25
+    random.seed(17)
+    N = 100000
+    xs = sorted([random.randint(0, (1 << (2*K)) - 1) for i in xrange(N)])
+    cs = [random.randint(1, 1000) for i in xrange(N)]
+    nm = tmpfile()
+    with container.container(nm, 'w') as z:
+        std.writeKmers(K, xs, z)
+        with std.CountsWriter(K, z) as w:
+            for i in xrange(0, N, 30000):
+                w.appendBlock(array.array('I', cs[i:i+30000]))
+                w.flush()
+    with container.container(nm, 'r') as z:
+        ps = list(std.readKmersAndCountsBlock(z))
+        assert sum([xb.tolist() for (xb, cb) in ps], []) == xs
+        assert sum([cb.tolist() for (xb, cb) in ps], []) == cs
+    os.remove(nm)
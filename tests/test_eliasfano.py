@@ -0,0 +1,64 @@
+import pykmer.eliasfano as eliasfano
+
+import array
+import bisect
+import random
+
+def test_empty():
+    K = 27
+    S = eliasfano.eliasfano(2*K, array.array('L', []))
+    assert S.count() == 0
+    assert S.rank(12345) == 0
+    assert S.access(12345) is None
+
+def test_rank_select():
+    random.seed(17)
+    for K in [5, 10, 27, 32]:
+        M = (1 << (2*K)) - 1
+        N = 20000
+        xs = sorted([random.randint(0, M) for i in xrange(N)])
+        S = eliasfano.eliasfano(2*K, array.array('L', xs))
+        assert S.count() == N
+        assert list(S) == xs
+        for i in xrange(N):
+            assert S.select(i) == xs[i]
+        for i in xrange(2000):
+            x = random.randint(0, M)
+            assert S.rank(x) == bisect.bisect_left(xs, x)
+            assert S.rank(xs[i]) == bisect.bisect_left(xs, xs[i])
+        assert S.rank2(0, M + 1) == (0, N)
+
+def test_access():
+    random.seed(17)
+    K = 25
+    M = (1 << (2*K)) - 1
+    N = 10000
+    xs = sorted(set([random.randint(0, M) for i in xrange(N)]))
+    ys = set(xs)
+    S = eliasfano.eliasfano(2*K, xs)
+    for i in xrange(len(xs)):
+        assert S.access(xs[i]) == i
+    for i in xrange(1000):
+        x = random.randint(0, M)
+        if x not in ys:
+            assert S.access(x) is None
+
+def test_space():
+    random.seed(17)
+    K = 25
+    N = 100000
+    xs = sorted(set([random.randint(0, (1 << (2*K)) - 1) for i in xrange(N)]))
+    S = eliasfano.eliasfano(2*K, xs)
+    assert float(S.space()) / len(xs) < 2 + S.L + 1
+
+def test_many():
+    random.seed(17)
+    B = 40
+    M = (1 << B) - 1
+    xs = sorted(set([random.randint(0, M) for i in xrange(5000)]))
+    qs = [random.choice(xs) for i in xrange(500)] + [random.randint(0, M) for i in xrange(500)]
+    random.shuffle(qs)
+    S = eliasfano.eliasfano(B, xs)
+    assert S.rankMany(qs).tolist() == [bisect.bisect_left(xs, q) for q in qs]
+    ys = set(xs)
+    assert S.accessMany(qs).tolist() == [xs.index(q) if q in ys else -1 for q in qs]
@@ -1,7 +1,12 @@
 import pykmer.file as file
 
+import gzip
 import os
 import os.path
+import pytest
+import random
+import zlib
+import StringIO
 
 def test_autoremove_0():
     nm = file.tmpfile('wibble')
@@ -45,3 +50,162 @@ def test_autoremove_3():
         pass
     assert not os.path.isfile(nm)
 
+
+def randomFastq(n, crlf=False, final=True):
+    random.seed(17)
+    recs = []
+    for i in xrange(n):
+        seq = ''.join([random.choice("ACGTN") for j in xrange(random.randint(0, 150))])
+        qual = ''.join([random.choice("#ABCDEFGHI") for j in xrange(len(seq))])
+        recs.append(('@read%d' % (i,), seq, '+', qual))
+    eol = '\r\n' if crlf else '\n'
+    txt = eol.join([eol.join(rec) for rec in recs])
+    if final:
+        txt += eol
+    return (recs, txt)
+
+def test_readFastqChunks():
+    for (crlf, final) in [(False, True), (True, True), (False, False)]:
+        (recs, txt) = randomFastq(1000, crlf, final)
+        for z in [17, 100, 4096, 1000000]:
+            seqs = []
+            for blk in file.readFastqChunks(StringIO.StringIO(txt), z):
+                seqs += blk
+            assert seqs == [rec[1] for rec in recs]
+
+def test_readFastqChunkOffsets(monkeypatch):
+    check_readFastqChunkOffsets()
+    monkeypatch.setattr(file, 'np', None)
+    check_readFastqChunkOffsets()
+
+def check_readFastqChunkOffsets():
+    for (crlf, final) in [(False, True), (True, True), (False, False)]:
+        (recs, txt) = randomFastq(1000, crlf, final)
+        for z in [17, 100, 4096, 1000000]:
+            seqs = []
+            for (buf, offs) in file.readFastqChunkOffsets(StringIO.StringIO(txt), z):
+                for i in xrange(0, len(offs), 2):
+                    seqs.append(buf[offs[i]:offs[i+1]])
+            assert seqs == [rec[1] for rec in recs]
+
+def test_readFastaChunks():
+    random.seed(17)
+    recs = []
+    lines = ['some junk']
+    for i in xrange(300):
+        seq = ''.join([random.choice("ACGTN") for j in xrange(random.randint(0, 300))])
+        recs.append(('seq %d' % (i,), seq))
+        lines.append('>' + recs[-1][0])
+        for j in xrange(0, len(seq), 60):
+            lines.append(seq[j:j+60])
+    txt = '\n'.join(lines) + '\n'
+    assert list(file.readFasta(StringIO.StringIO(txt))) == recs
+    for z in [17, 100, 4096, 1000000]:
+        res = []
+        for blk in file.readFastaChunks(StringIO.StringIO(txt), z):
+            res += blk
+        assert res == recs
+
+def test_readFastaChunks_long():
+    random.seed(17)
+    seqs = [''.join([random.choice("ACGT") for j in xrange(n)]) for n in [200000, 50, 100000]]
+    lines = []
+    for i in xrange(len(seqs)):
+        lines.append('>chr%d' % (i,))
+        for j in xrange(0, len(seqs[i]), 60):
+            lines.append(seqs[i][j:j+60])
+    txt = '\n'.join(lines) + '\n'
+    for z in [61, 1000]:
+        res = []
+        for blk in file.readFastaChunks(StringIO.StringIO(txt), z):
+            res += blk
+        assert res == [('chr%d' % (i,), seqs[i]) for i in xrange(len(seqs))]
+
+def test_gzip_bgzf():
+    (recs, txt) = randomFastq(5000)
+    with file.autoremove():
+        nm = file.tmpfile('.gz')
+        with file.openFile(nm, 'w', threads=4) as f:
+            for i in xrange(0, len(txt), 1000):
+                f.write(txt[i:i+1000])
+        with open(nm, 'rb') as f:
+            assert file._isBgzf(f.read(18))
+        assert gzip.open(nm).read() == txt
+        with file.openFile(nm, 'r', threads=4) as f:
+            assert [rec[1] for rec in file.readFastq(f)] == [rec[1] for rec in recs]
+        with file.GzipReader(nm, 3, 10000) as f:
+            assert f.read() == txt
+
+def test_gzip_members():
+    (recs, txt) = randomFastq(2000)
+    with file.autoremove():
+        nm = file.tmpfile('.gz')
+        h = len(txt) // 2
+        with gzip.open(nm, 'wb') as f:
+            f.write(txt[:h])
+        with gzip.open(nm, 'ab') as f:
+            f.write(txt[h:])
+        with file.GzipReader(nm, 4, 1000) as f:
+            ls = list(f)
+        assert ''.join(ls) == txt
+        assert len(ls) == 4*len(recs)
+
+def test_gzip_padding():
+    (recs, txt) = randomFastq(2000)
+    with file.autoremove():
+        for bgzf in [False, True]:
+            nm = file.tmpfile('.gz')
+            if bgzf:
+                with file.openFile(nm, 'w', threads=2) as f:
+                    f.write(txt)
+            else:
+                with gzip.open(nm, 'wb') as f:
+                    f.write(txt)
+            with open(nm, 'ab') as f:
+                f.write('\0' * 5000)
+            for z in [1000, 1000000]:
+                with file.GzipReader(nm, 2, z) as f:
+                    assert f.read() == txt
+            with open(nm, 'ab') as f:
+                f.write('x')
+            with pytest.raises(zlib.error):
+                with file.GzipReader(nm, 2, 1000) as f:
+                    f.read()
+
+def test_prefetch():
+    (recs, txt) = randomFastq(2000)
+    with file.autoremove():
+        nm = file.tmpfile('.fq')
+        with open(nm, 'w') as f:
+            f.write(txt)
+        with file.openFile(nm, prefetch=3) as f:
+            assert [rec[1] for rec in file.readFastq(f)] == [rec[1] for rec in recs]
+            st = f.stats()
+        assert st['bytes'] == len(txt)
+        with file.Prefetcher(open(nm), 2, 1000) as f:
+            seqs = []
+            for blk in file.readFastqChunks(f, 5000):
+                seqs += blk
+            assert seqs == [rec[1] for rec in recs]
+            assert f.stats()['blocks'] == (len(txt) + 999) // 1000
+
+def test_prefetch_owner(monkeypatch):
+    (recs, txt) = randomFastq(100)
+    src = StringIO.StringIO(txt)
+    with file.Prefetcher(src, 2, 100) as f:
+        f.read()
+    assert not src.closed
+    with file.Prefetcher(src, 2, 100, owner=True) as f:
+        pass
+    assert src.closed
+    stdin = StringIO.StringIO(txt)
+    monkeypatch.setattr(file.sys, 'stdin', stdin)
+    with file.openFile('-', prefetch=2) as f:
+        assert f.readline() == recs[0][0] + '\n'
+    assert not stdin.closed
+
+def test_prefetch_close_early():
+    (recs, txt) = randomFastq(2000)
+    f = file.Prefetcher(StringIO.StringIO(txt), 2, 100)
+    assert f.readline() == recs[0][0] + '\n'
+    f.close()
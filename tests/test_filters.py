@@ -0,0 +1,158 @@
+from pykmer.file import tmpfile
+import pykmer.filters as filters
+import pykmer.container as container
+
+import array
+import os
+import random
+
+def mkKmers(K, n):
+    M = (1 << (2*K)) - 1
+    return array.array('L', [random.randint(0, M) for i in xrange(n)])
+
+def test_bloom():
+    random.seed(17)
+    N = 20000
+    f = filters.bloom(N, 0.01)
+    assert f.k == 6
+    xs = mkKmers(25, N)
+    for x in xs:
+        f.add(x)
+    for x in xs:
+        assert x in f
+    ys = mkKmers(25, 100000)
+    fp = len([y for y in ys if y in f])
+    assert fp < 0.013 * len(ys)
+    assert list(f.containsMany(ys)) == [int(y in f) for y in ys]
+
+def test_bloom_fpr():
+    random.seed(17)
+    N = 20000
+    xs = mkKmers(25, N)
+    ys = mkKmers(25, 200000)
+    for fpr in [0.01, 0.001]:
+        f = filters.bloom(N, fpr)
+        assert filters._blockedFpr(f.blocks, f.k, N) <= fpr
+        f.addMany(xs)
+        fp = sum(f.containsMany(ys))
+        assert fp < 1.3 * fpr * len(ys)
+
+def test_bloom_many(monkeypatch):
+    for useNumpy in [True, False]:
+        random.seed(17)
+        if not useNumpy:
+            monkeypatch.setattr(filters, 'np', None)
+        xs = mkKmers(25, 5000)
+        xs.extend(xs[:1000])
+        f = filters.bloom(len(xs), 0.001)
+        s = f.addMany(xs)
+        assert len(s) == len(xs)
+        assert sum(s[5000:]) == 1000
+        assert sum(s[:5000]) < 10
+        assert list(f.containsMany(xs)) == [1 for x in xs]
+        g = filters.bloom(len(xs), 0.001)
+        for x in xs:
+            g.add(x)
+        assert g.bits.data == f.bits.data
+        ys = mkKmers(25, 5000)
+        assert list(f.containsMany(ys)) == [int(y in f) for y in ys]
+
+def test_cqf():
+    random.seed(17)
+    N = 10000
+    f = filters.cqf(N, 0.001)
+    xs = mkKmers(25, N)
+    cs = {}
+    for x in xs:
+        c = random.randint(1, 5)
+        cs[x] = cs.get(x, 0) + c
+        assert f.add(x, c) >= cs[x]
+    assert len(f) <= len(cs)
+    for (x, c) in cs.items():
+        assert f.count(x) >= c
+    assert len([x for x in cs if f.count(x) != cs[x]]) < 0.002 * N
+    ys = mkKmers(25, 10000)
+    fp = len([y for y in ys if y not in cs and y in f])
+    assert fp < 0.003 * len(ys)
+
+def test_cqf_many(monkeypatch):
+    for useNumpy in [True, False]:
+        random.seed(17)
+        if not useNumpy:
+            monkeypatch.setattr(filters, 'np', None)
+        xs = mkKmers(25, 3000)
+        xs.extend(xs[:500])
+        f = filters.cqf(3000, 0.001)
+        f.addMany(xs)
+        g = filters.cqf(3000, 0.001)
+        for x in xs:
+            g.add(x)
+        assert list(f.countMany(xs)) == [g.count(x) for x in xs]
+        assert len([c for c in f.countMany(xs) if c == 1]) >= 2000
+        h = filters.cqf(3000, 0.001)
+        h.addMany(xs[:3000], array.array('L', [2]) * 3000)
+        hs = h.countMany(xs[:3000])
+        assert len([c for c in hs if c < 2]) == 0
+        assert len([c for c in hs if c > 2]) < 5
+
+def test_cqf_full():
+    random.seed(17)
+    f = filters.cqf(10, 0.01)
+    added = []
+    full = 0
+    for x in mkKmers(25, 1000):
+        occ = f.occupied.data.tolist()
+        n = len(f)
+        try:
+            f.add(x)
+            added.append(x)
+        except filters.FilterFull:
+            full += 1
+            assert len(f) == n
+            assert f.occupied.data.tolist() == occ
+    assert full > 0
+    for x in added:
+        assert f.count(x) >= 1
+
+def test_cqf_types():
+    assert filters.cqf(100, 0.01).rems.typecode == 'B'
+    assert filters.cqf(100, 0.0001).rems.typecode == 'H'
+    assert filters.cqf(100, 2.0**-20).rems.typecode == 'I'
+    assert filters.cqf(100, 2.0**-40).rems.typecode == 'L'
+    f = filters.cqf(100, 2.0**-56)
+    assert f.q + f.r == 64
+    xs = mkKmers(25, 100)
+    f.addMany(xs)
+    assert list(f.countMany(xs)) == [1 for x in xs]
+    assert f.add(xs[0], 1 << 40) == (1 << 32) - 1
+    g = filters.cqf(100, 0.01, counts='B')
+    assert g.counts.typecode == 'B'
+    g.addMany(xs)
+    assert g.add(xs[0], 300) == 255
+    assert g.add(xs[1], 1) == 2
+
+def test_rw():
+    random.seed(17)
+    xs = mkKmers(25, 5000)
+    f = filters.bloom(len(xs), 0.01)
+    f.addMany(xs)
+    g = filters.cqf(len(xs), 0.01)
+    g.addMany(xs)
+    h = filters.cqf(len(xs), 0.01, counts='B')
+    h.addMany(xs + xs[:100])
+    nm = tmpfile()
+    with container.container(nm, 'w') as z:
+        filters.writeBloom(z, f, 'bloom')
+        filters.writeCqf(z, g, 'cqf')
+        filters.writeCqf(z, h, 'cqfB')
+    with container.container(nm, 'r') as z:
+        f2 = filters.readBloom(z, 'bloom')
+        g2 = filters.readCqf(z, 'cqf')
+        h2 = filters.readCqf(z, 'cqfB')
+    assert f2.k == f.k and f2.bits.data == f.bits.data
+    assert list(f2.containsMany(xs)) == [1 for x in xs]
+    assert len(g2) == len(g)
+    assert list(g2.countMany(xs)) == list(g.countMany(xs))
+    assert h2.counts.typecode == 'B'
+    assert list(h2.countMany(xs)) == list(h.countMany(xs))
+    os.remove(nm)
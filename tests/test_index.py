@@ -0,0 +1,29 @@
+from pykmer.file import tmpfile
+import pykmer.container as container
+import pykmer.index as index
+
+import os
+import random
+
+def test_lazy_names():
+    random.seed(17)
+    K = 11
+    # Enough sequences for the names to be stored separately.
+    n = 1500
+    seqs = [''.join([random.choice('ACGT') for j in xrange(30)]) for i in xrange(n)]
+    fn = tmpfile('.fa')
+    with open(fn, 'w') as f:
+        for i in xrange(n):
+            f.write('>seq%d\n%s\n' % (i, seqs[i]))
+    nm = tmpfile()
+    index.buildIndex(K, [fn], nm)
+    with container.container(nm, 'r') as z:
+        assert 'names' in z.meta.lazy
+    idx = index.index(nm)
+    assert 'names' not in idx.__dict__
+    x = idx.S.select(0)
+    assert len(idx[x]) > 0
+    assert idx.names == ['seq%d' % i for i in xrange(n)]
+    assert 'names' in idx.__dict__
+    os.remove(fn)
+    os.remove(nm)
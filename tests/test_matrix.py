@@ -0,0 +1,115 @@
+from pykmer.file import tmpfile
+import pykmer.container as container
+import pykmer.container.matrix as matrix
+import pykmer.container.vectors as vectors
+import pykmer.basics128 as basics128
+
+import array
+import os
+import random
+
+def mkSamples(K, S, N):
+    M = (1 << (2*K)) - 1
+    xs = sorted(set([random.randint(0, M) for i in xrange(N)]))
+    srcs = []
+    for j in xrange(S):
+        srcs.append([(x, random.randint(1, 100)) for x in xs if random.random() < 0.5])
+    return (xs, srcs)
+
+def test_merge():
+    random.seed(17)
+    K = 25
+    S = 5
+    (xs, srcs) = mkSamples(K, S, 100000)
+    names = ['s%d' % j for j in xrange(S)]
+    cnts = [dict(src) for src in srcs]
+    ys = sorted(set([x for src in srcs for (x, c) in src]))
+    for backend in ['zip', 'casket']:
+        nm = tmpfile()
+        with container.container(nm, 'w', backend=backend) as z:
+            n = matrix.mergeCounts(K, z, names, srcs)
+            assert n == len(ys)
+        with container.container(nm, 'r') as z:
+            m = matrix.matrix(z)
+            assert m.N == len(ys)
+            assert m.samples == names
+            assert m.kmers().tolist() == ys
+            for j in xrange(S):
+                assert m.column(j).tolist() == [cnts[j].get(y, 0) for y in ys]
+            assert m.column('s3') == m.column(3)
+            for r in [0, 1, 65535, 65536, len(ys) - 1]:
+                y = ys[r]
+                assert m.rank(y) == r
+                assert m.row(y).tolist() == [cnts[j].get(y, 0) for j in xrange(S)]
+            assert m.row(ys[10] + 1) is None
+            (zs, cols) = m.rows(65530, 65540)
+            assert zs.tolist() == ys[65530:65540]
+            for j in xrange(S):
+                assert cols[j].tolist() == [cnts[j].get(y, 0) for y in ys[65530:65540]]
+        os.remove(nm)
+
+def test_blocks_128():
+    random.seed(17)
+    K = 40
+    S = 3
+    N = 100000
+    M = (1 << (2*K)) - 1
+    xs = sorted(set([random.randint(0, M) for i in xrange(N)]))
+    N = len(xs)
+    cols = [array.array('I', [random.randint(0, 100) for x in xs]) for j in xrange(S)]
+    nm = tmpfile()
+    with container.container(nm, 'w') as z:
+        with matrix.MatrixWriter(K, z, ['a', 'b', 'c'], 'wibble') as w:
+            for i in xrange(0, N, 30000):
+                w.appendBlock(basics128.pack(xs[i:i+30000]), [c[i:i+30000] for c in cols])
+    with container.container(nm, 'r') as z:
+        m = matrix.matrix(z, 'wibble')
+        assert list(basics128.unpack(m.kmers())) == xs
+        assert m.column('b') == cols[1]
+        (zs, cs) = m.rows(70000, 70010)
+        assert list(basics128.unpack(zs)) == xs[70000:70010]
+        assert cs[2] == cols[2][70000:70010]
+        assert m.rowAt(5).tolist() == [c[5] for c in cols]
+        for r in [0, 65535, 65536, N - 1]:
+            assert m.rank(xs[r]) == r
+            assert m.row(xs[r]).tolist() == [c[r] for c in cols]
+        assert m.row(xs[70000] + 1) is None
+    os.remove(nm)
+
+def test_many_samples(monkeypatch):
+    random.seed(17)
+    K = 25
+    S = 7
+    (xs, srcs) = mkSamples(K, S, 20000)
+    names = [u's%d' % j for j in xrange(S)]
+    cnts = [dict(src) for src in srcs]
+    ys = sorted(set([x for src in srcs for (x, c) in src]))
+    monkeypatch.setattr(matrix, 'maxColumns', 3)
+    monkeypatch.setattr(matrix, '_spoolSize', 1000)
+    live = [0, 0]
+    writer32 = vectors.writer32
+    def counted(z, nm):
+        w = writer32(z, nm)
+        close = w.close
+        def closer():
+            live[0] -= 1
+            close()
+        w.close = closer
+        live[0] += 1
+        live[1] = max(live[1], live[0])
+        return w
+    monkeypatch.setattr(vectors, 'writer32', counted)
+    for useNumpy in [True, False]:
+        if not useNumpy:
+            monkeypatch.setattr(matrix, 'np', None)
+        nm = tmpfile()
+        with container.container(nm, 'w') as z:
+            matrix.mergeCounts(K, z, names, srcs)
+        assert live == [0, 3]
+        with container.container(nm, 'r') as z:
+            m = matrix.matrix(z)
+            for j in xrange(S):
+                assert m.column(j).tolist() == [cnts[j].get(y, 0) for y in ys]
+            assert m.column(u's4') == m.column('s4')
+            assert m.row(ys[100]).tolist() == [cnts[j].get(ys[100], 0) for j in xrange(S)]
+        os.remove(nm)
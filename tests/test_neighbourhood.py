@@ -0,0 +1,42 @@
+from pykmer.basics import ham
+from pykmer.neighbourhood import neighbourhood
+from pykmer.sparse import sparse
+
+import array
+import random
+
+def mutate(K, x, n):
+    for i in range(n):
+        p = 2*random.randint(0, K - 1)
+        x ^= random.randint(1, 3) << p
+    return x
+
+def test_neighbourhood():
+    random.seed(17)
+    K = 11
+    M = (1 << (2*K)) - 1
+    N = 5000
+    xs = sorted(set([random.randint(0, M) for i in xrange(N)]))
+    S = sparse(2*K, array.array('L', xs))
+    for d in [0, 1, 2, 3]:
+        idx = neighbourhood(K, S, d)
+        for i in xrange(50):
+            q = mutate(K, random.choice(xs), random.randint(0, d + 1))
+            ys = idx.query(q)
+            zs = [(x, r, ham(q, x)) for (r, x) in enumerate(xs) if ham(q, x) <= d]
+            assert ys == zs
+
+def test_neighbourhood_smaller_d():
+    random.seed(17)
+    K = 25
+    M = (1 << (2*K)) - 1
+    N = 1000
+    xs = sorted(set([random.randint(0, M) for i in xrange(N)]))
+    S = sparse(2*K, array.array('L', xs))
+    idx = neighbourhood(K, S, 3)
+    for x in xs[:100]:
+        q = mutate(K, x, 1)
+        ys = idx.query(q, 1)
+        assert (x, S.rank(x), ham(q, x)) in ys
+        for (y, r, h) in ys:
+            assert h <= 1
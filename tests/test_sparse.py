@@ -1,6 +1,7 @@
 import pykmer.sparse as sparse
 
 import array
+import bisect
 import random
 
 def test_empty():
@@ -61,3 +62,41 @@ def test_rank1():
         else:
             assert ys[0] > x
 
+
+def test_rank2():
+    random.seed(17)
+    for (B, N) in [(4, 1000), (20, 100), (54, 100000)]:
+        M = (1 << B) - 1
+        xs = sorted([random.randint(0, M) for i in xrange(N)])
+        S = sparse.sparse(B, array.array('L', xs))
+        assert len(S.toc) <= max(2, N // 32 + 1)
+        for i in xrange(1000):
+            x0 = random.randint(0, M)
+            x1 = min(M + 1, x0 + random.randint(0, 1 << random.randint(0, B)))
+            assert S.rank2(x0, x1) == (bisect.bisect_left(xs, x0), bisect.bisect_left(xs, x1))
+        assert S.rank2(0, M + 1) == (0, N)
+        assert S.rank(M + 1) == N
+
+def test_many(monkeypatch):
+    random.seed(17)
+    B = 50
+    M = (1 << B) - 1
+    N = 20000
+    xs = sorted(set([random.randint(0, M) for i in xrange(N)]))
+    qs = [random.choice(xs) for i in xrange(5000)] + [random.randint(0, M) for i in xrange(5000)] + [M + 1]
+    random.shuffle(qs)
+    rs = [bisect.bisect_left(xs, q) for q in qs]
+    ys = set(xs)
+    acs = [r if q in ys else -1 for (q, r) in zip(qs, rs)]
+    for useNumpy in [True, False]:
+        if not useNumpy:
+            monkeypatch.setattr(sparse, 'np', None)
+        for S in [sparse.sparse(B, array.array('L', xs)), sparse.sparse(B, xs)]:
+            a = S.rankMany(qs)
+            assert a.typecode == 'L'
+            assert a.tolist() == rs
+            b = S.accessMany(qs)
+            assert b.typecode == 'l'
+            assert b.tolist() == acs
+            assert S.rankMany([]).tolist() == []
+            assert S.accessMany([]).tolist() == []